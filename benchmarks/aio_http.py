@@ -0,0 +1,133 @@
+"""
+Cliente HTTP/1.1 mínimo sobre asyncio, usado pelos benchmarks de carga.
+
+Mantém uma conexão keep-alive por instância e reconecta quando o servidor
+fecha a conexão (o worker sync do gunicorn, por exemplo, não faz keep-alive).
+Evita dependências extras e o custo de threads do `requests` em alta
+concorrência.
+"""
+
+import asyncio
+import json
+from urllib.parse import urlsplit
+
+
+class HTTPConnection:
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        self._reader = self._writer = None
+
+    async def request(self, method, path, body=None, headers=None):
+        """
+        Envia a requisição e retorna (status, headers, corpo em bytes).
+        Tenta uma reconexão se a conexão reaproveitada já estiver fechada.
+        """
+        for attempt in range(2):
+            if self._writer is None:
+                await self._connect()
+            try:
+                return await asyncio.wait_for(
+                    self._roundtrip(method, path, body, headers or {}), self.timeout
+                )
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if attempt:
+                    raise
+
+    async def get(self, path, headers=None):
+        return await self.request("GET", path, headers=headers)
+
+    async def post_json(self, path, payload):
+        return await self.request(
+            "POST",
+            path,
+            body=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+
+    async def _roundtrip(self, method, path, body, headers):
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        lines.append(f"Content-Length: {len(body) if body else 0}")
+        self._writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + (body or b""))
+        await self._writer.drain()
+
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionResetError("conexão fechada pelo servidor")
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            content = await self._read_chunked()
+        else:
+            length = int(response_headers.get("content-length", 0))
+            content = await self._reader.readexactly(length) if length else b""
+
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, response_headers, content
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self._reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                await self._reader.readline()
+                return b"".join(chunks)
+            chunks.append(await self._reader.readexactly(size))
+            await self._reader.readline()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+def latency_percentiles(latencies_ms):
+    """Percentis p50/p95/p99 e máximo de uma lista de latências em ms."""
+    latencies_ms = sorted(latencies_ms)
+    return {
+        "p50_ms": round(percentile(latencies_ms, 0.50), 2),
+        "p95_ms": round(percentile(latencies_ms, 0.95), 2),
+        "p99_ms": round(percentile(latencies_ms, 0.99), 2),
+        "max_ms": round(latencies_ms[-1], 2) if latencies_ms else 0.0,
+    }
+
+
+def summarize(latencies_ms, elapsed_s, statuses):
+    """Resumo padrão de uma rodada de carga: vazão, percentis e status."""
+    return {
+        "requests": len(latencies_ms),
+        "elapsed_s": round(elapsed_s, 3),
+        "requests_per_s": round(len(latencies_ms) / elapsed_s, 1) if elapsed_s else 0.0,
+        **latency_percentiles(latencies_ms),
+        "statuses": {
+            str(code): count for code, count in sorted(statuses.items(), key=str)
+        },
+    }
@@ -0,0 +1,126 @@
+"""
+Compara o caminho síncrono (gunicorn WSGI, /webhook/) com o assíncrono
+(gunicorn + UvicornWorker, /async/webhook/) sob alta concorrência.
+
+Exemplo, com os serviços `django` e `django-asgi` do docker-compose no ar:
+
+    python -m benchmarks.asgi_vs_wsgi \
+        --sync-url http://localhost:8000 --async-url http://localhost:8001 \
+        --concurrency 500 --requests 20000 --output asgi_vs_wsgi.json
+
+Para cada servidor, cria uma conversa por cliente concorrente e dispara
+NEW_MESSAGE (ou GET do detalhe, com --scenario detail), medindo vazão e
+latências p50/p95/p99.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+from benchmarks.aio_http import HTTPConnection, summarize
+
+TARGETS = {
+    "sync": {"webhook": "/webhook/", "detail": "/conversations/{id}/"},
+    "async": {"webhook": "/async/webhook/", "detail": "/async/conversations/{id}/"},
+}
+
+
+def iso_now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+async def run_target(base_url, paths, scenario, concurrency, total_requests):
+    connections = [HTTPConnection(base_url) for _ in range(concurrency)]
+    conversation_ids = [str(uuid.uuid4()) for _ in range(concurrency)]
+
+    await asyncio.gather(
+        *(
+            connection.post_json(
+                paths["webhook"],
+                {
+                    "type": "NEW_CONVERSATION",
+                    "timestamp": iso_now(),
+                    "data": {"id": conversation_id},
+                },
+            )
+            for connection, conversation_id in zip(connections, conversation_ids)
+        )
+    )
+
+    latencies = []
+    statuses = Counter()
+    remaining = iter(range(total_requests))
+
+    async def client(connection, conversation_id):
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                if scenario == "detail":
+                    status, _, _ = await connection.get(
+                        paths["detail"].format(id=conversation_id)
+                    )
+                else:
+                    status, _, _ = await connection.post_json(
+                        paths["webhook"],
+                        {
+                            "type": "NEW_MESSAGE",
+                            "timestamp": iso_now(),
+                            "data": {
+                                "id": str(uuid.uuid4()),
+                                "conversation_id": conversation_id,
+                                "content": "mensagem de carga",
+                            },
+                        },
+                    )
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                await connection.close()
+                status = "error"
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(client(conn, conv) for conn, conv in zip(connections, conversation_ids))
+    )
+    elapsed = time.perf_counter() - started
+
+    for connection in connections:
+        await connection.close()
+    return summarize(latencies, elapsed, statuses)
+
+
+async def main(args):
+    results = {
+        "scenario": args.scenario,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+    }
+    for name, base_url in (("sync", args.sync_url), ("async", args.async_url)):
+        results[name] = await run_target(
+            base_url, TARGETS[name], args.scenario, args.concurrency, args.requests
+        )
+        summary = results[name]
+        print(
+            f"{name:<6} {summary['requests_per_s']:>9} req/s  "
+            f"p50 {summary['p50_ms']:>8} ms  p99 {summary['p99_ms']:>8} ms  "
+            f"status {summary['statuses']}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sync-url", default="http://localhost:8000")
+    parser.add_argument("--async-url", default="http://localhost:8001")
+    parser.add_argument("--scenario", choices=["webhook", "detail"], default="webhook")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--output", help="Arquivo JSON com os resultados.")
+    asyncio.run(main(parser.parse_args()))
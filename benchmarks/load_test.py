@@ -0,0 +1,252 @@
+"""
+Carga concorrente no webhook e latência ponta a ponta até a resposta OUTBOUND.
+
+Reaproveita os construtores de eventos do script.py para simular milhares de
+conversas simultâneas: cada uma cria a conversa, envia uma rajada de
+NEW_MESSAGE e, em seguida, consulta GET /conversations/{id}/ (com
+If-None-Match, para que as consultas sem mudança custem um 304) até a
+mensagem OUTBOUND aparecer depois da última INBOUND.
+
+Exemplo, com a stack do docker-compose no ar (django, celery, celery-beat):
+
+    python -m benchmarks.load_test --base-url http://localhost:8000 \
+        --conversations 2000 --burst 3 --out-of-order 0.1 \
+        --output load_$(git rev-parse --short HEAD).json
+
+Com --out-of-order, essa fração das conversas envia a primeira mensagem
+antes do NEW_CONVERSATION (exercita o buffer de mensagens pendentes).
+
+O JSON de saída traz os parâmetros, o commit, a vazão e os percentis
+p50/p95/p99 do webhook (geral e por tipo de evento) e do tempo ponta a ponta,
+para comparar rodadas entre commits.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import subprocess
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from benchmarks.aio_http import HTTPConnection, latency_percentiles, summarize
+from script import build_event, new_conversation_data, new_message_data
+
+CONNECTION_ERRORS = (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError)
+
+
+class ConnectionPool:
+    """Conexões keep-alive compartilhadas entre as conversas simuladas."""
+
+    def __init__(self, base_url, size):
+        self._connections = [HTTPConnection(base_url) for _ in range(size)]
+        self._idle = asyncio.Queue()
+        for connection in self._connections:
+            self._idle.put_nowait(connection)
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        connection = await self._idle.get()
+        try:
+            yield connection
+        finally:
+            self._idle.put_nowait(connection)
+
+    async def close(self):
+        for connection in self._connections:
+            await connection.close()
+
+
+class LoadRun:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.pool = ConnectionPool(args.base_url, args.connections)
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.end_to_end = []
+        self.end_to_end_status = Counter()
+        self.webhook_done_at = 0.0
+
+    async def post(self, event_type, data):
+        """Envia um evento e registra a latência; retorna o status HTTP."""
+        payload = build_event(event_type, data)
+        async with self.pool.connection() as connection:
+            started = time.perf_counter()
+            try:
+                status, _, _ = await connection.post_json(
+                    self.args.webhook_path, payload
+                )
+            except CONNECTION_ERRORS:
+                await connection.close()
+                status = "error"
+            finished = time.perf_counter()
+        self.latencies[event_type].append((finished - started) * 1000)
+        self.statuses[event_type][status] += 1
+        self.webhook_done_at = max(self.webhook_done_at, finished)
+        return status
+
+    async def wait_for_outbound(self, conversation_id, last_inbound_at):
+        """
+        Consulta o detalhe até a última mensagem ser OUTBOUND e retorna o
+        tempo desde a última INBOUND aceita, ou None no timeout.
+        """
+        path = f"/conversations/{conversation_id}/"
+        deadline = last_inbound_at + self.args.e2e_timeout
+        etag = None
+        while time.perf_counter() < deadline:
+            async with self.pool.connection() as connection:
+                try:
+                    status, headers, body = await connection.get(
+                        path, headers={"If-None-Match": etag} if etag else None
+                    )
+                except CONNECTION_ERRORS:
+                    await connection.close()
+                    status = "error"
+            if status == 200:
+                etag = headers.get("etag")
+                messages = json.loads(body).get("messages", [])
+                if messages and messages[-1]["type"] == "OUTBOUND":
+                    return time.perf_counter() - last_inbound_at
+            await asyncio.sleep(self.args.poll_interval)
+        return None
+
+    async def conversation(self):
+        await asyncio.sleep(self.rng.uniform(0, self.args.ramp_up))
+        conversation_id = str(uuid.uuid4())
+        events = [("NEW_CONVERSATION", new_conversation_data(conversation_id))]
+        events += [
+            ("NEW_MESSAGE", new_message_data(conversation_id, f"mensagem {index}"))
+            for index in range(self.args.burst)
+        ]
+        if self.args.burst and self.rng.random() < self.args.out_of_order:
+            events[0], events[1] = events[1], events[0]
+
+        last_inbound_at = None
+        for index, (event_type, data) in enumerate(events):
+            if index and event_type == "NEW_MESSAGE" and self.args.message_interval:
+                await asyncio.sleep(self.rng.uniform(0, self.args.message_interval))
+            status = await self.post(event_type, data)
+            if event_type == "NEW_MESSAGE":
+                last_inbound_at = time.perf_counter() if status == 202 else None
+
+        if last_inbound_at is None or not self.args.e2e:
+            return
+        elapsed = await self.wait_for_outbound(conversation_id, last_inbound_at)
+        if elapsed is None:
+            self.end_to_end_status["timeout"] += 1
+        else:
+            self.end_to_end_status["ok"] += 1
+            self.end_to_end.append(elapsed * 1000)
+
+    async def run(self):
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(
+                *(self.conversation() for _ in range(self.args.conversations))
+            )
+        finally:
+            await self.pool.close()
+        webhook_elapsed = self.webhook_done_at - started
+
+        all_latencies = [ms for values in self.latencies.values() for ms in values]
+        all_statuses = sum(self.statuses.values(), Counter())
+        return {
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "params": vars(self.args),
+            "webhook": summarize(all_latencies, webhook_elapsed, all_statuses),
+            "webhook_by_event": {
+                event_type: summarize(
+                    self.latencies[event_type],
+                    webhook_elapsed,
+                    self.statuses[event_type],
+                )
+                for event_type in sorted(self.latencies)
+            },
+            "end_to_end": {
+                "samples": len(self.end_to_end),
+                **latency_percentiles(self.end_to_end),
+                "statuses": dict(self.end_to_end_status),
+            },
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args):
+    results = asyncio.run(LoadRun(args).run())
+
+    webhook = results["webhook"]
+    print(
+        f"webhook  {webhook['requests_per_s']:>9} ev/s  p50 {webhook['p50_ms']:>8} ms  "
+        f"p95 {webhook['p95_ms']:>8} ms  p99 {webhook['p99_ms']:>8} ms  "
+        f"status {webhook['statuses']}"
+    )
+    for event_type, summary in results["webhook_by_event"].items():
+        print(
+            f"  {event_type:<20} p50 {summary['p50_ms']:>8} ms  "
+            f"p99 {summary['p99_ms']:>8} ms  status {summary['statuses']}"
+        )
+    e2e = results["end_to_end"]
+    print(
+        f"ponta a ponta  p50 {e2e['p50_ms']:>9} ms  p95 {e2e['p95_ms']:>9} ms  "
+        f"p99 {e2e['p99_ms']:>9} ms  {e2e['statuses']}"
+    )
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--webhook-path", default="/webhook/")
+    parser.add_argument("--conversations", type=int, default=1000)
+    parser.add_argument(
+        "--burst", type=int, default=3, help="Mensagens INBOUND por conversa."
+    )
+    parser.add_argument(
+        "--message-interval",
+        type=float,
+        default=0.5,
+        help="Intervalo máximo (s, sorteado) entre as mensagens de uma rajada.",
+    )
+    parser.add_argument(
+        "--out-of-order",
+        type=float,
+        default=0.0,
+        help="Fração das conversas cuja 1ª mensagem chega antes do NEW_CONVERSATION.",
+    )
+    parser.add_argument(
+        "--ramp-up",
+        type=float,
+        default=5.0,
+        help="Janela (s) em que o início das conversas é distribuído.",
+    )
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument(
+        "--no-e2e",
+        dest="e2e",
+        action="store_false",
+        help="Mede só o webhook, sem aguardar a resposta OUTBOUND.",
+    )
+    parser.add_argument("--e2e-timeout", type=float, default=60.0)
+    parser.add_argument("--poll-interval", type=float, default=0.25)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Arquivo JSON com os resultados.")
+    main(parser.parse_args())
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ConversationsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "conversations"
+
+    def ready(self):
+        # Conecta os sinais do Celery que medem fila e execução das tasks.
+        from . import metrics  # noqa: F401
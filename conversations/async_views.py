@@ -0,0 +1,437 @@
+"""
+Versões assíncronas (ASGI) do webhook e dos endpoints de conversa.
+
+Usam o ORM assíncrono do Django e publicam no Celery em uma thread do pool
+(sync_to_async com thread_sensitive=False), de modo que a espera por Postgres
+e Redis não prende o event loop. Os corpos e status de resposta são os mesmos
+das views síncronas em views.py.
+"""
+
+import asyncio
+import json
+
+import orjson
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import replace_query_param
+
+from .cache import render_cache, seen_messages, status_cache
+from .enums import ChangeKind, ConversationStatus, MessageType, WebhookEventType
+from .metrics import count_duplicate, count_event, payload_event_type, stage
+from .models import Change, Conversation, Message
+from .pagination import InvalidCursor, apaginate_keyset
+from .persistence import (
+    ConversationClosed,
+    close_conversation,
+    create_conversation,
+)
+from .parsers import NDJSONParser
+from .renderers import (
+    compress_response,
+    conversation_values,
+    render_json,
+    render_messages,
+    serialize_conversations,
+)
+from .serializers import (
+    ConversationFieldsQuerySerializer,
+    ConversationListQuerySerializer,
+    ConversationSerializer,
+    validate_webhook,
+)
+from .services import (
+    buffer_pending_messages,
+    drain_pending_messages,
+    insert_inbound_message,
+    pending_message,
+    process_event_batch,
+)
+from .streams import message_stream
+from .tasks import process_inbound_message, process_inbound_messages
+from .views import (
+    conditional_json_response,
+    conversation_queryset,
+    etag_matches,
+    not_modified_response,
+    render_conversation,
+)
+
+
+def _render(data, status=200):
+    return HttpResponse(
+        JSONRenderer().render(data), status=status, content_type="application/json"
+    )
+
+
+def _already_processed(event_type):
+    count_duplicate(event_type)
+    return _render({"message": "Message already processed"}, status=200)
+
+
+async def _publish(task, *args, **kwargs):
+    # Versão assíncrona de outbox.publish: com TASK_OUTBOX, a task já foi
+    # gravada no outbox junto com a mensagem.
+    if not settings.TASK_OUTBOX:
+        await sync_to_async(task.apply_async, thread_sensitive=False)(*args, **kwargs)
+
+
+@csrf_exempt
+@require_POST
+async def webhook(request):
+    """
+    Versão assíncrona de views.webhook. Aceita um evento JSON ou um lote
+    (array JSON ou NDJSON).
+    """
+    try:
+        if request.content_type == NDJSONParser.media_type:
+            payload = [
+                json.loads(line) for line in request.body.splitlines() if line.strip()
+            ]
+        else:
+            payload = json.loads(request.body)
+    except ValueError as exc:
+        return _render({"detail": f"JSON parse error - {exc}"}, status=400)
+
+    if isinstance(payload, list):
+        if len(payload) > settings.WEBHOOK_MAX_BATCH_SIZE:
+            return _render(
+                {
+                    "error": f"Batch too large (max {settings.WEBHOOK_MAX_BATCH_SIZE} events)"
+                },
+                status=413,
+            )
+        results = await sync_to_async(process_event_batch)(payload)
+        for event, (_, status) in zip(payload, results):
+            count_event(payload_event_type(event), status)
+        return _render(
+            {"results": [{"status": status, "body": body} for body, status in results]}
+        )
+
+    response = await _handle_event(payload)
+    count_event(payload_event_type(payload), response.status_code)
+    return response
+
+
+async def _handle_event(payload):
+    """Versão assíncrona de views.handle_event."""
+    event_type = payload_event_type(payload)
+    with stage("validate", event_type):
+        validated, errors = validate_webhook(payload)
+    if errors is not None:
+        return _render(errors, status=400)
+
+    event_type = validated["type"]
+    timestamp_dt = validated["timestamp"]
+    data = validated["data"]
+
+    if event_type == WebhookEventType.NEW_CONVERSATION.value:
+        with stage("db", event_type):
+            conversation, created = await sync_to_async(create_conversation)(data["id"])
+            if not created:
+                return _render({"error": "Conversation already exists"}, status=400)
+            await status_cache.aset(data["id"], conversation.status)
+            drained = await sync_to_async(drain_pending_messages)([data["id"]])
+        if drained:
+            with stage("publish", event_type):
+                await _publish(process_inbound_messages, (drained,))
+        return _render({"message": "Conversation created"}, status=201)
+
+    elif event_type == WebhookEventType.NEW_MESSAGE.value:
+        conversation_id = data["conversation_id"]
+        message_id = data["id"]
+        content = data["content"]
+
+        with stage("dedup", event_type):
+            duplicate = await seen_messages.aseen(message_id)
+        if duplicate:
+            return _already_processed(event_type)
+
+        now = timezone.now()
+        with stage("db", event_type):
+            conversation_status = await status_cache.aget(conversation_id)
+
+            if conversation_status is None:
+                diff = (now - timestamp_dt).total_seconds()
+                if diff > settings.MESSAGE_BUFFER_SECONDS:
+                    return _render({"error": "Conversation does not exist"}, status=400)
+                drained = await sync_to_async(buffer_pending_messages)(
+                    [
+                        pending_message(
+                            message_id, conversation_id, content, timestamp_dt
+                        )
+                    ]
+                )
+            elif conversation_status == ConversationStatus.CLOSED.value:
+                return _render({"error": "Conversation is closed"}, status=400)
+            else:
+                msg = Message(
+                    id=message_id,
+                    conversation_id=conversation_id,
+                    type=MessageType.INBOUND.value,
+                    content=content,
+                    timestamp=timestamp_dt,
+                )
+                try:
+                    inserted = await sync_to_async(insert_inbound_message)(msg)
+                except ConversationClosed:
+                    await status_cache.aset(
+                        conversation_id, ConversationStatus.CLOSED.value
+                    )
+                    return _render({"error": "Conversation is closed"}, status=400)
+                await seen_messages.amark(message_id)
+                if not inserted:
+                    return _already_processed(event_type)
+
+        if conversation_status is None:
+            if drained:
+                with stage("publish", event_type):
+                    await _publish(process_inbound_messages, (drained,))
+            return _render({"message": "Message buffered"}, status=202)
+
+        with stage("publish", event_type):
+            await _publish(process_inbound_message, (str(msg.id),))
+        return _render({"message": "Message received"}, status=202)
+
+    elif event_type == WebhookEventType.CLOSE_CONVERSATION.value:
+        with stage("db", event_type):
+            closed = await sync_to_async(close_conversation)(data["id"], timezone.now())
+            if not closed:
+                if not await Conversation.objects.filter(id=data["id"]).aexists():
+                    return _render({"error": "Conversation not found"}, status=404)
+                return _render({"error": "Conversation already closed"}, status=400)
+            await status_cache.aset(data["id"], ConversationStatus.CLOSED.value)
+
+        return _render({"message": "Conversation closed"}, status=200)
+
+    return _render({"error": "Unknown event type"}, status=400)
+
+
+async def _render_conversation(id, fields):
+    """
+    Versão assíncrona de views.render_conversation; retorna None se a
+    conversa não existir.
+    """
+    if settings.CONVERSATION_FAST_RENDER:
+        try:
+            return await sync_to_async(render_conversation)(id, fields)
+        except Http404:
+            return None
+
+    conversation = await conversation_queryset(fields).filter(id=id).afirst()
+    if conversation is None:
+        return None
+    serializer = ConversationSerializer(conversation, fields=fields)
+    return conversation.version, JSONRenderer().render(serializer.data)
+
+
+@require_GET
+async def conversation_detail(request, id):
+    """Versão assíncrona de views.conversation_detail."""
+    query = ConversationFieldsQuerySerializer(data=request.GET)
+    if not query.is_valid():
+        return _render(query.errors, status=400)
+    fields = query.validated_data["fields"]
+
+    generation, rendered = await render_cache.alookup(id, fields)
+    if rendered is None:
+        if "If-None-Match" in request.headers:
+            version = (
+                await Conversation.objects.filter(id=id)
+                .values_list("version", flat=True)
+                .afirst()
+            )
+            if version is None:
+                return _render(
+                    {"detail": "No Conversation matches the given query."}, status=404
+                )
+            etag = render_cache.etag(version, fields)
+            if etag_matches(request, etag):
+                return not_modified_response(etag)
+        rendered = await _render_conversation(id, fields)
+        if rendered is None:
+            return _render(
+                {"detail": "No Conversation matches the given query."}, status=404
+            )
+        await render_cache.astore(id, generation, fields, rendered)
+    version, content = rendered
+    return conditional_json_response(
+        request, content, render_cache.etag(version, fields)
+    )
+
+
+@require_GET
+async def conversation_list(request):
+    """Versão assíncrona de views.conversation_list."""
+    query = ConversationListQuerySerializer(data=request.GET)
+    if not query.is_valid():
+        return _render(query.errors, status=400)
+    params = query.validated_data
+
+    fast = settings.CONVERSATION_FAST_RENDER
+    if fast:
+        conversations = conversation_values(
+            Conversation.objects.all(), params["fields"]
+        )
+    else:
+        conversations = conversation_queryset(params["fields"])
+    if "status" in params:
+        conversations = conversations.filter(status=params["status"])
+    if "updated_after" in params:
+        conversations = conversations.filter(updated_at__gt=params["updated_after"])
+    if params["ordering"] == "last_message_at":
+        conversations = conversations.filter(last_message_at__isnull=False)
+
+    try:
+        page, next_cursor = await apaginate_keyset(
+            conversations, params.get("cursor"), params["page_size"], params["ordering"]
+        )
+    except InvalidCursor:
+        return _render({"error": "Invalid cursor"}, status=400)
+
+    next_url = None
+    if next_cursor:
+        next_url = replace_query_param(
+            request.build_absolute_uri(), "cursor", next_cursor
+        )
+
+    if fast:
+        results = await sync_to_async(serialize_conversations)(page, params["fields"])
+        response = HttpResponse(
+            render_json({"next": next_url, "results": results}),
+            content_type="application/json",
+        )
+        return compress_response(request, response)
+
+    serializer = ConversationSerializer(page, many=True, fields=params["fields"])
+    return _render({"next": next_url, "results": serializer.data})
+
+
+def _sse_messages(messages):
+    """Um evento SSE por (posição no feed, mensagem); o id do evento é a posição."""
+    return b"".join(
+        b"id: %d\nevent: message\ndata: %s\n\n" % (sequence, orjson.dumps(message))
+        for sequence, message in messages
+    )
+
+
+async def _messages_after(conversation_id, cursor):
+    """
+    Mensagens da conversa gravadas depois de `cursor` (id da entrada em
+    Change), até CHANGES_PAGE_SIZE por vez; retorna (novo cursor, eventos).
+    """
+    entries = [
+        entry
+        async for entry in Change.objects.filter(
+            conversation_id=conversation_id,
+            kind=ChangeKind.MESSAGE.value,
+            id__gt=cursor,
+        )
+        .order_by("id")
+        .values_list("id", "object_id")[: settings.CHANGES_PAGE_SIZE]
+    ]
+    if not entries:
+        return cursor, b""
+    messages = {
+        message.id: message
+        async for message in Message.objects.filter(
+            id__in=[object_id for _, object_id in entries]
+        )
+    }
+    found = [(sequence, messages[oid]) for sequence, oid in entries if oid in messages]
+    rendered = orjson.loads(render_messages([message for _, message in found]))
+    events = _sse_messages(
+        zip((sequence for sequence, _ in found), rendered, strict=True)
+    )
+    return entries[-1][0], events
+
+
+async def _stream_events(conversation_id, cursor, replay):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.MESSAGE_STREAM_TIMEOUT_SECONDS
+    async with message_stream.subscribe(conversation_id) as queue:
+        # Inscrito antes da leitura de recuperação: nada se perde entre as duas.
+        yield b"retry: 1000\n"
+        yield b"id: %d\n" % cursor
+        yield b"event: ready\ndata: {}\n\n"
+
+        pending = replay
+        while True:
+            if pending:
+                while True:
+                    cursor, events = await _messages_after(conversation_id, cursor)
+                    if not events:
+                        break
+                    yield events
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(
+                    queue.get(),
+                    min(settings.MESSAGE_STREAM_HEARTBEAT_SECONDS, remaining),
+                )
+            except TimeoutError:
+                pending = False
+                yield b": keep-alive\n\n"
+                continue
+            # Avisos acumulados viram uma única leitura.
+            while not queue.empty():
+                queue.get_nowait()
+            pending = True
+
+
+@require_GET
+async def conversation_stream(request, id):
+    """
+    Server-Sent Events com as mensagens novas da conversa, entregues assim
+    que as tasks as gravam (ver conversations/streams.py), no lugar do
+    polling do detalhe. Cada conexão dura até MESSAGE_STREAM_TIMEOUT_SECONDS,
+    com keep-alives no intervalo; o EventSource reconecta sozinho enviando
+    Last-Event-ID, e as mensagens perdidas no intervalo são reenviadas.
+
+    O id de cada evento é o id da entrada da mensagem no feed de mudanças
+    (Change), não o timestamp da mensagem, que vem do cliente e não segue a
+    ordem de gravação. As entradas de uma conversa são gravadas com a linha
+    da conversa bloqueada pelo UPDATE de versão, então, dentro da conversa,
+    a ordem dos ids é a ordem dos commits: ler "id > Last-Event-ID" a cada
+    aviso não pula mensagens.
+    """
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get(
+        "last_event_id"
+    )
+    cursor = None
+    if last_event_id:
+        try:
+            cursor = int(last_event_id)
+        except ValueError:
+            return _render({"error": "Invalid Last-Event-ID"}, status=400)
+        if cursor < 0:
+            return _render({"error": "Invalid Last-Event-ID"}, status=400)
+
+    if not await Conversation.objects.filter(id=id).aexists():
+        return _render(
+            {"detail": "No Conversation matches the given query."}, status=404
+        )
+
+    replay = cursor is not None
+    if cursor is None:
+        # Sem Last-Event-ID, a reconexão retoma a partir da última mensagem atual.
+        cursor = (
+            await Change.objects.filter(
+                conversation_id=id, kind=ChangeKind.MESSAGE.value
+            )
+            .order_by("-id")
+            .values_list("id", flat=True)
+            .afirst()
+        ) or 0
+    response = StreamingHttpResponse(
+        _stream_events(id, cursor, replay), content_type="text/event-stream"
+    )
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
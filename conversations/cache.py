@@ -0,0 +1,328 @@
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from uuid import uuid4
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Conversation
+
+
+class LocalTTLCache:
+    """
+    Cache LRU em memória, local ao processo, com expiração por entrada.
+    Thread-safe, para uso nos workers gthread/ASGI.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class ConversationStatusCache:
+    """
+    Cache de dois níveis do status das conversas, consultado antes de
+    gravar mensagens para evitar o SELECT na tabela de conversas:
+
+    1. LRU local ao processo, com TTL curto (CONVERSATION_STATUS_LOCAL_TTL);
+    2. cache do Django (Redis em produção), compartilhado entre processos.
+
+    O status é gravado no NEW_CONVERSATION e atualizado no
+    CLOSE_CONVERSATION. Um processo pode enxergar o status antigo no nível
+    local por até CONVERSATION_STATUS_LOCAL_TTL segundos após um fechamento
+    feito em outro processo. Conversas inexistentes não são cacheadas, já
+    que podem ser criadas logo em seguida. O cache é só um atalho: a
+    gravação das mensagens do webhook confere o status no banco
+    (insert_messages com open_only).
+    """
+
+    def __init__(self):
+        self._local = LocalTTLCache(
+            settings.CONVERSATION_STATUS_LOCAL_SIZE,
+            settings.CONVERSATION_STATUS_LOCAL_TTL,
+        )
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def _key(self, conversation_id):
+        return f"conversation:status:{conversation_id}"
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                name: self._stats[name]
+                for name in ("local_hits", "shared_hits", "misses")
+            }
+
+    def clear(self):
+        """Limpa o nível local e os contadores (o nível compartilhado expira por TTL)."""
+        self._local.clear()
+        with self._stats_lock:
+            self._stats.clear()
+
+    def set(self, conversation_id, status):
+        self.set_many({conversation_id: status})
+
+    def set_many(self, statuses):
+        if not statuses:
+            return
+        for conversation_id, status in statuses.items():
+            self._local.set(str(conversation_id), status)
+        cache.set_many(
+            {self._key(cid): status for cid, status in statuses.items()},
+            settings.CONVERSATION_STATUS_CACHE_TTL,
+        )
+
+    def _fill(self, statuses):
+        """
+        Cacheia os status lidos do banco. No nível compartilhado usa add, que
+        não sobrescreve: uma leitura anterior ao CLOSE_CONVERSATION não pode
+        trocar o CLOSED gravado pelo fechamento por um OPEN antigo.
+        """
+        for conversation_id, status in statuses.items():
+            self._local.set(str(conversation_id), status)
+            cache.add(
+                self._key(conversation_id),
+                status,
+                settings.CONVERSATION_STATUS_CACHE_TTL,
+            )
+
+    def get_many(self, conversation_ids):
+        """
+        Retorna {id: status} para as conversas conhecidas, consultando o
+        nível local, depois o compartilhado e, por fim, o banco em uma
+        única consulta para o que faltar.
+        """
+        statuses = {}
+        missing = []
+        for conversation_id in conversation_ids:
+            status = self._local.get(str(conversation_id))
+            if status is None:
+                missing.append(conversation_id)
+            else:
+                statuses[conversation_id] = status
+        self._count("local_hits", len(statuses))
+        if not missing:
+            return statuses
+
+        shared = cache.get_many([self._key(cid) for cid in missing])
+        not_shared = []
+        for conversation_id in missing:
+            status = shared.get(self._key(conversation_id))
+            if status is None:
+                not_shared.append(conversation_id)
+            else:
+                statuses[conversation_id] = status
+                self._local.set(str(conversation_id), status)
+        self._count("shared_hits", len(missing) - len(not_shared))
+        if not not_shared:
+            return statuses
+
+        self._count("misses", len(not_shared))
+        requested = {str(cid): cid for cid in not_shared}
+        loaded = {
+            requested[str(cid)]: status
+            for cid, status in Conversation.objects.filter(
+                id__in=not_shared
+            ).values_list("id", "status")
+        }
+        self._fill(loaded)
+        statuses.update(loaded)
+        return statuses
+
+    def get(self, conversation_id):
+        """Status da conversa, ou None se ela não existir."""
+        return self.get_many([conversation_id]).get(conversation_id)
+
+    async def aget(self, conversation_id):
+        """Versão assíncrona de get; o nível local é consultado sem sair do loop."""
+        status = self._local.get(str(conversation_id))
+        if status is not None:
+            self._count("local_hits")
+            return status
+        return await sync_to_async(self.get)(conversation_id)
+
+    async def aset(self, conversation_id, status):
+        await sync_to_async(self.set)(conversation_id, status)
+
+
+status_cache = ConversationStatusCache()
+
+
+class SeenMessageCache:
+    """
+    Ids das mensagens já aceitas pelo webhook, para responder os retries do
+    gateway sem ir ao banco. Dois níveis, como o ConversationStatusCache:
+    LRU local e cache do Django (Redis em produção), com expiração de
+    WEBHOOK_IDEMPOTENCY_TTL segundos.
+
+    É só um atalho: a unicidade continua garantida pela chave primária de
+    Message, e o webhook também trata o IntegrityError de um retry
+    concorrente como duplicata.
+    """
+
+    def __init__(self):
+        self._local = LocalTTLCache(
+            settings.WEBHOOK_IDEMPOTENCY_LOCAL_SIZE,
+            settings.WEBHOOK_IDEMPOTENCY_LOCAL_TTL,
+        )
+
+    def _key(self, message_id):
+        return f"message:seen:{message_id}"
+
+    def seen_many(self, message_ids):
+        """Retorna o subconjunto de message_ids já marcados."""
+        seen = {mid for mid in message_ids if self._local.get(str(mid))}
+        missing = [mid for mid in message_ids if mid not in seen]
+        if missing:
+            shared = cache.get_many([self._key(mid) for mid in missing])
+            for message_id in missing:
+                if self._key(message_id) in shared:
+                    seen.add(message_id)
+                    self._local.set(str(message_id), True)
+        return seen
+
+    def seen(self, message_id):
+        return bool(self.seen_many([message_id]))
+
+    def mark_many(self, message_ids):
+        if not message_ids:
+            return
+        for message_id in message_ids:
+            self._local.set(str(message_id), True)
+        cache.set_many(
+            {self._key(mid): 1 for mid in message_ids},
+            settings.WEBHOOK_IDEMPOTENCY_TTL,
+        )
+
+    def mark(self, message_id):
+        self.mark_many([message_id])
+
+    async def aseen(self, message_id):
+        if self._local.get(str(message_id)):
+            return True
+        return await sync_to_async(self.seen)(message_id)
+
+    async def amark(self, message_id):
+        await sync_to_async(self.mark)(message_id)
+
+    def clear(self):
+        """Limpa o nível local (o compartilhado expira por TTL)."""
+        self._local.clear()
+
+
+seen_messages = SeenMessageCache()
+
+
+class ConversationRenderCache:
+    """
+    Cache do JSON renderizado do detalhe da conversa.
+
+    Cada conversa tem no cache do Django uma geração: um token aleatório sob
+    o qual ficam a versão e o payload renderizados. Com ela, um GET com
+    If-None-Match igual ao ETag é respondido com 304 e um GET sem mudanças
+    recebe o payload pronto, ambos sem consultar o banco.
+
+    A geração é removida a cada bump_versions, após o commit. O leitor obtém
+    a geração (ou cria uma com cache.add, que não sobrescreve) antes de ler
+    o banco e grava o payload sob ela; nunca grava a geração a partir do
+    que leu. Assim, um payload lido antes de um commit só pode ficar sob a
+    geração que o commit descartou, e não volta a ser servido.
+    """
+
+    def _generation_key(self, conversation_id):
+        return f"conversation:generation:{conversation_id}"
+
+    def _fields_key(self, fields):
+        return "all" if fields is None else ",".join(fields)
+
+    def _payload_key(self, conversation_id, generation, fields):
+        return f"conversation:payload:{conversation_id}:{generation}:{self._fields_key(fields)}"
+
+    def etag(self, version, fields):
+        """ETag forte da representação: versão + campos selecionados."""
+        digest = zlib.crc32(self._fields_key(fields).encode())
+        return f'"{version}.{digest:x}"'
+
+    def lookup(self, conversation_id, fields):
+        """
+        Retorna (geração, (versão, payload)) cacheados. Sem payload, o
+        segundo item é None e a geração, obtida antes da leitura do banco, é
+        a que deve ser passada a store; ela é None se foi invalidada no
+        meio, e aí o payload não é cacheado.
+        """
+        key = self._generation_key(conversation_id)
+        generation = cache.get(key)
+        if generation is None:
+            generation = uuid4().hex
+            if not cache.add(key, generation, settings.CONVERSATION_RENDER_CACHE_TTL):
+                return cache.get(key), None
+            return generation, None
+        return generation, cache.get(
+            self._payload_key(conversation_id, generation, fields)
+        )
+
+    async def alookup(self, conversation_id, fields):
+        key = self._generation_key(conversation_id)
+        generation = await cache.aget(key)
+        if generation is None:
+            generation = uuid4().hex
+            if not await cache.aadd(
+                key, generation, settings.CONVERSATION_RENDER_CACHE_TTL
+            ):
+                return await cache.aget(key), None
+            return generation, None
+        return generation, await cache.aget(
+            self._payload_key(conversation_id, generation, fields)
+        )
+
+    def store(self, conversation_id, generation, fields, rendered):
+        """Grava (versão, payload) sob a geração retornada por lookup."""
+        if generation is None:
+            return
+        cache.set(
+            self._payload_key(conversation_id, generation, fields),
+            rendered,
+            settings.CONVERSATION_RENDER_CACHE_TTL,
+        )
+
+    async def astore(self, conversation_id, generation, fields, rendered):
+        await sync_to_async(self.store)(conversation_id, generation, fields, rendered)
+
+    def invalidate(self, conversation_ids):
+        cache.delete_many([self._generation_key(cid) for cid in conversation_ids])
+
+
+render_cache = ConversationRenderCache()
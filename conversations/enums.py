@@ -20,6 +20,15 @@ class MessageType(Enum):
         return [(e.value, e.name) for e in cls]
 
 
+class ReplyStatus(Enum):
+    PENDING = "PENDING"
+    ANSWERED = "ANSWERED"
+
+    @classmethod
+    def choices(cls):
+        return [(e.value, e.name) for e in cls]
+
+
 class ConversationStatus(Enum):
     OPEN = "OPEN"
     CLOSED = "CLOSED"
@@ -27,3 +36,12 @@ class ConversationStatus(Enum):
     @classmethod
     def choices(cls):
         return [(e.value, e.name) for e in cls]
+
+
+class ChangeKind(Enum):
+    CONVERSATION = "conversation"
+    MESSAGE = "message"
+
+    @classmethod
+    def choices(cls):
+        return [(e.value, e.name) for e in cls]
@@ -0,0 +1,110 @@
+"""
+Exportação em streaming das conversas ou das mensagens (GET /export/ e
+`manage.py export_conversations`), em NDJSON ou CSV.
+
+As linhas são lidas com values_list().iterator(chunk_size=EXPORT_CHUNK_SIZE):
+no Postgres, por um cursor do lado do servidor; nos demais bancos, em
+blocos de fetchmany. Cada bloco é codificado e entregue antes do próximo ser
+lido, então a memória usada não depende do total exportado.
+"""
+
+import csv
+
+from django.conf import settings
+
+from .models import Conversation, Message
+from .renderers import (
+    CONVERSATION_FIELDS,
+    DATETIME_FIELDS,
+    datetime_formatter,
+    format_datetime,
+    render_json,
+)
+
+CONVERSATION_COLUMNS = [name for name in CONVERSATION_FIELDS if name != "messages"]
+MESSAGE_COLUMNS = ["id", "conversation_id", "type", "content", "timestamp"]
+
+EXPORT_DATETIME_FIELDS = DATETIME_FIELDS | {"timestamp"}
+
+CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def export_queryset(resource, status=None, since=None, until=None):
+    """
+    (colunas, queryset de tuplas) do recurso. O intervalo [since, until)
+    filtra created_at das conversas ou timestamp das mensagens; status
+    filtra a conversa (nas mensagens, a conversa a que pertencem).
+    """
+    if resource == "conversations":
+        columns, date_field = CONVERSATION_COLUMNS, "created_at"
+        queryset = Conversation.objects.all()
+        status_field = "status"
+    else:
+        columns, date_field = MESSAGE_COLUMNS, "timestamp"
+        queryset = Message.objects.all()
+        status_field = "conversation__status"
+
+    if status is not None:
+        queryset = queryset.filter(**{status_field: status})
+    if since is not None:
+        queryset = queryset.filter(**{f"{date_field}__gte": since})
+    if until is not None:
+        queryset = queryset.filter(**{f"{date_field}__lt": until})
+    return columns, queryset.order_by(date_field, "id").values_list(*columns)
+
+
+def _chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _Line:
+    """Destino do csv.writer: devolve a linha escrita em vez de guardá-la."""
+
+    def write(self, value):
+        return value
+
+
+def _formatted(columns, chunk, to_datetime):
+    dates = [i for i, name in enumerate(columns) if name in EXPORT_DATETIME_FIELDS]
+    for row in chunk:
+        row = list(row)
+        for index in dates:
+            if row[index] is not None:
+                row[index] = to_datetime(row[index])
+        yield row
+
+
+def _ndjson(columns, chunk):
+    return b"".join(
+        render_json(dict(zip(columns, row))) + b"\n"
+        for row in _formatted(columns, chunk, datetime_formatter())
+    )
+
+
+def _csv(columns, chunk, writer):
+    return "".join(
+        writer.writerow(row) for row in _formatted(columns, chunk, format_datetime)
+    ).encode()
+
+
+def stream_export(columns, queryset, output_format, chunk_size=None):
+    """
+    Gera os bytes da exportação, um bloco de `chunk_size` linhas por vez
+    (o CSV começa pelo cabeçalho).
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    writer = csv.writer(_Line())
+    if output_format == "csv":
+        yield writer.writerow(columns).encode()
+    for chunk in _chunks(queryset.iterator(chunk_size=chunk_size), chunk_size):
+        if output_format == "csv":
+            yield _csv(columns, chunk, writer)
+        else:
+            yield _ndjson(columns, chunk)
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from conversations.models import Conversation
+from conversations.persistence import recompute_activity
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula a partir de Message os agregados das conversas "
+        "(message_count, last_message_at, last_inbound_at, last_outbound_at)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Conversas recalculadas por transação.",
+        )
+
+    def handle(self, *args, **options):
+        last_id = None
+        total = changed = 0
+        while True:
+            queryset = Conversation.objects.order_by("id")
+            if last_id is not None:
+                queryset = queryset.filter(id__gt=last_id)
+            batch_ids = list(
+                queryset.values_list("id", flat=True)[: options["batch_size"]]
+            )
+            if not batch_ids:
+                break
+            last_id = batch_ids[-1]
+            total += len(batch_ids)
+            changed += recompute_activity(batch_ids)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{total} conversas verificadas, {changed} corrigidas.")
+        )
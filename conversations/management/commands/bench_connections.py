@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from kombu import Queue
+
+from realmate_challenge.celery_app import app as celery_app
+
+BENCH_QUEUE = Queue("bench_connections", routing_key="bench_connections")
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o custo de abrir conexões: requests com conexão nova ao banco "
+        "(CONN_MAX_AGE=0) contra conexão persistente com health check, e "
+        "publicação no broker com conexão nova contra o pool do Celery."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=500)
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        self.stdout.write(f"Banco ({connection.vendor}), {iterations} requests:")
+        for label, max_age in (("conexão nova", 0), ("persistente", 60)):
+            self._report(label, self._database(max_age, iterations), iterations)
+
+        self.stdout.write(f"Broker ({celery_app.conf.broker_url.split(':')[0]}):")
+        try:
+            self._report("conexão nova", self._publish(False, iterations), iterations)
+            self._report("pool", self._publish(True, iterations), iterations)
+        finally:
+            with celery_app.connection_for_write() as conn:
+                BENCH_QUEUE(conn.default_channel).delete()
+
+    def _report(self, label, elapsed, iterations):
+        self.stdout.write(
+            f"  {label}: {elapsed / iterations * 1e3:.3f}ms por operação "
+            f"({iterations / elapsed:.0f}/s)"
+        )
+
+    def _database(self, max_age, iterations):
+        """Ciclo de um request: request_started, uma consulta, request_finished."""
+        original = connection.settings_dict["CONN_MAX_AGE"]
+        connection.close()
+        connection.settings_dict["CONN_MAX_AGE"] = max_age
+        try:
+            started = time.perf_counter()
+            for _ in range(iterations):
+                close_old_connections()
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                close_old_connections()
+            return time.perf_counter() - started
+        finally:
+            connection.close()
+            connection.settings_dict["CONN_MAX_AGE"] = original
+
+    def _publish(self, pooled, iterations):
+        started = time.perf_counter()
+        for index in range(iterations):
+            if pooled:
+                with celery_app.producer_or_acquire() as producer:
+                    producer.publish(
+                        {"n": index},
+                        routing_key=BENCH_QUEUE.routing_key,
+                        declare=[BENCH_QUEUE],
+                    )
+            else:
+                with celery_app.connection_for_write() as conn:
+                    conn.Producer().publish(
+                        {"n": index},
+                        routing_key=BENCH_QUEUE.routing_key,
+                        declare=[BENCH_QUEUE],
+                    )
+        return time.perf_counter() - started
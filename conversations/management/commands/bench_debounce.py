@@ -0,0 +1,129 @@
+import math
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from conversations import tasks
+from conversations.enums import MessageType
+from conversations.models import Conversation, Message
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a ocupação dos workers e a vazão (mensagens/s) do debounce "
+        "antigo, que dormia CONVERSATION_DEBOUNCE_SECONDS por mensagem, com o "
+        "debounce por prazo de flush. Cria e remove os próprios dados; use em "
+        "um banco de desenvolvimento, pois a varredura também processa "
+        "conversas vencidas que já existirem no banco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--conversations", type=int, default=1000)
+        parser.add_argument(
+            "--messages",
+            type=int,
+            default=3,
+            help="Mensagens INBOUND por conversa.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Slots de worker Celery usados no cálculo de vazão.",
+        )
+
+    def handle(self, *args, **options):
+        conversation_ids, message_ids = self._seed(
+            options["conversations"], options["messages"]
+        )
+        try:
+            legacy_busy = self._bench_legacy(message_ids)
+            deadline_busy, dispatched = self._bench_deadline(
+                conversation_ids, message_ids
+            )
+        finally:
+            Conversation.objects.filter(id__in=conversation_ids).delete()
+
+        total = len(message_ids)
+        window = settings.CONVERSATION_DEBOUNCE_SECONDS
+        workers = options["workers"]
+
+        self.stdout.write(
+            f"{len(conversation_ids)} conversas x {options['messages']} mensagens "
+            f"= {total} mensagens INBOUND, {workers} slots de worker\n"
+        )
+        self.stdout.write(
+            f"{'':<10}{'slot-s/msg':>14}{'slot-s total':>16}"
+            f"{'msgs/s':>12}{'slots p/ rajada':>18}"
+        )
+        for label, busy in (("sleep", legacy_busy), ("deadline", deadline_busy)):
+            self.stdout.write(
+                f"{label:<10}{busy:>14.6f}{busy * total:>16.2f}"
+                f"{workers / busy:>12.1f}{math.ceil(busy * total / window):>18}"
+            )
+        self.stdout.write(
+            f"\nOUTBOUND disparadas pela varredura: {dispatched} "
+            f"(esperado: {len(conversation_ids)})"
+        )
+
+    def _seed(self, conversations, messages_per_conversation):
+        now = timezone.now()
+        conversation_objs = [
+            Conversation(id=uuid.uuid4()) for _ in range(conversations)
+        ]
+        Conversation.objects.bulk_create(conversation_objs)
+
+        message_objs = [
+            Message(
+                id=uuid.uuid4(),
+                conversation_id=conversation.id,
+                type=MessageType.INBOUND.value,
+                content=f"mensagem {index}",
+                timestamp=now + timedelta(milliseconds=index),
+            )
+            for conversation in conversation_objs
+            for index in range(messages_per_conversation)
+        ]
+        Message.objects.bulk_create(message_objs, batch_size=1000)
+        return [c.id for c in conversation_objs], [m.id for m in message_objs]
+
+    def _bench_legacy(self, message_ids):
+        """
+        Mede o trabalho de banco do debounce antigo por mensagem e soma o
+        time.sleep que ele fazia; o sleep não é executado de fato.
+        """
+        started = time.perf_counter()
+        for message_id in message_ids:
+            message = Message.objects.get(id=message_id)
+            window_start = timezone.now() - timedelta(
+                seconds=settings.CONVERSATION_DEBOUNCE_SECONDS
+            )
+            recent_inbounds = Message.objects.filter(
+                conversation=message.conversation,
+                type=MessageType.INBOUND.value,
+                timestamp__gte=window_start,
+            ).order_by("timestamp")
+            [str(msg.id) for msg in recent_inbounds]
+        query_time = (time.perf_counter() - started) / len(message_ids)
+        return settings.CONVERSATION_DEBOUNCE_SECONDS + query_time
+
+    def _bench_deadline(self, conversation_ids, message_ids):
+        started = time.perf_counter()
+        for message_id in message_ids:
+            tasks.process_inbound_message(str(message_id))
+
+        # Vence os prazos das conversas do benchmark sem esperar a janela real.
+        Conversation.objects.filter(id__in=conversation_ids).update(
+            flush_at=timezone.now() - timedelta(seconds=1)
+        )
+        flushed = 0
+        with mock.patch.object(tasks.generate_outbound_messages_task, "delay"):
+            while batch := tasks.flush_due_conversations():
+                flushed += batch
+        busy = (time.perf_counter() - started) / len(message_ids)
+        return busy, flushed
@@ -0,0 +1,155 @@
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from conversations.enums import MessageType, ReplyStatus
+from conversations.models import Conversation, Message
+
+
+def seed_conversations(conversations, messages_per_conversation):
+    """
+    Cria N conversas x M mensagens (1 OUTBOUND a cada 3) para os benchmarks
+    e retorna os ids das conversas.
+    """
+    now = timezone.now()
+    conversation_ids = [uuid.uuid4() for _ in range(conversations)]
+    Conversation.objects.bulk_create(
+        [Conversation(id=conversation_id) for conversation_id in conversation_ids],
+        batch_size=1000,
+    )
+
+    batch = []
+    for conversation_id in conversation_ids:
+        for index in range(messages_per_conversation):
+            batch.append(
+                Message(
+                    id=uuid.uuid4(),
+                    conversation_id=conversation_id,
+                    type=(
+                        MessageType.INBOUND.value
+                        if index % 3
+                        else MessageType.OUTBOUND.value
+                    ),
+                    content=f"mensagem {index}",
+                    timestamp=now
+                    - timedelta(seconds=messages_per_conversation - index),
+                )
+            )
+        if len(batch) >= 5000:
+            Message.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Message.objects.bulk_create(batch)
+
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Conversation._meta.db_table}")
+            cursor.execute(f"ANALYZE {Message._meta.db_table}")
+    return conversation_ids
+
+
+class Command(BaseCommand):
+    help = (
+        "Popula N conversas x M mensagens e mede a latência e o plano "
+        "(EXPLAIN) das consultas quentes: rajada do debounce, mensagens do "
+        "detalhe, varredura de prazos vencidos e página da listagem."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--conversations", type=int, default=1000)
+        parser.add_argument("--messages", type=int, default=50)
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=200,
+            help="Execuções de cada consulta para o cálculo de latência.",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Mantém os dados gerados ao final.",
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        started = time.perf_counter()
+        conversation_ids = seed_conversations(
+            options["conversations"], options["messages"]
+        )
+        self.stdout.write(
+            f"Seed: {options['conversations']} conversas x {options['messages']} "
+            f"mensagens em {time.perf_counter() - started:.1f}s "
+            f"({connection.vendor})\n"
+        )
+
+        try:
+            for name, build in self._hot_queries():
+                self._report(name, build, conversation_ids, options["repeat"], rng)
+        finally:
+            if not options["keep"]:
+                Conversation.objects.filter(id__in=conversation_ids).delete()
+
+    def _hot_queries(self):
+        def debounce(conversation_id):
+            return (
+                Message.objects.filter(
+                    conversation_id=conversation_id,
+                    reply_status=ReplyStatus.PENDING.value,
+                )
+                .order_by("timestamp")
+                .values_list("id", flat=True)
+            )
+
+        def detail_messages(conversation_id):
+            return Message.objects.filter(conversation_id=conversation_id).order_by(
+                "timestamp"
+            )
+
+        def due_conversations(conversation_id):
+            return Conversation.objects.filter(
+                flush_at__lte=timezone.now()
+            ).values_list("id", "flush_at")[: settings.CONVERSATION_FLUSH_BATCH_SIZE]
+
+        def list_page(conversation_id):
+            return Conversation.objects.order_by("-updated_at", "-id")[
+                : settings.CONVERSATIONS_PAGE_SIZE + 1
+            ]
+
+        return [
+            ("debounce (rajada INBOUND)", debounce),
+            ("detalhe (mensagens por timestamp)", detail_messages),
+            ("varredura de prazos vencidos", due_conversations),
+            ("página da listagem", list_page),
+        ]
+
+    def _report(self, name, build, conversation_ids, repeat, rng):
+        timings = []
+        for _ in range(repeat):
+            queryset = build(rng.choice(conversation_ids))
+            started = time.perf_counter()
+            list(queryset)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        self.stdout.write(
+            f"  média {statistics.mean(timings):.3f} ms | "
+            f"p50 {statistics.median(timings):.3f} ms | p95 {p95:.3f} ms"
+        )
+
+        explain_options = {}
+        if connection.vendor == "postgresql":
+            explain_options = {"analyze": True, "buffers": True}
+        plan = build(rng.choice(conversation_ids)).explain(**explain_options)
+        for line in plan.splitlines():
+            self.stdout.write(f"    {line}")
+        self.stdout.write("")
@@ -0,0 +1,104 @@
+import gzip
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+
+from conversations.models import Conversation
+from conversations.renderers import (
+    brotli,
+    conversation_values,
+    render_json,
+    serialize_conversations,
+)
+from conversations.serializers import ConversationSerializer
+from conversations.views import conversation_queryset
+
+from .bench_queries import seed_conversations
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a renderização das conversas pelo DRF (ConversationSerializer "
+        "+ JSONRenderer) com o caminho rápido (values() + orjson), em linhas "
+        "por segundo, e confere que os dois produzem os mesmos bytes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--conversations", type=int, default=200)
+        parser.add_argument("--messages", type=int, default=200)
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=50,
+            help="Conversas renderizadas por iteração.",
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Mantém os dados gerados ao final.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        conversation_ids = seed_conversations(
+            options["conversations"], options["messages"]
+        )
+        self.stdout.write(
+            f"Seed: {options['conversations']} conversas x {options['messages']} "
+            f"mensagens em {time.perf_counter() - started:.1f}s "
+            f"({connection.vendor})\n"
+        )
+
+        page = conversation_ids[: options["page_size"]]
+        rows_per_render = len(page) * (options["messages"] + 1)
+
+        def drf():
+            conversations = conversation_queryset().filter(id__in=page).order_by("id")
+            return JSONRenderer().render(
+                ConversationSerializer(conversations, many=True).data
+            )
+
+        def fast():
+            rows = list(
+                conversation_values(Conversation.objects.filter(id__in=page)).order_by(
+                    "id"
+                )
+            )
+            return render_json(serialize_conversations(rows))
+
+        try:
+            drf_content, fast_content = drf(), fast()
+            if drf_content != fast_content:
+                raise CommandError("O caminho rápido não reproduz o JSON do DRF.")
+
+            results = {}
+            for name, render in (("DRF", drf), ("values() + orjson", fast)):
+                timings = []
+                for _ in range(options["repeat"]):
+                    started = time.perf_counter()
+                    render()
+                    timings.append(time.perf_counter() - started)
+                best = min(timings)
+                results[name] = rows_per_render / best
+                self.stdout.write(
+                    f"{name:<18} {results[name]:>12,.0f} linhas/s "
+                    f"({best * 1000:.1f} ms para {rows_per_render} linhas)"
+                )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Ganho: {results['values() + orjson'] / results['DRF']:.1f}x"
+                )
+            )
+
+            self.stdout.write(f"\nCorpo: {len(fast_content):,} bytes")
+            self.stdout.write(f"  gzip   {len(gzip.compress(fast_content)):,} bytes")
+            if brotli is not None:
+                self.stdout.write(
+                    f"  brotli {len(brotli.compress(fast_content, quality=5)):,} bytes"
+                )
+        finally:
+            if not options["keep"]:
+                Conversation.objects.filter(id__in=conversation_ids).delete()
@@ -0,0 +1,43 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from conversations.responders import ResponderPipeline, SlowStubResponder
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a geração das respostas OUTBOUND uma a uma com o pipeline de "
+        "responders em paralelo, usando um responder lento simulado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bursts", type=int, default=64)
+        parser.add_argument(
+            "--delay",
+            type=float,
+            default=0.2,
+            help="Segundos de cada chamada ao responder simulado.",
+        )
+        parser.add_argument("--workers", type=int, default=16)
+
+    def handle(self, *args, **options):
+        requests = [
+            (str(uuid.uuid4()), ["Oi", "Tudo bem?"]) for _ in range(options["bursts"])
+        ]
+        responder = SlowStubResponder(delay=options["delay"])
+        timeout = options["delay"] * options["bursts"] + 1
+
+        for name, workers in (("Sequencial", 1), ("Pipeline", options["workers"])):
+            pipeline = ResponderPipeline(
+                [responder], max_workers=workers, timeout=timeout
+            )
+            started = time.perf_counter()
+            pipeline.generate_many(requests)
+            elapsed = time.perf_counter() - started
+            pipeline.executor.shutdown()
+            self.stdout.write(
+                f"{name} ({workers} thread(s)): {elapsed:.2f}s, "
+                f"{len(requests) / elapsed:.1f} respostas/s"
+            )
@@ -0,0 +1,70 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from conversations.serializers import WebhookSerializer, fast_validate_webhook
+
+
+def sample_events():
+    conversation_id = str(uuid.uuid4())
+    timestamp = "2025-06-04T14:20:00Z"
+    return {
+        "NEW_CONVERSATION": {
+            "type": "NEW_CONVERSATION",
+            "timestamp": timestamp,
+            "data": {"id": conversation_id},
+        },
+        "NEW_MESSAGE": {
+            "type": "NEW_MESSAGE",
+            "timestamp": timestamp,
+            "data": {
+                "id": str(uuid.uuid4()),
+                "conversation_id": conversation_id,
+                "content": "Olá, quero informações sobre alugar um apartamento.",
+            },
+        },
+        "CLOSE_CONVERSATION": {
+            "type": "CLOSE_CONVERSATION",
+            "timestamp": timestamp,
+            "data": {"id": conversation_id},
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara, por tipo de evento, a validação do webhook pelo "
+        "WebhookSerializer com o caminho rápido, em microssegundos por evento, "
+        "e confere que os dois produzem os mesmos dados validados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20000)
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+
+        def drf(payload):
+            serializer = WebhookSerializer(data=payload)
+            serializer.is_valid()
+            return serializer.validated_data
+
+        for event_type, payload in sample_events().items():
+            if fast_validate_webhook(payload) != drf(payload):
+                raise CommandError(
+                    f"O caminho rápido diverge do WebhookSerializer em {event_type}."
+                )
+
+            timings = {}
+            for name, validate in (("DRF", drf), ("rápido", fast_validate_webhook)):
+                started = time.perf_counter()
+                for _ in range(iterations):
+                    validate(payload)
+                timings[name] = (time.perf_counter() - started) / iterations * 1e6
+
+            self.stdout.write(
+                f"{event_type}: DRF {timings['DRF']:.1f}µs, "
+                f"rápido {timings['rápido']:.1f}µs por evento "
+                f"({timings['DRF'] / timings['rápido']:.1f}x)"
+            )
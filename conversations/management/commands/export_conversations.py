@@ -0,0 +1,66 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from conversations.exports import export_queryset, stream_export
+from conversations.serializers import ExportQuerySerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta as conversas ou as mensagens em NDJSON ou CSV, lendo o "
+        "banco em blocos (mesmos filtros de GET /export/)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--resource", default="messages", help="conversations ou messages."
+        )
+        parser.add_argument("--format", default="ndjson", help="ndjson ou csv.")
+        parser.add_argument("--status", help="OPEN ou CLOSED.")
+        parser.add_argument("--since", help="Início do intervalo (ISO 8601).")
+        parser.add_argument("--until", help="Fim do intervalo, exclusivo (ISO 8601).")
+        parser.add_argument(
+            "--output", default="-", help="Arquivo de saída (- para stdout)."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=settings.EXPORT_CHUNK_SIZE,
+            help="Linhas lidas do banco por vez.",
+        )
+
+    def handle(self, *args, **options):
+        query = ExportQuerySerializer(
+            data={
+                name: options[name]
+                for name in ("resource", "format", "status", "since", "until")
+                if options[name] is not None
+            }
+        )
+        if not query.is_valid():
+            raise CommandError(query.errors)
+        params = query.validated_data
+
+        columns, queryset = export_queryset(
+            params["resource"],
+            status=params.get("status"),
+            since=params.get("since"),
+            until=params.get("until"),
+        )
+        chunks = stream_export(
+            columns, queryset, params["format"], options["chunk_size"]
+        )
+        if options["output"] == "-":
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        with open(options["output"], "wb") as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stderr.write(
+            self.style.SUCCESS(f"Exportação gravada em {options['output']}.")
+        )
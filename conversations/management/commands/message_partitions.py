@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from conversations.partitions import (
+    drop_expired_message_partitions,
+    ensure_message_partitions,
+    is_partitioned,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Cria as partições de Message à frente do período atual e remove as "
+        "partições mais antigas que a retenção (Postgres)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=None,
+            help="Períodos a criar à frente (padrão: MESSAGE_PARTITIONS_AHEAD).",
+        )
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=None,
+            help=(
+                "Remove as partições com mensagens mais antigas que isso "
+                "(padrão: MESSAGE_RETENTION_DAYS; 0 mantém tudo)."
+            ),
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Só lista as partições que seriam removidas.",
+        )
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            self.stdout.write(
+                "A tabela de mensagens não é particionada (só no Postgres); nada a fazer."
+            )
+            return
+
+        created = (
+            [] if options["dry_run"] else ensure_message_partitions(options["ahead"])
+        )
+        dropped = drop_expired_message_partitions(
+            options["retention_days"], dry_run=options["dry_run"]
+        )
+
+        self.stdout.write(
+            f"Intervalo: {settings.MESSAGE_PARTITION_INTERVAL}. "
+            f"Criadas: {', '.join(created) or 'nenhuma'}."
+        )
+        label = "A remover" if options["dry_run"] else "Removidas"
+        self.stdout.write(
+            self.style.SUCCESS(f"{label}: {', '.join(dropped) or 'nenhuma'}.")
+        )
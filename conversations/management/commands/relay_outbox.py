@@ -0,0 +1,57 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from conversations.outbox import relay_batch
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Publica no broker, em lotes, as tasks gravadas no outbox "
+        "transacional (TASK_OUTBOX). Pode rodar em mais de uma réplica."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.OUTBOX_RELAY_BATCH_SIZE,
+            help="Tasks publicadas por lote.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.OUTBOX_RELAY_INTERVAL_SECONDS,
+            help="Espera, em segundos, quando o outbox está vazio ou em caso de falha.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Esvazia o outbox e termina.",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            close_old_connections()
+            try:
+                published = relay_batch(options["batch_size"])
+            except Exception:
+                # Banco ou broker indisponível: as linhas continuam no outbox.
+                logger.exception("[relay_outbox] Falha ao publicar o lote.")
+                if options["once"]:
+                    raise
+                time.sleep(options["interval"])
+                continue
+            total += published
+            if published < options["batch_size"]:
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"{total} tasks publicadas."))
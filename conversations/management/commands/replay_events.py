@@ -0,0 +1,58 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from conversations.replay import read_events, replay_events
+
+
+class Command(BaseCommand):
+    help = (
+        "Reprocessa eventos de webhook arquivados em arquivos NDJSON, "
+        "validados como no webhook e gravados em lotes (bulk_create ou COPY)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Arquivos NDJSON de eventos.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.REPLAY_BATCH_SIZE,
+            help="Eventos gravados por transação.",
+        )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="No Postgres, grava as mensagens com COPY em vez de INSERT.",
+        )
+        parser.add_argument(
+            "--skip-outbound",
+            action="store_true",
+            help=(
+                "Não publica as mensagens para processamento INBOUND "
+                "(nem geração das respostas OUTBOUND)."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = replay_events(
+            read_events(options["paths"]),
+            batch_size=options["batch_size"],
+            copy=options["copy"],
+            publish=not options["skip_outbound"],
+        )
+        elapsed = time.perf_counter() - started
+
+        rows = counts["conversations"] + counts["messages"]
+        self.stdout.write(
+            f"{counts['events']} eventos em {elapsed:.2f}s "
+            f"({counts['events'] / elapsed:.0f} eventos/s): "
+            f"{counts['conversations']} conversas criadas, "
+            f"{counts['closed']} fechadas, {counts['messages']} mensagens, "
+            f"{counts['duplicates']} duplicadas, {counts['rejected']} rejeitadas, "
+            f"{counts['invalid']} inválidas."
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"{rows} linhas gravadas ({rows / elapsed:.0f}/s).")
+        )
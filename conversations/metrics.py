@@ -0,0 +1,207 @@
+"""
+Métricas Prometheus do webhook e das tasks Celery, expostas em /metrics.
+
+- webhook_stage_seconds{stage, event_type}: duração de cada etapa do webhook
+  (validate, db, publish), por tipo de evento ("batch" para lotes);
+- webhook_events_total{event_type, status}: eventos processados por status HTTP;
+- webhook_duplicate_events_total{event_type}: retries reconhecidos como
+  duplicatas (taxa = duplicatas / webhook_events_total);
+- celery_task_runtime_seconds{task} e celery_tasks_total{task, state}: tempo
+  de execução e desfecho de cada task;
+- celery_task_queue_wait_seconds{task}: tempo entre a publicação e o início
+  da execução (carimbado em um header da mensagem);
+- outbound_responder_results_total{responder, outcome}: desfecho de cada
+  chamada dos responders da resposta OUTBOUND (ok, skipped, timeout, error
+  ou fallback);
+- outbox_published_tasks_total: tasks publicadas pelo relay do outbox.
+
+Em produção, cada serviço grava suas séries em arquivos mmap no diretório
+PROMETHEUS_MULTIPROC_DIR (modo multiprocess do prometheus_client, barato e
+sem locks entre processos). Quando os serviços usam subdiretórios de um mesmo
+PROMETHEUS_METRICS_ROOT, o /metrics agrega os arquivos de todos eles:
+workers do gunicorn, do uvicorn e do Celery.
+"""
+
+import glob
+import os
+import time
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from django.conf import settings
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from .enums import WebhookEventType
+
+STAGE_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+TASK_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+WEBHOOK_STAGE_SECONDS = Histogram(
+    "webhook_stage_seconds",
+    "Duração de cada etapa do webhook.",
+    ["stage", "event_type"],
+    buckets=STAGE_BUCKETS,
+)
+WEBHOOK_EVENTS = Counter(
+    "webhook_events",
+    "Eventos recebidos pelo webhook, por status HTTP.",
+    ["event_type", "status"],
+)
+WEBHOOK_DUPLICATES = Counter(
+    "webhook_duplicate_events",
+    "Eventos repetidos (retries do gateway) respondidos sem nova gravação.",
+    ["event_type"],
+)
+TASK_RUNTIME_SECONDS = Histogram(
+    "celery_task_runtime_seconds",
+    "Tempo de execução das tasks Celery.",
+    ["task"],
+    buckets=TASK_BUCKETS,
+)
+TASK_QUEUE_WAIT_SECONDS = Histogram(
+    "celery_task_queue_wait_seconds",
+    "Tempo entre a publicação da task e o início da execução.",
+    ["task"],
+    buckets=TASK_BUCKETS,
+)
+TASKS = Counter(
+    "celery_tasks",
+    "Tasks Celery executadas, por estado final.",
+    ["task", "state"],
+)
+RESPONDER_RESULTS = Counter(
+    "outbound_responder_results",
+    "Chamadas dos responders da resposta OUTBOUND, por desfecho.",
+    ["responder", "outcome"],
+)
+OUTBOX_PUBLISHED = Counter(
+    "outbox_published_tasks",
+    "Tasks do outbox transacional publicadas no broker pelo relay.",
+)
+
+BATCH = "batch"
+EVENT_TYPES = {event_type.value for event_type in WebhookEventType} | {BATCH}
+
+PUBLISHED_AT_HEADER = "published_at"
+
+
+def event_label(event_type):
+    """Restringe o rótulo aos tipos conhecidos, para não explodir a cardinalidade."""
+    return event_type if event_type in EVENT_TYPES else "unknown"
+
+
+def payload_event_type(payload):
+    return event_label(payload.get("type") if isinstance(payload, dict) else None)
+
+
+def stage(name, event_type):
+    """Context manager que mede uma etapa do webhook."""
+    return WEBHOOK_STAGE_SECONDS.labels(name, event_label(event_type)).time()
+
+
+def count_event(event_type, status):
+    WEBHOOK_EVENTS.labels(event_label(event_type), str(status)).inc()
+
+
+def count_duplicate(event_type, amount=1):
+    WEBHOOK_DUPLICATES.labels(event_label(event_type)).inc(amount)
+
+
+def count_responder(responder, outcome):
+    RESPONDER_RESULTS.labels(responder, outcome).inc()
+
+
+def count_outbox_published(amount):
+    OUTBOX_PUBLISHED.inc(amount)
+
+
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    if headers is not None:
+        headers[PUBLISHED_AT_HEADER] = time.time()
+
+
+_started = {}
+
+
+@task_prerun.connect
+def task_started(task_id=None, task=None, **kwargs):
+    _started[task_id] = time.perf_counter()
+    published_at = getattr(task.request, PUBLISHED_AT_HEADER, None)
+    if published_at is not None:
+        TASK_QUEUE_WAIT_SECONDS.labels(task.name).observe(
+            max(0.0, time.time() - published_at)
+        )
+
+
+@task_postrun.connect
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _started.pop(task_id, None)
+    if started is not None:
+        TASK_RUNTIME_SECONDS.labels(task.name).observe(time.perf_counter() - started)
+    TASKS.labels(task.name, state or "UNKNOWN").inc()
+
+
+class AggregatedMultiProcessCollector:
+    """
+    Agrega os arquivos mmap de todos os serviços, um subdiretório de
+    PROMETHEUS_METRICS_ROOT por serviço (os PIDs só são únicos dentro de
+    cada contêiner).
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def collect(self):
+        files = glob.glob(os.path.join(self.root, "*", "*.db"))
+        return MultiProcessCollector.merge(files, accumulate=True)
+
+
+def render_metrics():
+    """Retorna (conteúdo, content type) no formato texto do Prometheus."""
+    if settings.PROMETHEUS_METRICS_ROOT:
+        registry = CollectorRegistry()
+        registry.register(
+            AggregatedMultiProcessCollector(settings.PROMETHEUS_METRICS_ROOT)
+        )
+    elif os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
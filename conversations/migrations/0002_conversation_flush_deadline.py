@@ -0,0 +1,37 @@
+# Generated by Django 6.1.2 on 2026-10-17 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("conversations", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="flush_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="reply_status",
+            field=models.CharField(
+                blank=True,
+                choices=[("PENDING", "Pending"), ("ANSWERED", "Answered")],
+                max_length=10,
+                null=True,
+            ),
+        ),
+        # Índice parcial: só as poucas INBOUND à espera de resposta.
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                condition=models.Q(("reply_status", "PENDING")),
+                fields=["conversation"],
+                name="msg_reply_pending_idx",
+            ),
+        ),
+    ]
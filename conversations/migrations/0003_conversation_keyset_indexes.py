@@ -0,0 +1,26 @@
+# Generated by Django 6.1.2 on 2026-10-17 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("conversations", "0002_conversation_flush_deadline"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="conversation",
+            index=models.Index(
+                fields=["updated_at", "id"], name="conv_updated_at_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="conversation",
+            index=models.Index(
+                fields=["status", "updated_at", "id"],
+                name="conv_status_updated_at_id_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+from conversations.operations import AddIndexConcurrentlyIfPostgres
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação.
+    atomic = False
+
+    dependencies = [
+        ("conversations", "0003_conversation_keyset_indexes"),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyIfPostgres(
+            model_name="message",
+            index=models.Index(
+                fields=["conversation", "type", "timestamp"],
+                name="msg_conv_type_ts_idx",
+            ),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name="message",
+            index=models.Index(
+                fields=["conversation", "timestamp"], name="msg_conv_ts_idx"
+            ),
+        ),
+    ]
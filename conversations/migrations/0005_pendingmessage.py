@@ -0,0 +1,26 @@
+# Generated by Django 6.1.2 on 2026-10-17 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("conversations", "0004_message_composite_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingMessage",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(editable=False, primary_key=True, serialize=False),
+                ),
+                ("conversation_id", models.UUIDField(db_index=True)),
+                ("content", models.TextField()),
+                ("timestamp", models.DateTimeField()),
+                ("expires_at", models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-17 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("conversations", "0005_pendingmessage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
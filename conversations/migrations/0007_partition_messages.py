@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+from conversations.partitions import (
+    DEFAULT_PARTITION,
+    TABLE,
+    create_partition,
+    next_period,
+    periods,
+)
+
+
+def _indexes_and_foreign_keys(cursor):
+    """
+    Definições dos índices (exceto a chave primária) e das FKs da tabela,
+    para recriá-los com os mesmos nomes na tabela nova.
+    """
+    cursor.execute(
+        "SELECT i.indexname, i.indexdef FROM pg_indexes i "
+        "JOIN pg_class c ON c.relname = i.indexname "
+        "JOIN pg_index x ON x.indexrelid = c.oid "
+        "WHERE i.tablename = %s AND NOT x.indisprimary",
+        [TABLE],
+    )
+    indexes = [
+        definition.replace(" ON ONLY ", " ON ") for _, definition in cursor.fetchall()
+    ]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [TABLE],
+    )
+    foreign_keys = cursor.fetchall()
+    return indexes, foreign_keys
+
+
+def _rebuild(schema_editor, partitioned):
+    """
+    Recria conversations_message (particionada ou não), copia as linhas e
+    restaura índices e FKs. Roda na transação da migration.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        indexes, foreign_keys = _indexes_and_foreign_keys(cursor)
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{TABLE}_old"')
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{TABLE}_old" INCLUDING DEFAULTS)'
+            + (' PARTITION BY RANGE ("timestamp")' if partitioned else "")
+        )
+
+        if partitioned:
+            # Partições do período da mensagem mais antiga até
+            # MESSAGE_PARTITIONS_AHEAD períodos à frente.
+            interval = settings.MESSAGE_PARTITION_INTERVAL
+            cursor.execute(
+                f'SELECT MIN("timestamp"), MAX("timestamp") FROM "{TABLE}_old"'
+            )
+            oldest, newest = cursor.fetchone()
+            today = timezone.now().date()
+            last = today
+            for _ in range(settings.MESSAGE_PARTITIONS_AHEAD):
+                last = next_period(last, interval)
+            if newest is not None:
+                last = max(last, newest.date())
+            first = oldest.date() if oldest is not None else today
+            for start, end in periods(first, last, interval):
+                create_partition(cursor, start, end)
+            cursor.execute(
+                f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT'
+            )
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{TABLE}_old"')
+        cursor.execute(f'DROP TABLE "{TABLE}_old" CASCADE')
+
+        primary_key = '("id", "timestamp")' if partitioned else '("id")'
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY {primary_key}'
+        )
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(
+                f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}'
+            )
+
+
+def partition_messages(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        _rebuild(schema_editor, partitioned=True)
+
+
+def unpartition_messages(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        _rebuild(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+    """
+    Converte conversations_message em tabela particionada por timestamp no
+    Postgres (ver conversations/partitions.py). O estado do modelo não muda:
+    para o ORM, `id` continua sendo a chave primária. Nos demais bancos, não
+    faz nada.
+
+    Reescreve a tabela sob lock exclusivo: em bases grandes, rode em janela
+    de manutenção.
+    """
+
+    dependencies = [
+        ("conversations", "0006_conversation_version"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_messages, unpartition_messages),
+    ]
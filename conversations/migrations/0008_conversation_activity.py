@@ -0,0 +1,44 @@
+# Generated by Django 6.1.2 on 2026-10-17 18:20
+
+from django.db import migrations, models
+
+from conversations.operations import AddIndexConcurrentlyIfPostgres
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação.
+    atomic = False
+
+    dependencies = [
+        ("conversations", "0007_partition_messages"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversation",
+            name="last_inbound_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="conversation",
+            name="last_message_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="conversation",
+            name="last_outbound_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="conversation",
+            name="message_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name="conversation",
+            index=models.Index(
+                fields=["last_message_at", "id"], name="conv_last_message_at_id_idx"
+            ),
+        ),
+    ]
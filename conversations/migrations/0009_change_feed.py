@@ -0,0 +1,38 @@
+# Generated by Django 6.1.2 on 2026-10-17 18:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("conversations", "0008_conversation_activity"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Change",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("conversation", "Conversation"),
+                            ("message", "Message"),
+                        ],
+                        max_length=12,
+                    ),
+                ),
+                ("object_id", models.UUIDField()),
+                ("conversation_id", models.UUIDField()),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+            ],
+        ),
+    ]
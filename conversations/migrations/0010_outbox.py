@@ -0,0 +1,23 @@
+# Generated by Django 6.1.2 on 2026-10-17 18:36
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("conversations", "0009_change_feed"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxTask",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("task", models.CharField(max_length=255)),
+                ("args", models.JSONField(default=list)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.1.2 on 2026-10-17 19:03
+
+import conversations.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Grava em Change a transação de cada entrada, para GET /changes/ ler o
+    feed em ordem de (txid, id) abaixo do xmin do snapshot. As entradas
+    existentes recebem o id da transação da migration; cursores emitidos
+    antes dela deixam de ser aceitos e o consumidor recomeça do início.
+    """
+
+    dependencies = [
+        ("conversations", "0010_outbox"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="change",
+            name="txid",
+            field=models.BigIntegerField(
+                db_default=conversations.models.CurrentTransactionId()
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="change",
+            index=models.Index(fields=["txid", "id"], name="change_txid_id_idx"),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.1.2 on 2026-10-17 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("conversations", "0011_change_txid"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="change",
+            index=models.Index(
+                fields=["conversation_id", "id"], name="change_conversation_id_idx"
+            ),
+        ),
+    ]
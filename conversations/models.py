@@ -1,5 +1,6 @@
 import uuid
 from django.db import models
+from django.utils import timezone
 
 
 class Conversation(models.Model):
@@ -11,6 +12,15 @@ class Conversation(models.Model):
         status (CharField): Status atual da conversa ('OPEN' ou 'CLOSED').
         created_at (DateTimeField): Data e hora de criação da conversa.
         updated_at (DateTimeField): Data e hora da última atualização da conversa.
+        flush_at (DateTimeField): Prazo de debounce; quando vence, a rajada de
+            mensagens INBOUND pendentes é enviada para geração da resposta OUTBOUND.
+        version (PositiveIntegerField): Incrementada a cada mensagem inserida ou
+            mudança de status; identifica a representação atual (ETag).
+        message_count (PositiveIntegerField): Total de mensagens recebidas
+            pela conversa, incluindo as já removidas pela retenção.
+        last_message_at (DateTimeField): Timestamp da mensagem mais recente.
+        last_inbound_at (DateTimeField): Timestamp da INBOUND mais recente.
+        last_outbound_at (DateTimeField): Timestamp da OUTBOUND mais recente.
 
     Regras de negócio:
         - Apenas conversas com status 'OPEN' podem receber novas mensagens.
@@ -26,6 +36,27 @@ class Conversation(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="OPEN")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    flush_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    version = models.PositiveIntegerField(default=0)
+    # Agregados de Message, mantidos por persistence.insert_messages.
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_inbound_at = models.DateTimeField(null=True, blank=True)
+    last_outbound_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Paginação por keyset de GET /conversations/ em (updated_at, id)
+            models.Index(fields=["updated_at", "id"], name="conv_updated_at_id_idx"),
+            models.Index(
+                fields=["status", "updated_at", "id"],
+                name="conv_status_updated_at_id_idx",
+            ),
+            # GET /conversations/?ordering=last_message_at
+            models.Index(
+                fields=["last_message_at", "id"], name="conv_last_message_at_id_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"Conversation {self.id} - {self.status}"
@@ -41,10 +72,15 @@ class Message(models.Model):
         type (CharField): Tipo da mensagem ('INBOUND' ou 'OUTBOUND').
         content (TextField): Conteúdo textual da mensagem.
         timestamp (DateTimeField): Data e hora da criação ou recebimento da mensagem.
+        reply_status (CharField): Situação da INBOUND no debounce: vazio até o
+            processamento INBOUND, 'PENDING' na rajada que aguarda resposta e
+            'ANSWERED' depois que a rajada é enviada para a resposta OUTBOUND.
 
     Regras de negócio:
         - Mensagens 'INBOUND' são criadas a partir de eventos recebidos via webhook.
         - Mensagens 'OUTBOUND' são geradas internamente pelo sistema via Celery.
+        - A rajada de uma conversa são as suas INBOUND em 'PENDING'; cada
+          mensagem entra em uma única rajada, independentemente do timestamp.
     """
 
     MESSAGE_TYPES = [
@@ -52,6 +88,11 @@ class Message(models.Model):
         ("OUTBOUND", "Outbound"),
     ]
 
+    REPLY_STATUSES = [
+        ("PENDING", "Pending"),
+        ("ANSWERED", "Answered"),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     conversation = models.ForeignKey(
         Conversation, on_delete=models.CASCADE, related_name="messages"
@@ -59,6 +100,26 @@ class Message(models.Model):
     type = models.CharField(max_length=10, choices=MESSAGE_TYPES)
     content = models.TextField()
     timestamp = models.DateTimeField()
+    reply_status = models.CharField(
+        max_length=10, choices=REPLY_STATUSES, null=True, blank=True
+    )
+
+    class Meta:
+        indexes = [
+            # Rajada de INBOUND do debounce: conversation + type + timestamp >= x
+            models.Index(
+                fields=["conversation", "type", "timestamp"],
+                name="msg_conv_type_ts_idx",
+            ),
+            # Rajada pendente da conversa no flush (poucas linhas por vez)
+            models.Index(
+                fields=["conversation"],
+                name="msg_reply_pending_idx",
+                condition=models.Q(reply_status="PENDING"),
+            ),
+            # Mensagens de uma conversa ordenadas por timestamp (detalhe/listagem)
+            models.Index(fields=["conversation", "timestamp"], name="msg_conv_ts_idx"),
+        ]
 
     def __str__(self):
         """
@@ -68,3 +129,130 @@ class Message(models.Model):
             'Message <UUID> - INBOUND'
         """
         return f"Message {self.id} - {self.type}"
+
+
+class PendingMessage(models.Model):
+    """
+    Mensagem recebida antes do NEW_CONVERSATION da sua conversa.
+
+    Campos:
+        id (UUIDField): Identificador da mensagem (o mesmo usado em Message).
+        conversation_id (UUIDField): Conversa ainda não criada a que a mensagem pertence.
+        content (TextField): Conteúdo textual da mensagem.
+        timestamp (DateTimeField): Data e hora do evento NEW_MESSAGE.
+        expires_at (DateTimeField): Limite para a conversa ser criada
+            (timestamp + MESSAGE_BUFFER_SECONDS).
+
+    Regras de negócio:
+        - O NEW_CONVERSATION move as pendentes não expiradas para Message
+          em um único bulk insert.
+        - Pendentes expiradas são ignoradas e removidas periodicamente.
+    """
+
+    id = models.UUIDField(primary_key=True, editable=False)
+    conversation_id = models.UUIDField(db_index=True)
+    content = models.TextField()
+    timestamp = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"PendingMessage {self.id} - {self.conversation_id}"
+
+
+class CurrentTransactionId(models.Func):
+    """
+    Id da transação que grava a linha (txid_current()) no Postgres; 0 nos
+    demais bancos, que não têm escritas concorrentes (SQLite).
+    """
+
+    template = "0"
+    output_field = models.BigIntegerField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return "txid_current()", []
+
+
+class SnapshotXmin(models.Func):
+    """
+    Menor id de transação ainda em andamento no snapshot da consulta
+    (txid_snapshot_xmin): toda transação abaixo dele já terminou, e nenhuma
+    transação futura recebe um id menor. Nos demais bancos, o maior bigint.
+    """
+
+    template = "9223372036854775807"
+    output_field = models.BigIntegerField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return "txid_snapshot_xmin(txid_current_snapshot())", []
+
+
+class Change(models.Model):
+    """
+    Entrada do feed de mudanças (GET /changes/): uma linha por conversa ou
+    mensagem criada ou alterada, gravada na mesma transação da mudança.
+
+    Campos:
+        id (BigAutoField): Sequência do feed.
+        txid (BigIntegerField): Transação que gravou a entrada; o feed é lido
+            em ordem de (txid, id) e o cursor é o último par lido.
+        kind (CharField): O que mudou ('conversation' ou 'message').
+        object_id (UUIDField): Id da conversa ou da mensagem.
+        conversation_id (UUIDField): Conversa a que a mudança pertence.
+        created_at (DateTimeField): Momento da gravação.
+
+    Regras de negócio:
+        - A linha não guarda o estado: o feed devolve o estado atual do
+          objeto, então entradas repetidas do mesmo objeto são inofensivas.
+        - Entradas mais antigas que CHANGES_RETENTION_DAYS são removidas
+          periodicamente.
+    """
+
+    KINDS = [
+        ("conversation", "Conversation"),
+        ("message", "Message"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    txid = models.BigIntegerField(db_default=CurrentTransactionId())
+    kind = models.CharField(max_length=12, choices=KINDS)
+    object_id = models.UUIDField()
+    conversation_id = models.UUIDField()
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Leitura do feed em ordem de (txid, id) a partir do cursor
+            models.Index(fields=["txid", "id"], name="change_txid_id_idx"),
+            # Mensagens de uma conversa a partir do Last-Event-ID (stream SSE)
+            models.Index(
+                fields=["conversation_id", "id"], name="change_conversation_id_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Change {self.id} - {self.kind} {self.object_id}"
+
+
+class OutboxTask(models.Model):
+    """
+    Task do Celery a publicar, gravada na mesma transação da mudança que a
+    originou (outbox transacional, ver conversations/outbox.py).
+
+    Campos:
+        id (BigAutoField): Ordem de publicação.
+        task (CharField): Nome da task registrada no Celery.
+        args (JSONField): Argumentos posicionais da task.
+        created_at (DateTimeField): Momento da gravação.
+
+    Regras de negócio:
+        - O relay publica as linhas em ordem de id, em lotes, e as remove na
+          mesma transação; uma linha só some depois de publicada.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    task = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"OutboxTask {self.id} - {self.task}"
@@ -0,0 +1,194 @@
+"""
+Outbox transacional das tasks publicadas pelo webhook.
+
+Cada ponto que publica uma task chama enqueue() dentro da transação que
+grava a mudança e publish() depois do commit; só um dos dois age, conforme
+TASK_OUTBOX. Com TASK_OUTBOX, enqueue() grava a task em OutboxTask junto
+com a mensagem que a originou e publish() não fala com o broker. O relay
+(`manage.py relay_outbox`) lê o outbox em lotes, publica cada lote no broker
+com um único producer (no Redis, os LPUSH do lote vão em um único pipeline,
+ver PipelinedProducer) e apaga as linhas publicadas na mesma transação em
+que as travou. O webhook deixa de esperar pelo broker e uma falha de
+publicação não perde a task: a linha fica no outbox até ser publicada. A
+entrega é pelo menos uma vez; as tasks publicadas assim toleram repetição.
+
+Sem TASK_OUTBOX, publish() chama task.delay() como antes, enqueue() não
+grava nada e atomic() não abre transação.
+"""
+
+import contextlib
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from kombu.compression import compress
+from kombu.entity import maybe_delivery_mode
+from kombu.serialization import dumps
+from kombu.utils.json import dumps as json_dumps
+from kombu.utils.uuid import uuid
+
+from realmate_challenge.celery_app import app as celery_app
+
+from .metrics import count_outbox_published
+from .models import OutboxTask
+
+try:
+    from kombu.transport import redis as redis_transport
+except ImportError:
+    redis_transport = None
+
+logger = logging.getLogger(__name__)
+
+
+def atomic():
+    """Transação para a gravação e o enqueue() das suas tasks, com TASK_OUTBOX."""
+    return transaction.atomic() if settings.TASK_OUTBOX else contextlib.nullcontext()
+
+
+def enqueue(task, *args):
+    """
+    Com TASK_OUTBOX, grava a task no outbox. Chamar dentro da transação da
+    mudança que a origina; sem TASK_OUTBOX, não faz nada.
+    """
+    if settings.TASK_OUTBOX:
+        OutboxTask.objects.create(task=task.name, args=list(args))
+
+
+def publish(task, *args):
+    """
+    Sem TASK_OUTBOX, publica a task direto no broker. Chamar depois do
+    commit, no lugar de task.delay(); com TASK_OUTBOX, não faz nada (a task
+    já foi gravada por enqueue()).
+    """
+    if not settings.TASK_OUTBOX:
+        task.delay(*args)
+
+
+# Argumentos de kombu.Producer.publish que não vão para a mensagem.
+PUBLISH_OPTIONS = (
+    "mandatory",
+    "immediate",
+    "retry",
+    "retry_policy",
+    "declare",
+    "timeout",
+    "confirm_timeout",
+)
+
+
+class PipelinedProducer:
+    """
+    Producer para celery_app.send_task que, em vez de um LPUSH por task,
+    acumula as mensagens em um pipeline do redis-py, enviado por flush().
+
+    O Celery continua montando a task (roteamento, protocolo, sinais de
+    publicação) e chamando publish(); aqui a mensagem é serializada como o
+    kombu.Producer faria e posta no envelope do transporte virtual
+    (prepare_message/encode_body do canal), direto na lista da fila. Só vale
+    para a troca anônima sem prioridade, que é como o Celery publica em
+    filas diretas; o resto vai pelo producer de verdade.
+    """
+
+    def __init__(self, producer, pipeline):
+        self.producer = producer
+        self.connection = producer.connection
+        self.channel = producer.channel
+        self.pipeline = pipeline
+
+    def publish(
+        self,
+        body,
+        routing_key=None,
+        delivery_mode=None,
+        priority=0,
+        serializer=None,
+        headers=None,
+        compression=None,
+        exchange=None,
+        expiration=None,
+        **properties,
+    ):
+        """Mesma assinatura de kombu.Producer.publish."""
+        if exchange or priority:
+            return self.producer.publish(
+                body,
+                routing_key=routing_key,
+                delivery_mode=delivery_mode,
+                priority=priority,
+                serializer=serializer,
+                headers=headers,
+                compression=compression,
+                exchange=exchange,
+                expiration=expiration,
+                **properties,
+            )
+        for name in PUBLISH_OPTIONS:
+            properties.pop(name, None)
+        headers = {} if headers is None else headers
+        properties["delivery_mode"] = maybe_delivery_mode(
+            delivery_mode or self.producer.exchange.delivery_mode
+        )
+        if expiration is not None:
+            properties["expiration"] = str(int(expiration * 1000))
+        content_type, content_encoding, body = dumps(body, serializer=serializer)
+        if compression:
+            body, headers["compression"] = compress(body, compression)
+        message = self.channel.prepare_message(
+            body, priority, content_type, content_encoding, headers, properties
+        )
+        message["body"], body_encoding = self.channel.encode_body(
+            message["body"], self.channel.body_encoding
+        )
+        message["properties"].update(body_encoding=body_encoding, delivery_tag=uuid())
+        message["properties"]["delivery_info"].update(
+            exchange="", routing_key=routing_key
+        )
+        self.pipeline.lpush(routing_key, json_dumps(message))
+
+    def flush(self):
+        self.pipeline.execute()
+
+
+@contextlib.contextmanager
+def _batch_producer(producer):
+    """
+    No transporte Redis, um PipelinedProducer que envia o lote ao final do
+    bloco; nos demais, o próprio producer.
+    """
+    if redis_transport is None or not isinstance(
+        producer.channel, redis_transport.Channel
+    ):
+        yield producer
+        return
+    batch = PipelinedProducer(
+        producer, producer.channel.client.pipeline(transaction=False)
+    )
+    yield batch
+    batch.flush()
+
+
+def relay_batch(limit=None) -> int:
+    """
+    Publica até `limit` tasks do outbox (OUTBOX_RELAY_BATCH_SIZE), em ordem
+    de gravação, e as remove. Com SKIP LOCKED, relays concorrentes pegam
+    lotes diferentes. Se a publicação falha, a transação é desfeita e as
+    linhas ficam para a próxima rodada. Retorna quantas foram publicadas.
+    """
+    limit = limit or settings.OUTBOX_RELAY_BATCH_SIZE
+    with transaction.atomic():
+        rows = list(
+            OutboxTask.objects.select_for_update(skip_locked=True)
+            .order_by("id")
+            .values_list("id", "task", "args")[:limit]
+        )
+        if not rows:
+            return 0
+        with celery_app.producer_or_acquire() as producer:
+            with _batch_producer(producer) as batch:
+                for _, task, args in rows:
+                    celery_app.send_task(task, args=args, producer=batch)
+        OutboxTask.objects.filter(id__in=[row[0] for row in rows]).delete()
+
+    count_outbox_published(len(rows))
+    logger.info(f"[relay_batch] {len(rows)} tasks publicadas.")
+    return len(rows)
@@ -0,0 +1,100 @@
+import base64
+import binascii
+import uuid
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(field: str, value: datetime, object_id) -> str:
+    """
+    Codifica a posição (valor do campo de ordenação, id) da última linha
+    de uma página em um cursor opaco, junto com o campo de ordenação.
+    """
+    raw = f"{field}|{value.isoformat()}|{object_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, field: str) -> tuple[datetime, uuid.UUID]:
+    """
+    Decodifica um cursor de encode_cursor. Um cursor emitido para outra
+    ordenação apontaria para a página errada: levanta InvalidCursor.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        cursor_field, value, object_id = raw.split("|")
+        if cursor_field != field:
+            raise ValueError(cursor)
+        return datetime.fromisoformat(value), uuid.UUID(object_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise InvalidCursor(cursor)
+
+
+def encode_change_cursor(txid: int, sequence: int) -> str:
+    """
+    Cursor opaco do feed de mudanças: a posição (transação, sequência) da
+    última entrada lida.
+    """
+    return base64.urlsafe_b64encode(f"chg|{txid}|{sequence}".encode()).decode()
+
+
+def decode_change_cursor(cursor: str) -> tuple[int, int]:
+    try:
+        prefix, txid, sequence = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        )
+        if prefix != "chg" or int(txid) < 0 or int(sequence) < 0:
+            raise ValueError(cursor)
+        return int(txid), int(sequence)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise InvalidCursor(cursor)
+
+
+def paginate_keyset(queryset, cursor, page_size, field="updated_at"):
+    """
+    Pagina o queryset por keyset em ordem decrescente de (field, id).
+
+    Em vez de OFFSET, cada página continua a partir da última linha da
+    anterior, então o custo de uma página não cresce com a tabela desde
+    que exista um índice em (field, id).
+
+    Aceita querysets de modelos ou de values() (linhas como dict, que devem
+    incluir `field` e "id").
+
+    Retorna a lista de objetos da página e o cursor da próxima página
+    (None quando não há mais resultados).
+    """
+    rows = list(_keyset_slice(queryset, cursor, page_size, field))
+    return _keyset_page(rows, page_size, field)
+
+
+async def apaginate_keyset(queryset, cursor, page_size, field="updated_at"):
+    """Versão assíncrona de paginate_keyset, usando o ORM assíncrono."""
+    rows = [row async for row in _keyset_slice(queryset, cursor, page_size, field)]
+    return _keyset_page(rows, page_size, field)
+
+
+def _keyset_slice(queryset, cursor, page_size, field):
+    queryset = queryset.order_by(f"-{field}", "-id")
+    if cursor:
+        value, last_id = decode_cursor(cursor, field)
+        queryset = queryset.filter(
+            Q(**{f"{field}__lt": value}) | Q(**{field: value, "id__lt": last_id})
+        )
+    # Uma linha a mais indica se existe próxima página.
+    return queryset[: page_size + 1]
+
+
+def _keyset_page(rows, page_size, field):
+    if len(rows) <= page_size:
+        return rows, None
+
+    rows = rows[:page_size]
+    last = rows[-1]
+    if isinstance(last, dict):
+        return rows, encode_cursor(field, last[field], last["id"])
+    return rows, encode_cursor(field, getattr(last, field), last.id)
@@ -0,0 +1,201 @@
+"""
+Particionamento de Message por timestamp (Postgres).
+
+No Postgres, a tabela de mensagens é particionada por intervalo (RANGE) em
+`timestamp`, com uma partição por MESSAGE_PARTITION_INTERVAL ("month", o
+padrão, "week" ou "day") e uma partição DEFAULT que recebe o que cair fora
+das partições criadas. As consultas continuam passando pelo ORM: o Postgres
+descarta as partições fora do filtro de timestamp e mantém os índices de
+cada uma pequenos.
+
+- ensure_message_partitions cria as partições do período atual e das
+  MESSAGE_PARTITIONS_AHEAD seguintes (executada periodicamente pelo beat);
+- drop_expired_message_partitions remove as partições inteiramente mais
+  antigas que MESSAGE_RETENTION_DAYS, com DETACH + DROP em vez de DELETE.
+
+A chave primária no banco passa a ser (id, timestamp), pois o Postgres exige
+a coluna de partição em toda restrição única. A unicidade do id é conferida
+no insert, sob um advisory lock por id (persistence.unique_messages).
+
+Remover uma partição não toca em nenhuma outra tabela: os agregados das
+conversas (message_count, last_*_at) contam o histórico inteiro, e as
+entradas do feed de mudanças que apontam para mensagens removidas são
+ignoradas na leitura e expiram com CHANGES_RETENTION_DAYS.
+
+Nos demais bancos (ex.: SQLite dos testes) as funções não fazem nada.
+"""
+
+import logging
+import re
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TABLE = "conversations_message"
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+def period_start(value: date, interval: str) -> date:
+    """Início do período (dia, semana ISO ou mês) que contém `value`."""
+    if interval == "day":
+        return value
+    if interval == "week":
+        return value - timedelta(days=value.weekday())
+    if interval == "month":
+        return value.replace(day=1)
+    raise ValueError(f"Intervalo de partição inválido: {interval!r}")
+
+
+def next_period(start: date, interval: str) -> date:
+    if interval == "day":
+        return start + timedelta(days=1)
+    if interval == "week":
+        return start + timedelta(days=7)
+    if interval == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    raise ValueError(f"Intervalo de partição inválido: {interval!r}")
+
+
+def periods(first: date, last: date, interval: str) -> list:
+    """Lista de (início, fim) dos períodos de `first` até o que contém `last`."""
+    start = period_start(first, interval)
+    bounds = []
+    while start <= last:
+        end = next_period(start, interval)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def partition_name(start: date) -> str:
+    return f"{TABLE}_p{start:%Y%m%d}"
+
+
+def _utc(value: date) -> datetime:
+    return datetime.combine(value, time.min, tzinfo=dt_timezone.utc)
+
+
+def is_partitioned(using=None) -> bool:
+    using = using or connection
+    if using.vendor != "postgresql":
+        return False
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def existing_partitions(using=None) -> dict:
+    """{nome: limite superior (datetime) ou None para a DEFAULT}."""
+    using = using or connection
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s AND pg_table_is_visible(p.oid)",
+            [TABLE],
+        )
+        partitions = {}
+        for name, bound in cursor.fetchall():
+            match = _UPPER_BOUND.search(bound or "")
+            partitions[name] = datetime.fromisoformat(match.group(1)) if match else None
+        return partitions
+
+
+def create_partition(cursor, start: date, end: date) -> str:
+    name = partition_name(start)
+    # DDL não aceita parâmetros ligados; os limites são datas geradas aqui.
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{TABLE}" '
+        f"FOR VALUES FROM ('{_utc(start).isoformat()}') TO ('{_utc(end).isoformat()}')"
+    )
+    return name
+
+
+def ensure_message_partitions(ahead=None, today=None, using=None) -> list:
+    """
+    Cria as partições do período atual e dos `ahead` seguintes que ainda não
+    existem. Retorna os nomes criados.
+    """
+    using = using or connection
+    if not is_partitioned(using):
+        return []
+    interval = settings.MESSAGE_PARTITION_INTERVAL
+    ahead = settings.MESSAGE_PARTITIONS_AHEAD if ahead is None else ahead
+    today = today or timezone.now().date()
+
+    last = period_start(today, interval)
+    for _ in range(ahead):
+        last = next_period(last, interval)
+
+    existing = existing_partitions(using)
+    created = []
+    for start, end in periods(today, last, interval):
+        name = partition_name(start)
+        if name in existing:
+            continue
+        try:
+            with transaction.atomic(using=using.alias), using.cursor() as cursor:
+                create_partition(cursor, start, end)
+        except DatabaseError as exc:
+            # Ex.: a DEFAULT já tem linhas no intervalo ou o intervalo mudou e
+            # sobrepõe uma partição existente; as mensagens seguem na DEFAULT.
+            logger.warning(
+                f"[ensure_message_partitions] Partição {name} não criada: {exc}"
+            )
+            continue
+        created.append(name)
+
+    if created:
+        logger.info(f"[ensure_message_partitions] Partições criadas: {created}")
+    return created
+
+
+def expired_partitions(partitions: dict, cutoff: datetime) -> list:
+    """Partições cujo limite superior é anterior ou igual a `cutoff`."""
+    return sorted(
+        name
+        for name, upper in partitions.items()
+        if upper is not None and upper <= cutoff
+    )
+
+
+def drop_expired_message_partitions(
+    retention_days=None, dry_run=False, using=None
+) -> list:
+    """
+    Remove as partições com todas as mensagens mais antigas que
+    `retention_days` (MESSAGE_RETENTION_DAYS; 0 mantém tudo). Retorna os
+    nomes removidos (ou que seriam removidos, com dry_run).
+    """
+    using = using or connection
+    retention_days = (
+        settings.MESSAGE_RETENTION_DAYS if retention_days is None else retention_days
+    )
+    if not retention_days or not is_partitioned(using):
+        return []
+
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    expired = expired_partitions(existing_partitions(using), cutoff)
+    if dry_run:
+        return expired
+
+    for name in expired:
+        with transaction.atomic(using=using.alias), using.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+            cursor.execute(f'DROP TABLE "{name}"')
+    if expired:
+        logger.info(f"[drop_expired_message_partitions] Partições removidas: {expired}")
+    return expired
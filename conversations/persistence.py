@@ -0,0 +1,530 @@
+import io
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import (
+    Case,
+    Count,
+    DateTimeField,
+    F,
+    Max,
+    PositiveIntegerField,
+    Q,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from .cache import render_cache
+from .enums import ChangeKind, ConversationStatus, MessageType
+from .models import Change, Conversation, Message
+
+
+class ConversationClosed(Exception):
+    """A conversa da mensagem não estava aberta no momento da gravação."""
+
+
+def record_changes(conversation_ids=(), messages=()):
+    """
+    Grava, em um único insert, as entradas do feed de mudanças (GET
+    /changes/) das conversas e mensagens criadas ou alteradas. Deve rodar
+    na transação da própria mudança.
+    """
+    entries = [
+        Change(
+            kind=ChangeKind.CONVERSATION.value,
+            object_id=conversation_id,
+            conversation_id=conversation_id,
+        )
+        for conversation_id in conversation_ids
+    ]
+    entries += [
+        Change(
+            kind=ChangeKind.MESSAGE.value,
+            object_id=message.id,
+            conversation_id=message.conversation_id,
+        )
+        for message in messages
+    ]
+    if entries:
+        Change.objects.bulk_create(entries)
+
+
+def _insert_sql(objs, returning=""):
+    """
+    INSERT ... ON CONFLICT DO NOTHING de `objs` (todos do mesmo modelo) com
+    os valores preparados como no save(), mais a cláusula `returning`.
+    """
+    model = type(objs[0])
+    fields = [field for field in model._meta.concrete_fields if not field.generated]
+    quote = connection.ops.quote_name
+    row = f"({', '.join(['%s'] * len(fields))})"
+    sql = (
+        f"INSERT INTO {quote(model._meta.db_table)} "
+        f"({', '.join(quote(field.column) for field in fields)}) "
+        f"VALUES {', '.join([row] * len(objs))} ON CONFLICT DO NOTHING{returning}"
+    )
+    params = [
+        field.get_db_prep_save(field.pre_save(obj, True), connection)
+        for obj in objs
+        for field in fields
+    ]
+    return sql, params
+
+
+def insert_ignore(obj):
+    """
+    Grava `obj` em um único INSERT ... ON CONFLICT DO NOTHING. Retorna True
+    se a linha foi inserida, pela contagem de linhas afetadas.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(*_insert_sql([obj]))
+        return cursor.rowcount > 0
+
+
+def insert_new(objs):
+    """
+    Grava `objs` em um único INSERT ... ON CONFLICT DO NOTHING RETURNING e
+    retorna o conjunto das chaves primárias que foram de fato inseridas.
+    """
+    if not objs:
+        return set()
+    pk = type(objs[0])._meta.pk
+    returning = f" RETURNING {connection.ops.quote_name(pk.column)}"
+    with connection.cursor() as cursor:
+        cursor.execute(*_insert_sql(objs, returning))
+        return {pk.to_python(row[0]) for row in cursor.fetchall()}
+
+
+def lock_message_ids(message_ids):
+    """
+    No Postgres, trava cada id de mensagem com um advisory lock da transação,
+    em ordem, para que inserts concorrentes do mesmo id se serializem entre
+    a checagem de existência e o insert. Nos demais bancos, não faz nada.
+    """
+    if connection.vendor != "postgresql" or not message_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(hashtextextended(k, 0)) "
+            "FROM (SELECT k FROM unnest(%s::text[]) AS k ORDER BY k) AS ids",
+            [sorted({str(message_id) for message_id in message_ids})],
+        )
+
+
+def unique_messages(messages, ignore_conflicts=False):
+    """
+    Garante a unicidade do id das mensagens, que no Postgres a chave primária
+    (id, timestamp) de Message particionada não garante: trava os ids
+    (lock_message_ids) e confere quais já existem em qualquer partição. Sem
+    ignore_conflicts, um id já gravado (ou repetido na lista) levanta
+    IntegrityError; com ignore_conflicts, retorna só as mensagens novas (a
+    primeira de cada id). Deve rodar na transação do insert.
+    """
+    if connection.vendor != "postgresql" and not ignore_conflicts:
+        # Sem partições, a chave primária (id) já recusa o id repetido.
+        return messages
+    to_id = Message._meta.pk.to_python
+    ids = {to_id(message.id) for message in messages}
+    lock_message_ids(ids)
+    existing = set(Message.objects.filter(id__in=ids).values_list("id", flat=True))
+    new_messages = []
+    for message in messages:
+        message_id = to_id(message.id)
+        if message_id in existing:
+            if not ignore_conflicts:
+                raise IntegrityError(f"Mensagem {message_id} já existe.")
+            continue
+        existing.add(message_id)
+        new_messages.append(message)
+    return new_messages
+
+
+def create_conversation(conversation_id):
+    """
+    Cria a conversa em um único INSERT condicional, sem SELECT antes:
+    NEW_CONVERSATION duplicados ou concorrentes não inserem nada e recebem
+    created=False. Registra a criação no feed de mudanças.
+    """
+    conversation = Conversation(id=conversation_id)
+    with transaction.atomic():
+        created = insert_ignore(conversation)
+        if created:
+            record_changes([conversation.id])
+    return conversation, created
+
+
+def create_conversations(conversations):
+    """
+    Versão em lote de create_conversation, em um único INSERT ... ON
+    CONFLICT DO NOTHING RETURNING (insert_new). Retorna o conjunto dos ids
+    inseridos; as que já existiam ficam como estão e fora do feed.
+    """
+    if not conversations:
+        return set()
+    with transaction.atomic():
+        created = insert_new(conversations)
+        to_id = Conversation._meta.pk.to_python
+        record_changes(
+            [
+                conversation.id
+                for conversation in conversations
+                if to_id(conversation.id) in created
+            ]
+        )
+    return created
+
+
+def _touch(conversation_ids, messages, changes, **conditions):
+    conversation_ids = list(conversation_ids)
+    if not conversation_ids:
+        return 0
+    updated = Conversation.objects.filter(id__in=conversation_ids, **conditions).update(
+        version=F("version") + 1, **changes
+    )
+    if updated:
+        record_changes(conversation_ids, messages)
+        transaction.on_commit(lambda: render_cache.invalidate(conversation_ids))
+    return updated
+
+
+def bump_versions(conversation_ids, **changes):
+    """
+    Incrementa a versão das conversas, aplicando `changes` no mesmo UPDATE,
+    registra a mudança no feed e invalida o render cacheado depois do commit
+    (invalidar antes permitiria a um leitor concorrente cachear de novo o
+    estado anterior).
+
+    Deve ser chamada sempre que uma mensagem é inserida ou o status muda.
+    """
+    with transaction.atomic():
+        return _touch(conversation_ids, (), changes)
+
+
+def close_conversation(conversation_id, updated_at):
+    """
+    Fecha a conversa em um único UPDATE condicional (... WHERE status =
+    'OPEN'), que também incrementa a versão; o feed e o cache seguem
+    bump_versions. Entre CLOSE_CONVERSATION concorrentes, só um atualiza a
+    linha. Retorna False se a conversa não existe ou já estava fechada.
+    """
+    with transaction.atomic():
+        return (
+            _touch(
+                [conversation_id],
+                (),
+                {"status": ConversationStatus.CLOSED.value, "updated_at": updated_at},
+                status=ConversationStatus.OPEN.value,
+            )
+            > 0
+        )
+
+
+def close_conversations(conversation_ids, updated_at):
+    """
+    Versão em lote de close_conversation: um único UPDATE ... WHERE status
+    = 'OPEN'. Levanta ConversationClosed, desfazendo a transação, se alguma
+    não estava aberta; o chamador que precisa do resultado por conversa deve
+    travar e conferir as linhas antes (SELECT ... FOR UPDATE).
+    """
+    conversation_ids = list(conversation_ids)
+    if not conversation_ids:
+        return 0
+    with transaction.atomic():
+        closed = _touch(
+            conversation_ids,
+            (),
+            {"status": ConversationStatus.CLOSED.value, "updated_at": updated_at},
+            status=ConversationStatus.OPEN.value,
+        )
+        if closed < len(conversation_ids):
+            raise ConversationClosed
+    return closed
+
+
+def _latest(field, timestamps):
+    """
+    Avança `field` até o timestamp de cada conversa em `timestamps`, sem
+    recuar (mensagens fora de ordem não voltam o valor).
+    """
+    return Case(
+        *(
+            When(
+                id=conversation_id,
+                then=Greatest(Coalesce(F(field), Value(ts)), Value(ts)),
+            )
+            for conversation_id, ts in timestamps.items()
+        ),
+        default=F(field),
+        output_field=DateTimeField(),
+    )
+
+
+def _activity(messages):
+    """
+    Agregados de Message por conversa: (contagens, {campo: {id: timestamp
+    mais recente}}) para last_message_at, last_inbound_at e last_outbound_at.
+    """
+    counts = {}
+    latest = {"last_message_at": {}, "last_inbound_at": {}, "last_outbound_at": {}}
+    to_id = Conversation._meta.pk.to_python
+    for message in messages:
+        conversation_id = to_id(message.conversation_id)
+        counts[conversation_id] = counts.get(conversation_id, 0) + 1
+        by_type = (
+            "last_inbound_at"
+            if message.type == MessageType.INBOUND.value
+            else "last_outbound_at"
+        )
+        for field in ("last_message_at", by_type):
+            current = latest[field].get(conversation_id)
+            if current is None or message.timestamp > current:
+                latest[field][conversation_id] = message.timestamp
+    return counts, latest
+
+
+def activity_changes(messages):
+    """
+    Expressões do UPDATE que mantêm os agregados de Message na conversa
+    (message_count, last_message_at, last_inbound_at, last_outbound_at),
+    calculadas sobre o banco com F() para não perder inserts concorrentes.
+    """
+    counts, latest = _activity(messages)
+    changes = {
+        "message_count": Case(
+            *(
+                When(id=conversation_id, then=F("message_count") + Value(count))
+                for conversation_id, count in counts.items()
+            ),
+            default=F("message_count"),
+            output_field=PositiveIntegerField(),
+        )
+    }
+    for field, timestamps in latest.items():
+        if timestamps:
+            changes[field] = _latest(field, timestamps)
+    return changes
+
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_value(value):
+    """Valor no formato texto do COPY (\\N é NULL)."""
+    return "\\N" if value is None else str(value).translate(_COPY_ESCAPES)
+
+
+def copy_rows(model, objs):
+    """
+    Grava `objs` com COPY ... FROM STDIN, bem mais rápido que INSERT para
+    lotes grandes. Só no Postgres; não trata conflitos: uma chave repetida
+    aborta o COPY inteiro com IntegrityError.
+    """
+    fields = model._meta.concrete_fields
+    buffer = io.StringIO()
+    for obj in objs:
+        buffer.write(
+            "\t".join(
+                _copy_value(
+                    field.get_db_prep_save(getattr(obj, field.attname), connection)
+                )
+                for field in fields
+            )
+        )
+        buffer.write("\n")
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+    table = connection.ops.quote_name(model._meta.db_table)
+    sql = f"COPY {table} ({columns}) FROM STDIN"
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        if hasattr(cursor, "copy_expert"):  # psycopg2
+            cursor.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def bulk_write(model, objs, copy=False, ignore_conflicts=False):
+    """
+    Grava `objs` com bulk_create ou, com copy no Postgres, com COPY
+    (copy_rows); se alguma linha já existir, o COPY é desfeito e o lote vai
+    por bulk_create, respeitando ignore_conflicts. Retorna True se usou COPY.
+    """
+    if copy and connection.vendor == "postgresql":
+        try:
+            with transaction.atomic():
+                copy_rows(model, objs)
+            return True
+        except IntegrityError:
+            pass
+    model.objects.bulk_create(objs, ignore_conflicts=ignore_conflicts)
+    return False
+
+
+def insert_messages(messages, ignore_conflicts=False, copy=False, open_only=False):
+    """
+    Grava as mensagens e, na mesma transação e em um único UPDATE,
+    incrementa a versão e atualiza os agregados das conversas afetadas; as
+    entradas do feed de mudanças das mensagens e das conversas vão em um
+    único insert. Todo insert em Message deve passar por aqui (ou, para
+    conversas novas, por load_conversations).
+
+    A unicidade do id é conferida antes do insert (unique_messages).
+    Sem ignore_conflicts, um id já gravado levanta IntegrityError; com
+    ignore_conflicts, as mensagens com id já gravado (ou repetido na lista)
+    são descartadas e não entram nos agregados nem no feed. Retorna as
+    mensagens gravadas. Com copy, no Postgres, vão por COPY (bulk_write).
+
+    Com open_only, o UPDATE das conversas só atinge as abertas (... WHERE
+    status = 'OPEN'); se alguma não estiver aberta, levanta
+    ConversationClosed e a transação desfaz o insert. O status cacheado pode
+    estar atrasado em relação a um CLOSE_CONVERSATION concorrente; esse
+    UPDATE, que bloqueia a linha, não.
+    """
+    if not messages:
+        return messages
+    to_id = Conversation._meta.pk.to_python
+    conditions = {"status": ConversationStatus.OPEN.value} if open_only else {}
+    with transaction.atomic():
+        messages = unique_messages(messages, ignore_conflicts=ignore_conflicts)
+        if not messages:
+            return messages
+        conversation_ids = {to_id(message.conversation_id) for message in messages}
+        bulk_write(Message, messages, copy=copy)
+        updated = _touch(
+            conversation_ids, messages, activity_changes(messages), **conditions
+        )
+        if open_only and updated < len(conversation_ids):
+            raise ConversationClosed
+    return messages
+
+
+ACTIVITY_FIELDS = [
+    "message_count",
+    "last_message_at",
+    "last_inbound_at",
+    "last_outbound_at",
+]
+
+
+def recompute_activity(conversation_ids):
+    """
+    Recalcula a partir de Message os agregados das conversas e grava os que
+    mudaram, com nova versão (bump_versions). Retorna quantas mudaram.
+
+    As conversas ficam travadas (FOR UPDATE) durante o cálculo: inserts
+    concorrentes esperam o commit para somar ao valor recalculado, em vez de
+    serem sobrescritos por ele.
+    """
+    with transaction.atomic():
+        conversations = list(
+            Conversation.objects.select_for_update()
+            .filter(id__in=conversation_ids)
+            .only("id", *ACTIVITY_FIELDS)
+        )
+        aggregates = {
+            row["conversation_id"]: row
+            for row in Message.objects.filter(conversation_id__in=conversation_ids)
+            .values("conversation_id")
+            .annotate(
+                message_count=Count("id"),
+                last_message_at=Max("timestamp"),
+                last_inbound_at=Max(
+                    "timestamp", filter=Q(type=MessageType.INBOUND.value)
+                ),
+                last_outbound_at=Max(
+                    "timestamp", filter=Q(type=MessageType.OUTBOUND.value)
+                ),
+            )
+            .order_by()
+        }
+
+        stale = []
+        for conversation in conversations:
+            row = aggregates.get(conversation.id, {})
+            expected = {field: row.get(field) for field in ACTIVITY_FIELDS}
+            expected["message_count"] = expected["message_count"] or 0
+            if any(getattr(conversation, f) != v for f, v in expected.items()):
+                for field, value in expected.items():
+                    setattr(conversation, field, value)
+                stale.append(conversation)
+
+        if stale:
+            Conversation.objects.bulk_update(stale, ACTIVITY_FIELDS)
+            # Os agregados fazem parte da representação: nova versão/ETag.
+            bump_versions([conversation.id for conversation in stale])
+    return len(stale)
+
+
+def value_by_id(values, output_field):
+    """Expressão do UPDATE que aplica a cada linha o seu valor em `values`."""
+    return Case(
+        *(When(id=pk, then=Value(value)) for pk, value in values.items()),
+        output_field=output_field,
+    )
+
+
+def _set_activity(conversations, messages):
+    """Preenche nos objetos os agregados de Message (ver activity_changes)."""
+    counts, latest = _activity(messages)
+    to_id = Conversation._meta.pk.to_python
+    for conversation in conversations:
+        conversation_id = to_id(conversation.id)
+        conversation.message_count = counts.get(conversation_id, 0)
+        for field, timestamps in latest.items():
+            setattr(conversation, field, timestamps.get(conversation_id))
+
+
+def load_conversations(conversations, messages, copy=False):
+    """
+    Carga em massa (replay de eventos arquivados) de conversas novas junto
+    com as suas mensagens. Como em insert_messages, mensagens com id já
+    gravado são descartadas; os agregados de Message das conversas são
+    calculados aqui, a partir das mensagens que restam, e gravados junto com
+    elas, então as mensagens entram sem o UPDATE de insert_messages. O feed
+    de mudanças vai em um único insert. Retorna as mensagens gravadas.
+
+    created_at e updated_at são os dos objetos: o COPY grava os valores como
+    estão e, com bulk_create (que aplica auto_now_add e auto_now), um UPDATE
+    os restaura. Conversas que já existirem são mantidas, mas recebem as
+    datas e as mensagens da carga; o chamador deve filtrá-las antes.
+    """
+    if not conversations:
+        return []
+    dates = {
+        field: {
+            conversation.id: getattr(conversation, field)
+            for conversation in conversations
+        }
+        for field in ("created_at", "updated_at")
+    }
+    with transaction.atomic():
+        messages = unique_messages(messages, ignore_conflicts=True)
+        _set_activity(conversations, messages)
+        if not bulk_write(
+            Conversation, conversations, copy=copy, ignore_conflicts=True
+        ):
+            Conversation.objects.filter(id__in=list(dates["created_at"])).update(
+                **{
+                    field: value_by_id(values, DateTimeField())
+                    for field, values in dates.items()
+                }
+            )
+        if messages:
+            bulk_write(Message, messages, copy=copy)
+        record_changes([conversation.id for conversation in conversations], messages)
+    return messages
+
+
+def insert_message_once(message):
+    """
+    Grava uma mensagem recebida pelo webhook. Retorna False, sem gravar, se
+    já existir uma mensagem com o mesmo id (retry concorrente do gateway);
+    levanta ConversationClosed se a conversa não estiver aberta.
+    """
+    try:
+        insert_messages([message], open_only=True)
+    except IntegrityError:
+        if not Message.objects.filter(id=message.id).exists():
+            raise
+        return False
+    return True
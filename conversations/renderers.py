@@ -0,0 +1,200 @@
+"""
+Caminho rápido de leitura das conversas (CONVERSATION_FAST_RENDER).
+
+Lê as linhas com values() e renderiza com orjson, sem instanciar modelos nem
+passar pelos campos do DRF. A saída é idêntica, byte a byte, à de
+ConversationSerializer + JSONRenderer (JSON compacto, datas ISO 8601 no fuso
+atual com "Z" para UTC, U+2028/U+2029 escapados).
+
+Também negocia a compressão das respostas (RESPONSE_COMPRESSION): brotli,
+se o pacote estiver instalado, ou gzip.
+"""
+
+import gzip
+
+import orjson
+from django.conf import settings
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+
+from .models import Message
+from .serializers import ConversationSerializer, MessageSerializer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CONVERSATION_FIELDS = ConversationSerializer.Meta.fields
+MESSAGE_FIELDS = MessageSerializer.Meta.fields
+
+DATETIME_FIELDS = {
+    "created_at",
+    "updated_at",
+    "last_message_at",
+    "last_inbound_at",
+    "last_outbound_at",
+}
+
+# Colunas sempre lidas: chave das mensagens, cursores do keyset e ETag.
+KEY_COLUMNS = ("id", "updated_at", "last_message_at", "version")
+
+
+def format_datetime(value):
+    """
+    Mesmo formato de serializers.DateTimeField com DATETIME_FORMAT ISO 8601.
+    Usado também pela exportação (exports), que não passa pelo orjson no CSV.
+    """
+    value = timezone.localtime(value).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def datetime_formatter():
+    """
+    No fuso UTC (o padrão), as datas do banco já estão em UTC e vão cruas
+    para o orjson, que as escreve no mesmo formato com OPT_UTC_Z; nos demais
+    fusos, são formatadas aqui.
+    """
+    if timezone.get_current_timezone_name() == "UTC":
+        return lambda value: value
+    return format_datetime
+
+
+def _selected(fields):
+    return [name for name in CONVERSATION_FIELDS if fields is None or name in fields]
+
+
+def conversation_values(queryset, fields=None):
+    """
+    values() das conversas com as colunas pedidas e as de KEY_COLUMNS.
+    Descarta o prefetch de mensagens, que serialize_conversations faz à parte.
+    """
+    columns = {
+        *KEY_COLUMNS,
+        *(name for name in _selected(fields) if name != "messages"),
+    }
+    return queryset.prefetch_related(None).values(*columns)
+
+
+def _message_dicts(queryset, to_datetime):
+    """(conversation_id, dict no formato do MessageSerializer), por timestamp."""
+    rows = queryset.order_by("timestamp").values_list(
+        "conversation_id", *MESSAGE_FIELDS
+    )
+    for conversation_id, message_id, message_type, content, timestamp in rows:
+        yield conversation_id, {
+            "id": message_id,
+            "type": message_type,
+            "content": content,
+            "timestamp": to_datetime(timestamp),
+        }
+
+
+def serialize_messages(queryset):
+    """
+    Mensagens do queryset no formato do MessageSerializer, acrescidas de
+    conversation_id, em uma única consulta ordenada por timestamp.
+    """
+    return [
+        {**message, "conversation_id": conversation_id}
+        for conversation_id, message in _message_dicts(queryset, datetime_formatter())
+    ]
+
+
+def render_messages(messages):
+    """JSON da lista de mensagens (instâncias de Message) como no MessageSerializer."""
+    to_datetime = datetime_formatter()
+    return render_json(
+        [
+            {
+                "id": message.id,
+                "type": message.type,
+                "content": message.content,
+                "timestamp": to_datetime(message.timestamp),
+            }
+            for message in messages
+        ]
+    )
+
+
+def serialize_conversations(rows, fields=None):
+    """
+    Monta os dicts na forma do ConversationSerializer a partir das linhas de
+    conversation_values, carregando as mensagens de todas elas em uma única
+    consulta ordenada por timestamp. Os dicts devem ser renderizados com
+    render_json.
+    """
+    to_datetime = datetime_formatter()
+    selected = _selected(fields)
+    messages = {}
+    if "messages" in selected and rows:
+        for conversation_id, message in _message_dicts(
+            Message.objects.filter(conversation_id__in=[row["id"] for row in rows]),
+            to_datetime,
+        ):
+            messages.setdefault(conversation_id, []).append(message)
+
+    data = []
+    for row in rows:
+        item = {}
+        for name in selected:
+            if name == "messages":
+                item[name] = messages.get(row["id"], [])
+            elif name in DATETIME_FIELDS:
+                item[name] = None if row[name] is None else to_datetime(row[name])
+            else:
+                item[name] = row[name]
+        data.append(item)
+    return data
+
+
+def render_json(data):
+    """Equivalente a JSONRenderer().render(data), usando orjson."""
+    return (
+        orjson.dumps(data, option=orjson.OPT_UTC_Z)
+        .replace(b"\xe2\x80\xa8", b"\\u2028")
+        .replace(b"\xe2\x80\xa9", b"\\u2029")
+    )
+
+
+def _accepted_encodings(request):
+    return {
+        part.split(";")[0].strip().lower()
+        for part in request.headers.get("Accept-Encoding", "").split(",")
+    }
+
+
+def compress_response(request, response):
+    """
+    Comprime o corpo da resposta com brotli ou gzip, conforme o
+    Accept-Encoding do cliente. Respostas pequenas ou já codificadas
+    ficam como estão. Como o GZipMiddleware do Django, torna o ETag fraco,
+    já que o corpo enviado deixa de ser o da representação original.
+    """
+    if not settings.RESPONSE_COMPRESSION or response.has_header("Content-Encoding"):
+        return response
+    patch_vary_headers(response, ("Accept-Encoding",))
+    if len(response.content) < settings.RESPONSE_COMPRESSION_MIN_BYTES:
+        return response
+
+    accepted = _accepted_encodings(request)
+    if brotli is not None and "br" in accepted:
+        content = brotli.compress(
+            response.content, quality=settings.RESPONSE_BROTLI_QUALITY
+        )
+        encoding = "br"
+    elif "gzip" in accepted:
+        content = gzip.compress(response.content, mtime=0)
+        encoding = "gzip"
+    else:
+        return response
+
+    response.content = content
+    response.headers["Content-Length"] = str(len(content))
+    response.headers["Content-Encoding"] = encoding
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        response.headers["ETag"] = f"W/{etag}"
+    return response
@@ -0,0 +1,286 @@
+"""
+Reprocessamento em massa de eventos de webhook arquivados
+(`manage.py replay_events`), para migrar tenants ou reconstruir o banco.
+
+Os eventos são lidos de arquivos NDJSON (um payload do webhook por linha),
+validados com as regras do WebhookSerializer (validate_webhook) e aplicados
+em lotes, com as mesmas regras de negócio do webhook em lote
+(services.process_event_batch): o estado das conversas do lote vem de uma
+consulta e as conversas e mensagens vão em um bulk_create ou, no Postgres,
+em um COPY, na mesma transação que atualiza versões, agregados e o feed de
+mudanças. As conversas criadas pelo replay já são gravadas com os agregados
+das mensagens efetivamente inseridas (persistence.load_conversations); só as
+mensagens de conversas que já existiam passam pelo UPDATE de insert_messages.
+
+Diferenças em relação ao webhook:
+- created_at e updated_at das conversas vêm do timestamp dos eventos, não do
+  relógio da importação;
+- uma NEW_MESSAGE que chega antes do NEW_CONVERSATION da sua conversa espera
+  em memória, no lugar de PendingMessage, e é aceita se a conversa for criada
+  até MESSAGE_BUFFER_SECONDS depois do timestamp da mensagem, contados no
+  tempo dos eventos (os arquivos devem estar em ordem de timestamp);
+- opcionalmente, as mensagens não são publicadas para process_inbound_messages
+  e, portanto, não geram respostas OUTBOUND.
+"""
+
+import logging
+from collections import Counter
+from datetime import timedelta
+
+import orjson
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DateTimeField
+
+from . import outbox
+from .cache import status_cache
+from .enums import ConversationStatus, MessageType, WebhookEventType
+from .models import Conversation, Message
+from .persistence import (
+    bump_versions,
+    insert_messages,
+    load_conversations,
+    value_by_id,
+)
+from .serializers import validate_webhook
+from .tasks import process_inbound_messages
+
+logger = logging.getLogger(__name__)
+
+
+def read_events(paths):
+    """
+    Gera (origem, payload) de cada linha não vazia dos arquivos NDJSON, com
+    payload None quando a linha não é JSON válido.
+    """
+    for path in paths:
+        with open(path, "rb") as events_file:
+            for number, line in enumerate(events_file, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    payload = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    payload = None
+                yield f"{path}:{number}", payload
+
+
+class EventReplay:
+    """
+    Aplica lotes de eventos em ordem, guardando entre os lotes só as
+    mensagens à espera da conversa e os contadores do relatório.
+    """
+
+    def __init__(self, copy=False, publish=True):
+        self.copy = copy
+        self.publish = publish
+        self.buffer = timedelta(seconds=settings.MESSAGE_BUFFER_SECONDS)
+        self.pending = {}
+        self.clock = None
+        self.counts = Counter()
+
+    def _reject(self, origin, reason, amount=1):
+        self.counts["rejected"] += amount
+        logger.debug(f"[EventReplay] {origin}: {reason}")
+
+    def apply(self, batch):
+        """Valida e grava um lote de (origem, payload), em uma transação."""
+        events = []
+        for origin, payload in batch:
+            self.counts["events"] += 1
+            event, errors = (
+                validate_webhook(payload) if payload is not None else (None, "JSON")
+            )
+            if errors is None:
+                events.append((origin, event))
+            else:
+                self.counts["invalid"] += 1
+                logger.debug(f"[EventReplay] {origin}: {errors}")
+
+        conversation_ids = set()
+        message_ids = set()
+        for _, event in events:
+            data = event["data"]
+            if event["type"] == WebhookEventType.NEW_MESSAGE.value:
+                conversation_ids.add(data["conversation_id"])
+                message_ids.add(data["id"])
+            else:
+                conversation_ids.add(data["id"])
+
+        statuses = dict(
+            Conversation.objects.filter(id__in=conversation_ids).values_list(
+                "id", "status"
+            )
+        )
+        existing_statuses = dict(statuses)
+        known_message_ids = set(
+            Message.objects.filter(id__in=message_ids).values_list("id", flat=True)
+        )
+        known_message_ids |= {
+            message.id for messages in self.pending.values() for message in messages
+        }
+
+        created = {}
+        updated = {}
+        messages = []
+
+        for origin, event in events:
+            event_type = event["type"]
+            timestamp = event["timestamp"]
+            data = event["data"]
+            if self.clock is None or timestamp > self.clock:
+                self.clock = timestamp
+
+            if event_type == WebhookEventType.NEW_CONVERSATION.value:
+                conversation_id = data["id"]
+                if conversation_id in statuses:
+                    self._reject(origin, "Conversation already exists")
+                    continue
+                statuses[conversation_id] = ConversationStatus.OPEN.value
+                created[conversation_id] = updated[conversation_id] = timestamp
+                waiting = self.pending.pop(conversation_id, [])
+                for message in waiting:
+                    if timestamp < message.timestamp + self.buffer:
+                        messages.append(message)
+                    else:
+                        self._reject(origin, "Conversation does not exist")
+
+            elif event_type == WebhookEventType.NEW_MESSAGE.value:
+                conversation_id = data["conversation_id"]
+                if data["id"] in known_message_ids:
+                    self.counts["duplicates"] += 1
+                    continue
+                known_message_ids.add(data["id"])
+                message = Message(
+                    id=data["id"],
+                    conversation_id=conversation_id,
+                    type=MessageType.INBOUND.value,
+                    content=data["content"],
+                    timestamp=timestamp,
+                )
+                conversation_status = statuses.get(conversation_id)
+                if conversation_status is None:
+                    self.pending.setdefault(conversation_id, []).append(message)
+                elif conversation_status == ConversationStatus.CLOSED.value:
+                    self._reject(origin, "Conversation is closed")
+                else:
+                    messages.append(message)
+
+            elif event_type == WebhookEventType.CLOSE_CONVERSATION.value:
+                conversation_id = data["id"]
+                conversation_status = statuses.get(conversation_id)
+                if conversation_status is None:
+                    self._reject(origin, "Conversation not found")
+                elif conversation_status == ConversationStatus.CLOSED.value:
+                    self._reject(origin, "Conversation already closed")
+                else:
+                    statuses[conversation_id] = ConversationStatus.CLOSED.value
+                    updated[conversation_id] = timestamp
+
+        self._expire_pending()
+
+        closed_ids = [
+            conversation_id
+            for conversation_id, status in existing_statuses.items()
+            if status != statuses[conversation_id]
+        ]
+
+        # As conversas novas já nascem com os agregados das suas mensagens
+        # (load_conversations); só as que já existiam passam pelo UPDATE de
+        # insert_messages.
+        conversations = {
+            conversation_id: Conversation(
+                id=conversation_id,
+                status=statuses[conversation_id],
+                created_at=timestamp,
+                updated_at=updated[conversation_id],
+            )
+            for conversation_id, timestamp in created.items()
+        }
+        new_messages = []
+        existing_messages = []
+        for message in messages:
+            if message.conversation_id in conversations:
+                new_messages.append(message)
+            else:
+                existing_messages.append(message)
+
+        with transaction.atomic():
+            new_messages = load_conversations(
+                list(conversations.values()), new_messages, copy=self.copy
+            )
+            if closed_ids:
+                bump_versions(
+                    closed_ids,
+                    status=ConversationStatus.CLOSED.value,
+                    updated_at=value_by_id(
+                        {key: updated[key] for key in closed_ids}, DateTimeField()
+                    ),
+                )
+            existing_messages = insert_messages(
+                existing_messages, ignore_conflicts=True, copy=self.copy
+            )
+            messages = new_messages + existing_messages
+            message_ids = [str(message.id) for message in messages]
+            if self.publish and messages:
+                outbox.enqueue(process_inbound_messages, message_ids)
+
+        status_cache.set_many(
+            {
+                conversation_id: statuses[conversation_id]
+                for conversation_id in [*created, *closed_ids]
+            }
+        )
+        if self.publish and messages:
+            outbox.publish(process_inbound_messages, message_ids)
+
+        self.counts["conversations"] += len(created)
+        self.counts["closed"] += len(closed_ids) + sum(
+            statuses[conversation_id] == ConversationStatus.CLOSED.value
+            for conversation_id in created
+        )
+        self.counts["messages"] += len(messages)
+
+    def _expire_pending(self):
+        """Descarta as mensagens cuja conversa não foi criada a tempo."""
+        for conversation_id in list(self.pending):
+            waiting = [
+                message
+                for message in self.pending[conversation_id]
+                if self.clock < message.timestamp + self.buffer
+            ]
+            expired = len(self.pending[conversation_id]) - len(waiting)
+            if expired:
+                self._reject(conversation_id, "Conversation does not exist", expired)
+            if waiting:
+                self.pending[conversation_id] = waiting
+            else:
+                del self.pending[conversation_id]
+
+    def finish(self):
+        """Rejeita as mensagens que ainda esperam conversa; retorna os contadores."""
+        for conversation_id, waiting in self.pending.items():
+            self._reject(conversation_id, "Conversation does not exist", len(waiting))
+        self.pending = {}
+        return self.counts
+
+
+def replay_events(events, batch_size=None, copy=False, publish=True):
+    """
+    Aplica os (origem, payload) de `events` em lotes de `batch_size`
+    (REPLAY_BATCH_SIZE) e retorna os contadores: eventos lidos, inválidos,
+    rejeitados pelas regras de negócio, mensagens duplicadas, conversas
+    criadas, conversas fechadas e mensagens gravadas.
+    """
+    batch_size = batch_size or settings.REPLAY_BATCH_SIZE
+    replay = EventReplay(copy=copy, publish=publish)
+    batch = []
+    for item in events:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            replay.apply(batch)
+            batch = []
+    if batch:
+        replay.apply(batch)
+    return replay.finish()
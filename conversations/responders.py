@@ -0,0 +1,178 @@
+"""
+Geração do texto das respostas OUTBOUND.
+
+Um responder recebe a conversa e os conteúdos das mensagens INBOUND da
+rajada e devolve o texto da resposta, ou None para passar a vez ao próximo.
+OUTBOUND_RESPONDERS lista os responders (caminhos importáveis) na ordem em
+que são tentados. Cada chamada roda em um pool de threads limitado
+(OUTBOUND_RESPONDER_MAX_WORKERS), com o timeout do responder
+(OUTBOUND_RESPONDER_TIMEOUT por padrão), de modo que um processo do Celery
+mantém várias respostas em andamento ao mesmo tempo. Se todos falham,
+estouram o timeout ou devolvem None, vale o texto padrão (EchoResponder).
+
+Uma thread não pode ser interrompida: a chamada que estoura o timeout
+continua ocupando a sua até o responder retornar. Para um responder travado
+não esgotar o pool, quando metade das threads está presa assim o pool é
+substituído por um novo; as threads presas terminam sozinhas no antigo.
+"""
+
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .metrics import count_responder
+
+logger = logging.getLogger(__name__)
+
+
+class Responder:
+    """Interface dos responders; `timeout` None usa OUTBOUND_RESPONDER_TIMEOUT."""
+
+    name = None
+    timeout = None
+
+    def respond(self, conversation_id, contents):
+        raise NotImplementedError
+
+    def __str__(self):
+        return self.name or type(self).__name__
+
+
+class EchoResponder(Responder):
+    """Texto padrão: lista os conteúdos recebidos."""
+
+    name = "echo"
+
+    def respond(self, conversation_id, contents):
+        return "Mensagens recebidas:\n" + "\n".join(
+            f"- {content}" for content in contents
+        )
+
+
+class SlowStubResponder(Responder):
+    """
+    Simula um responder lento (ex.: servidor de modelo local), dormindo
+    OUTBOUND_STUB_DELAY_SECONDS antes de responder. Serve para testes e
+    benchmarks do pipeline.
+    """
+
+    name = "slow_stub"
+
+    def __init__(self, delay=None):
+        self.delay = settings.OUTBOUND_STUB_DELAY_SECONDS if delay is None else delay
+
+    def respond(self, conversation_id, contents):
+        time.sleep(self.delay)
+        return f"Resposta gerada para {len(contents)} mensagem(ns)."
+
+
+class ResponderPipeline:
+    def __init__(self, responders, fallback=None, max_workers=8, timeout=5.0):
+        self.responders = list(responders)
+        self.fallback = fallback or EchoResponder()
+        self.timeout = timeout
+        self.max_workers = max_workers
+        # Chamadas que estouraram o timeout e ainda ocupam uma thread do pool.
+        self.max_abandoned = max(1, max_workers // 2)
+        self._abandoned = set()
+        self._lock = threading.Lock()
+        self.executor = self._new_executor()
+
+    def _new_executor(self):
+        return ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="responder"
+        )
+
+    def _submit(self, responder, requests):
+        """
+        Submete uma chamada por rajada. Antes, se as chamadas abandonadas
+        ocupam max_abandoned threads, troca o pool (shutdown sem esperar).
+        """
+        with self._lock:
+            self._abandoned = {f for f in self._abandoned if not f.done()}
+            if len(self._abandoned) >= self.max_abandoned:
+                logger.warning(
+                    f"[ResponderPipeline] {len(self._abandoned)} threads presas "
+                    f"em responders após o timeout; recriando o pool."
+                )
+                self.executor.shutdown(wait=False)
+                self.executor = self._new_executor()
+                self._abandoned = set()
+            return [self.executor.submit(responder.respond, *args) for args in requests]
+
+    def _abandon(self, future):
+        """Registra a chamada que estourou o timeout, se ela já tiver começado."""
+        if future.cancel():
+            return
+        with self._lock:
+            self._abandoned.add(future)
+
+    def generate(self, conversation_id, contents):
+        return self.generate_many([(conversation_id, contents)])[0]
+
+    def generate_many(self, requests):
+        """
+        Gera as respostas de várias rajadas, [(conversation_id, conteúdos)],
+        em paralelo no pool. Cada responder é tentado para todas as rajadas
+        ainda sem resposta antes de passar ao próximo; o timeout conta desde
+        a submissão, incluindo a espera por uma thread livre.
+        """
+        results = [None] * len(requests)
+        pending = list(range(len(requests)))
+        for responder in self.responders:
+            if not pending:
+                break
+            timeout = responder.timeout or self.timeout
+            deadline = time.monotonic() + timeout
+            futures = list(
+                zip(
+                    pending,
+                    self._submit(responder, [requests[index] for index in pending]),
+                )
+            )
+            pending = []
+            for index, future in futures:
+                try:
+                    text = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except FutureTimeoutError:
+                    # A thread segue até o responder retornar; só sai da fila
+                    # se ainda não tiver começado.
+                    self._abandon(future)
+                    outcome = "timeout"
+                    logger.warning(
+                        f"[ResponderPipeline] {responder} excedeu {timeout}s "
+                        f"para a conversation {requests[index][0]}."
+                    )
+                except Exception:
+                    outcome = "error"
+                    logger.exception(
+                        f"[ResponderPipeline] {responder} falhou para a "
+                        f"conversation {requests[index][0]}."
+                    )
+                else:
+                    outcome = "ok" if text is not None else "skipped"
+                    results[index] = text
+                count_responder(str(responder), outcome)
+                if results[index] is None:
+                    pending.append(index)
+
+        for index in pending:
+            results[index] = self.fallback.respond(*requests[index])
+            count_responder(str(self.fallback), "fallback")
+        return results
+
+
+@functools.cache
+def responder_pipeline():
+    """Pipeline configurado nas settings, criado uma vez por processo."""
+    return ResponderPipeline(
+        [import_string(path)() for path in settings.OUTBOUND_RESPONDERS],
+        max_workers=settings.OUTBOUND_RESPONDER_MAX_WORKERS,
+        timeout=settings.OUTBOUND_RESPONDER_TIMEOUT,
+    )
@@ -1,6 +1,12 @@
+import re
+import uuid
+
+from django.conf import settings
+from django.core.validators import ProhibitNullCharactersValidator
 from rest_framework import serializers
+from rest_framework.validators import ProhibitSurrogateCharactersValidator
 from .models import Conversation, Message
-from .enums import WebhookEventType
+from .enums import WebhookEventType, ConversationStatus
 
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -14,7 +20,123 @@ class ConversationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Conversation
-        fields = ["id", "status", "created_at", "updated_at", "messages"]
+        fields = [
+            "id",
+            "status",
+            "created_at",
+            "updated_at",
+            "message_count",
+            "last_message_at",
+            "last_inbound_at",
+            "last_outbound_at",
+            "messages",
+        ]
+
+    def __init__(self, *args, fields=None, **kwargs):
+        """
+        Aceita `fields` para devolver apenas um subconjunto dos campos
+        (sparse fieldsets); None mantém todos os campos.
+        """
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ConversationFieldsQuerySerializer(serializers.Serializer):
+    """
+    Parâmetros de sparse fieldsets dos endpoints de conversa:
+    - fields: lista separada por vírgulas dos campos da conversa a retornar.
+    - include: relações adicionadas aos campos selecionados (ex.: messages).
+    Sem `fields`, todos os campos são retornados, incluindo as mensagens.
+    """
+
+    fields = serializers.CharField(required=False)
+    include = serializers.CharField(required=False)
+
+    INCLUDABLE = {"messages"}
+
+    def _split(self, value):
+        return [name.strip() for name in value.split(",") if name.strip()]
+
+    def validate_fields(self, value):
+        names = self._split(value)
+        unknown = sorted(set(names) - set(ConversationSerializer.Meta.fields))
+        if unknown:
+            raise serializers.ValidationError(f"Unknown field(s): {', '.join(unknown)}")
+        return names
+
+    def validate_include(self, value):
+        names = self._split(value)
+        unknown = sorted(set(names) - self.INCLUDABLE)
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown relation(s): {', '.join(unknown)}"
+            )
+        return names
+
+    def validate(self, attrs):
+        if "fields" in attrs:
+            attrs["fields"] = attrs["fields"] + [
+                name for name in attrs.get("include", []) if name not in attrs["fields"]
+            ]
+        else:
+            attrs["fields"] = None
+        return attrs
+
+
+class ConversationListQuerySerializer(ConversationFieldsQuerySerializer):
+    status = serializers.ChoiceField(
+        choices=ConversationStatus.choices(), required=False
+    )
+    updated_after = serializers.DateTimeField(required=False)
+    # last_message_at lista por atividade recente (só conversas com mensagens).
+    ordering = serializers.ChoiceField(
+        choices=["updated_at", "last_message_at"], default="updated_at"
+    )
+    cursor = serializers.CharField(required=False)
+    page_size = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.CONVERSATIONS_MAX_PAGE_SIZE,
+        default=settings.CONVERSATIONS_PAGE_SIZE,
+    )
+
+
+class ChangesQuerySerializer(serializers.Serializer):
+    """
+    Parâmetros de GET /changes/:
+    - since: cursor devolvido em "next" pela chamada anterior (sem ele, o
+      feed começa do início);
+    - limit: máximo de entradas do feed lidas nesta chamada.
+    """
+
+    since = serializers.CharField(required=False)
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.CHANGES_MAX_PAGE_SIZE,
+        default=settings.CHANGES_PAGE_SIZE,
+    )
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    """
+    Parâmetros de GET /export/ e do comando export_conversations:
+    - resource: conversations ou messages;
+    - format: ndjson ou csv;
+    - status: só conversas (ou mensagens de conversas) com esse status;
+    - since/until: intervalo [since, until) de created_at das conversas ou
+      de timestamp das mensagens.
+    """
+
+    resource = serializers.ChoiceField(
+        choices=["conversations", "messages"], default="messages"
+    )
+    format = serializers.ChoiceField(choices=["ndjson", "csv"], default="ndjson")
+    status = serializers.ChoiceField(
+        choices=ConversationStatus.choices(), required=False
+    )
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
 
 
 class NewConversationDataSerializer(serializers.Serializer):
@@ -52,3 +174,121 @@ class WebhookSerializer(serializers.Serializer):
         serializer.is_valid(raise_exception=True)
         attrs["data"] = serializer.validated_data
         return attrs
+
+
+# Caminho rápido da validação do webhook. Para cada tipo de evento, os campos
+# declarados no serializer de `data` são compilados uma vez em uma tabela de
+# (nome, conversor), aplicada direto ao dict do payload, sem instanciar
+# serializers. Ele só decide o caso válido: qualquer coisa fora do formato
+# esperado (campo ausente, tipo diferente, valor inválido) devolve None e a
+# validação é refeita pelo WebhookSerializer, que monta os mesmos erros de
+# sempre.
+
+_INVALID_TEXT = re.compile(r"[\x00\ud800-\udfff]")
+_TEXT_VALIDATORS = (
+    ProhibitNullCharactersValidator,
+    ProhibitSurrogateCharactersValidator,
+)
+_timestamp_field = WebhookSerializer._declared_fields["timestamp"]
+_event_types = {value for value, _ in WebhookEventType.choices()}
+
+
+def _fast_uuid(value):
+    # uuid.UUID(str) é o mesmo que UUIDField usa para strings.
+    return uuid.UUID(value) if isinstance(value, str) else None
+
+
+def _fast_text(value):
+    # CharField: sem vazio, sem espaços nas pontas, sem NUL nem surrogates.
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if not value or _INVALID_TEXT.search(value):
+        return None
+    return value
+
+
+def _compile(serializer_class):
+    """
+    Tabela (nome, conversor) dos campos do serializer, ou None se algum
+    campo não tiver conversor equivalente (o tipo de evento fica só no DRF).
+    """
+    converters = []
+    for name, field in serializer_class._declared_fields.items():
+        if type(field) is serializers.UUIDField and not field.validators:
+            converter = _fast_uuid
+        elif (
+            type(field) is serializers.CharField
+            and not field.allow_blank
+            and field.trim_whitespace
+            and field.max_length is None
+            and field.min_length is None
+            and all(isinstance(v, _TEXT_VALIDATORS) for v in field.validators)
+        ):
+            converter = _fast_text
+        else:
+            return None
+        if not field.required or field.source not in (None, name):
+            return None
+        converters.append((name, converter))
+    return converters
+
+
+_EVENT_FIELDS = {
+    WebhookEventType.NEW_CONVERSATION.value: _compile(NewConversationDataSerializer),
+    WebhookEventType.NEW_MESSAGE.value: _compile(NewMessageDataSerializer),
+    WebhookEventType.CLOSE_CONVERSATION.value: _compile(
+        CloseConversationDataSerializer
+    ),
+}
+
+
+def fast_validate_webhook(payload):
+    """
+    validated_data equivalente ao do WebhookSerializer para um payload
+    válido, ou None quando o caminho rápido não decide (inclusive payloads
+    inválidos).
+    """
+    if type(payload) is not dict:
+        return None
+    event_type = payload.get("type")
+    data = payload.get("data")
+    timestamp = payload.get("timestamp")
+    if (
+        type(event_type) is not str
+        or event_type not in _event_types
+        or type(data) is not dict
+        or type(timestamp) is not str
+    ):
+        return None
+    converters = _EVENT_FIELDS.get(event_type)
+    if converters is None:
+        return None
+
+    validated = {}
+    try:
+        for name, converter in converters:
+            value = converter(data.get(name))
+            if value is None:
+                return None
+            validated[name] = value
+        timestamp = _timestamp_field.to_internal_value(timestamp)
+    except (ValueError, serializers.ValidationError):
+        return None
+    return {"type": event_type, "timestamp": timestamp, "data": validated}
+
+
+def validate_webhook(payload):
+    """
+    Valida um evento do webhook: (validated_data, None) ou (None, errors).
+    Com WEBHOOK_FAST_VALIDATION, tenta antes o caminho rápido; o
+    WebhookSerializer continua sendo a referência e produz os erros.
+    """
+    if settings.WEBHOOK_FAST_VALIDATION:
+        validated = fast_validate_webhook(payload)
+        if validated is not None:
+            return validated, None
+    serializer = WebhookSerializer(data=payload)
+    if serializer.is_valid():
+        return serializer.validated_data, None
+    return None, serializer.errors
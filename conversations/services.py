@@ -0,0 +1,341 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import seen_messages, status_cache
+from .enums import ConversationStatus, MessageType, WebhookEventType
+from .metrics import BATCH, count_duplicate, stage
+from .models import Conversation, Message, PendingMessage
+from . import outbox
+from .persistence import (
+    close_conversations,
+    create_conversations,
+    insert_message_once,
+    insert_messages,
+)
+from .serializers import validate_webhook
+from .tasks import process_inbound_message, process_inbound_messages
+
+logger = logging.getLogger(__name__)
+
+
+def pending_message(message_id, conversation_id, content, timestamp_dt):
+    """
+    Monta a PendingMessage de uma NEW_MESSAGE cuja conversa ainda não existe;
+    ela expira MESSAGE_BUFFER_SECONDS após o timestamp do evento.
+    """
+    return PendingMessage(
+        id=message_id,
+        conversation_id=conversation_id,
+        content=content,
+        timestamp=timestamp_dt,
+        expires_at=timestamp_dt + timedelta(seconds=settings.MESSAGE_BUFFER_SECONDS),
+    )
+
+
+def buffer_pending_messages(pending):
+    """
+    Grava as mensagens pendentes. Se o NEW_CONVERSATION de alguma delas foi
+    gravado entre a checagem do webhook e este insert, drena na hora, para
+    a mensagem não ficar presa até expirar.
+
+    Retorna os ids das mensagens que já viraram Message (a enfileirar).
+    """
+    PendingMessage.objects.bulk_create(pending, ignore_conflicts=True)
+    conversation_ids = {message.conversation_id for message in pending}
+    existing = list(
+        Conversation.objects.filter(id__in=conversation_ids).values_list(
+            "id", flat=True
+        )
+    )
+    return drain_pending_messages(existing) if existing else []
+
+
+def drain_pending_messages(conversation_ids):
+    """
+    Move as mensagens pendentes não expiradas das conversas para Message em
+    um único bulk insert e remove-as do buffer. Com TASK_OUTBOX, grava o
+    processamento INBOUND no outbox, na mesma transação; retorna os ids
+    inseridos para o chamador fazer o outbox.publish() depois do commit.
+    """
+    with transaction.atomic():
+        pending = list(
+            PendingMessage.objects.filter(
+                conversation_id__in=conversation_ids, expires_at__gt=timezone.now()
+            ).order_by("timestamp")
+        )
+        if not pending:
+            return []
+
+        inserted = insert_messages(
+            [
+                Message(
+                    id=message.id,
+                    conversation_id=message.conversation_id,
+                    type=MessageType.INBOUND.value,
+                    content=message.content,
+                    timestamp=message.timestamp,
+                )
+                for message in pending
+            ],
+            ignore_conflicts=True,
+        )
+        PendingMessage.objects.filter(id__in=[m.id for m in pending]).delete()
+        # Uma pendente cujo id já virou Message (retry) não é enfileirada de novo.
+        message_ids = [str(message.id) for message in inserted]
+        if message_ids:
+            outbox.enqueue(process_inbound_messages, message_ids)
+
+    logger.info(
+        f"[drain_pending_messages] Mensagens pendentes inseridas: {message_ids}"
+    )
+    return message_ids
+
+
+def insert_inbound_message(message):
+    """
+    Grava a mensagem INBOUND recebida pelo webhook (insert_message_once) e,
+    com TASK_OUTBOX, o seu processamento no outbox, na mesma transação.
+    Retorna False se a mensagem já existia.
+    """
+    with outbox.atomic():
+        inserted = insert_message_once(message)
+        if inserted:
+            outbox.enqueue(process_inbound_message, str(message.id))
+    return inserted
+
+
+def process_event_batch(events: list) -> list:
+    """
+    Processa um lote de eventos de webhook na ordem recebida.
+
+    Cada evento é validado individualmente; os válidos são aplicados com
+    as mesmas regras do webhook de evento único, mas com o estado das
+    conversas carregado em uma única consulta, gravações via bulk_create /
+    update em lote e uma única task de processamento INBOUND para o lote.
+
+    Retorna uma lista de (body, status) na mesma ordem dos eventos.
+    """
+    results = [None] * len(events)
+    validated = []
+    with stage("validate", BATCH):
+        for index, payload in enumerate(events):
+            event, errors = validate_webhook(payload)
+            if errors is None:
+                validated.append((index, event))
+            else:
+                results[index] = (errors, 400)
+
+    conversation_ids = set()
+    message_ids = set()
+    for _, event in validated:
+        data = event["data"]
+        if event["type"] == WebhookEventType.NEW_MESSAGE.value:
+            conversation_ids.add(data["conversation_id"])
+            message_ids.add(data["id"])
+        else:
+            conversation_ids.add(data["id"])
+
+    with stage("db", BATCH):
+        statuses = status_cache.get_many(conversation_ids)
+        existing_statuses = dict(statuses)
+        # Ids já vistos pelo cache de idempotência não vão ao banco.
+        known_message_ids = seen_messages.seen_many(message_ids)
+        unseen = message_ids - known_message_ids
+        if unseen:
+            known_message_ids |= set(
+                Message.objects.filter(id__in=unseen).values_list("id", flat=True)
+            )
+
+    now = timezone.now()
+    duplicates = 0
+    created_ids = []
+    messages = []
+    message_indexes = {}
+    created_indexes = {}
+    close_indexes = {}
+    pending = []
+
+    for index, event in validated:
+        event_type = event["type"]
+        timestamp_dt = event["timestamp"]
+        data = event["data"]
+
+        if event_type == WebhookEventType.NEW_CONVERSATION.value:
+            conversation_id = data["id"]
+            if conversation_id in statuses:
+                results[index] = ({"error": "Conversation already exists"}, 400)
+                continue
+            statuses[conversation_id] = ConversationStatus.OPEN.value
+            created_ids.append(conversation_id)
+            created_indexes[conversation_id] = index
+            results[index] = ({"message": "Conversation created"}, 201)
+
+        elif event_type == WebhookEventType.NEW_MESSAGE.value:
+            conversation_id = data["conversation_id"]
+            message_id = data["id"]
+
+            if message_id in known_message_ids:
+                results[index] = ({"message": "Message already processed"}, 200)
+                duplicates += 1
+                continue
+
+            conversation_status = statuses.get(conversation_id)
+            if conversation_status is None:
+                diff = (now - timestamp_dt).total_seconds()
+                if diff <= settings.MESSAGE_BUFFER_SECONDS:
+                    pending.append(
+                        pending_message(
+                            message_id, conversation_id, data["content"], timestamp_dt
+                        )
+                    )
+                    known_message_ids.add(message_id)
+                    results[index] = ({"message": "Message buffered"}, 202)
+                else:
+                    results[index] = ({"error": "Conversation does not exist"}, 400)
+                continue
+
+            if conversation_status == ConversationStatus.CLOSED.value:
+                results[index] = ({"error": "Conversation is closed"}, 400)
+                continue
+
+            messages.append(
+                Message(
+                    id=message_id,
+                    conversation_id=conversation_id,
+                    type=MessageType.INBOUND.value,
+                    content=data["content"],
+                    timestamp=timestamp_dt,
+                )
+            )
+            known_message_ids.add(message_id)
+            message_indexes[message_id] = index
+            results[index] = ({"message": "Message received"}, 202)
+
+        elif event_type == WebhookEventType.CLOSE_CONVERSATION.value:
+            conversation_id = data["id"]
+            conversation_status = statuses.get(conversation_id)
+            if conversation_status is None:
+                results[index] = ({"error": "Conversation not found"}, 404)
+            elif conversation_status == ConversationStatus.CLOSED.value:
+                results[index] = ({"error": "Conversation already closed"}, 400)
+            else:
+                statuses[conversation_id] = ConversationStatus.CLOSED.value
+                close_indexes[conversation_id] = index
+                results[index] = ({"message": "Conversation closed"}, 200)
+
+    to_id = Conversation._meta.pk.to_python
+    stale_ids = set()
+
+    with stage("db", BATCH), transaction.atomic():
+        # Conversas criadas e fechadas no mesmo lote já nascem CLOSED. O
+        # INSERT ignora as que um evento concorrente criou entre a leitura do
+        # estado e a gravação; o NEW_CONVERSATION delas recebe 400.
+        inserted_conversation_ids = create_conversations(
+            [
+                Conversation(id=conversation_id, status=statuses[conversation_id])
+                for conversation_id in created_ids
+            ]
+        )
+        raced_ids = {
+            conversation_id
+            for conversation_id in created_ids
+            if to_id(conversation_id) not in inserted_conversation_ids
+        }
+        for conversation_id in raced_ids:
+            results[created_indexes[conversation_id]] = (
+                {"error": "Conversation already exists"},
+                400,
+            )
+
+        # O status do lote veio do cache. As conversas que o lote não criou e
+        # nas quais grava mensagens ou que fecha são travadas e conferidas
+        # aqui; se um CLOSE_CONVERSATION concorrente já as fechou, as
+        # mensagens e o fechamento delas no lote são rejeitados.
+        checked_ids = raced_ids | {
+            conversation_id
+            for conversation_id in [
+                *(message.conversation_id for message in messages),
+                *close_indexes,
+            ]
+            if conversation_id in existing_statuses
+        }
+        if checked_ids:
+            open_ids = set(
+                Conversation.objects.select_for_update()
+                .filter(id__in=checked_ids, status=ConversationStatus.OPEN.value)
+                .values_list("id", flat=True)
+            )
+            stale_ids = {
+                conversation_id
+                for conversation_id in checked_ids
+                if to_id(conversation_id) not in open_ids
+            }
+        for conversation_id in stale_ids:
+            statuses[conversation_id] = ConversationStatus.CLOSED.value
+            if conversation_id in close_indexes:
+                results[close_indexes.pop(conversation_id)] = (
+                    {"error": "Conversation already closed"},
+                    400,
+                )
+        kept = []
+        for message in messages:
+            if message.conversation_id in stale_ids:
+                results[message_indexes[message.id]] = (
+                    {"error": "Conversation is closed"},
+                    400,
+                )
+            else:
+                kept.append(message)
+        messages = kept
+
+        # As linhas estão travadas e abertas: o UPDATE condicional atinge
+        # todas (close_conversations confere a contagem).
+        closed_ids = [
+            conversation_id
+            for conversation_id in close_indexes
+            if to_id(conversation_id) not in inserted_conversation_ids
+        ]
+        close_conversations(closed_ids, now)
+        inserted = insert_messages(messages, ignore_conflicts=True)
+        if len(inserted) < len(messages):
+            # Gravadas por um retry concorrente entre a leitura e o insert.
+            inserted_message_ids = {message.id for message in inserted}
+            for message in messages:
+                if message.id not in inserted_message_ids:
+                    results[message_indexes[message.id]] = (
+                        {"message": "Message already processed"},
+                        200,
+                    )
+            messages = inserted
+        if messages:
+            outbox.enqueue(
+                process_inbound_messages, [str(message.id) for message in messages]
+            )
+        drained = []
+        if pending:
+            drained += buffer_pending_messages(pending)
+        if created_ids:
+            # Inclui as pendentes de conversas criadas mais adiante no lote.
+            drained += drain_pending_messages(created_ids)
+
+    status_cache.set_many(
+        {
+            conversation_id: statuses[conversation_id]
+            for conversation_id in [*created_ids, *closed_ids, *stale_ids]
+        }
+    )
+    # As pendentes só ficam marcadas quando viram Message.
+    seen_messages.mark_many([m.id for m in messages])
+    if duplicates:
+        count_duplicate(WebhookEventType.NEW_MESSAGE.value, duplicates)
+
+    inbound_ids = [str(message.id) for message in messages] + drained
+    if inbound_ids:
+        with stage("publish", BATCH):
+            outbox.publish(process_inbound_messages, inbound_ids)
+
+    return results
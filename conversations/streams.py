@@ -0,0 +1,154 @@
+"""
+Entrega das mensagens novas de uma conversa aos clientes conectados em
+GET /async/conversations/{id}/stream/ (Server-Sent Events, via ASGI).
+
+As tasks publicam os ids das mensagens depois do commit (INBOUND em
+process_inbound_messages, OUTBOUND em generate_outbound_message_task) no
+canal Redis da conversa. Cada processo ASGI mantém uma única conexão de
+pub/sub, assina só os canais das conversas com clientes conectados e
+distribui cada publicação para as filas (asyncio.Queue) desses clientes:
+milhares de assinantes ociosos custam uma fila cada, não uma conexão.
+
+A publicação é só um aviso: o stream lê as mensagens do banco a partir do
+seu cursor (ver async_views._stream_events), então publicações fora de
+ordem ou perdidas não abrem buracos no que o cliente recebe.
+
+Sem MESSAGE_STREAM_REDIS_URL, a entrega é feita dentro do próprio processo
+(desenvolvimento e testes); publicações de outros processos não chegam.
+"""
+
+import asyncio
+import contextlib
+import logging
+from collections import defaultdict
+
+import orjson
+from django.conf import settings
+
+try:
+    import redis
+    import redis.asyncio as aioredis
+except ImportError:
+    redis = aioredis = None
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "conversation:messages:"
+
+
+def channel(conversation_id):
+    return f"{CHANNEL_PREFIX}{conversation_id}"
+
+
+class MessageStream:
+    def __init__(self):
+        # conversation_id -> {(loop, fila)} dos clientes conectados neste processo
+        self._subscribers = defaultdict(set)
+        self._client = None
+        self._pubsub = None
+        self._listener = None
+
+    @property
+    def _redis_url(self):
+        return settings.MESSAGE_STREAM_REDIS_URL if redis is not None else ""
+
+    def publish(self, conversation_id, payload: bytes):
+        """
+        Publica `payload` (JSON com os ids das mensagens) para os clientes da
+        conversa. Chamar depois do commit; falhas são só registradas, a
+        mensagem já está no banco e o cliente a recupera ao reconectar.
+        """
+        if not self._redis_url:
+            self._dispatch(str(conversation_id), payload)
+            return
+        try:
+            if self._client is None:
+                self._client = redis.Redis.from_url(self._redis_url)
+            self._client.publish(channel(conversation_id), payload)
+        except redis.RedisError as exc:
+            logger.warning(f"[MessageStream.publish] Falha ao publicar: {exc}")
+
+    def _dispatch(self, conversation_id, payload):
+        for loop, queue in list(self._subscribers.get(conversation_id, ())):
+            loop.call_soon_threadsafe(queue.put_nowait, payload)
+
+    def subscribe(self, conversation_id):
+        """
+        Context manager assíncrono com a fila que recebe os payloads
+        publicados para a conversa.
+        """
+        return Subscription(self, str(conversation_id))
+
+    async def _redis_subscribe(self, key):
+        if self._pubsub is None:
+            self._pubsub = aioredis.Redis.from_url(self._redis_url).pubsub(
+                ignore_subscribe_messages=True
+            )
+        await self._pubsub.subscribe(channel(key))
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        """Lê a conexão compartilhada enquanto houver canais assinados."""
+        while self._pubsub.subscribed:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except redis.RedisError as exc:
+                logger.warning(f"[MessageStream._listen] Conexão perdida: {exc}")
+                await asyncio.sleep(1.0)
+                continue
+            if message is None:
+                continue
+            key = message["channel"].decode().removeprefix(CHANNEL_PREFIX)
+            self._dispatch(key, message["data"])
+
+
+class Subscription:
+    """
+    Inscrição de um cliente em MessageStream. É uma classe, e não um
+    @asynccontextmanager: a saída não depende de retomar um gerador, então
+    a limpeza roda igual quando o gerador do stream é finalizado pelo
+    coletor, em qualquer ordem.
+    """
+
+    def __init__(self, stream, key):
+        self.stream = stream
+        self.key = key
+        self.entry = None
+
+    async def __aenter__(self):
+        stream = self.stream
+        self.entry = (asyncio.get_running_loop(), asyncio.Queue())
+        first = not stream._subscribers[self.key]
+        stream._subscribers[self.key].add(self.entry)
+        if first and stream._redis_url:
+            try:
+                await stream._redis_subscribe(self.key)
+            except BaseException:
+                await self.__aexit__(None, None, None)
+                raise
+        return self.entry[1]
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        stream = self.stream
+        subscribers = stream._subscribers.get(self.key)
+        if subscribers is None:
+            return
+        subscribers.discard(self.entry)
+        if not subscribers:
+            del stream._subscribers[self.key]
+            if stream._redis_url and stream._pubsub is not None:
+                with contextlib.suppress(redis.RedisError):
+                    await stream._pubsub.unsubscribe(channel(self.key))
+
+
+message_stream = MessageStream()
+
+
+def publish_messages(messages):
+    """Publica os ids das mensagens (instâncias de Message), uma vez por conversa."""
+    by_conversation = defaultdict(list)
+    for message in messages:
+        by_conversation[str(message.conversation_id)].append(str(message.id))
+    for conversation_id, message_ids in by_conversation.items():
+        message_stream.publish(conversation_id, orjson.dumps(message_ids))
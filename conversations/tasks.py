@@ -1,11 +1,18 @@
 from celery import shared_task
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from datetime import datetime, timedelta
-import time
 import logging
+import uuid
 
-from .models import Message, Conversation
-from .enums import MessageType, ConversationStatus
+from .cache import status_cache
+from .models import Change, Message, Conversation, PendingMessage
+from .partitions import drop_expired_message_partitions, ensure_message_partitions
+from .persistence import insert_messages
+from .responders import responder_pipeline
+from .streams import publish_messages
+from .enums import ConversationStatus, MessageType, ReplyStatus
 
 logger = logging.getLogger(__name__)
 
@@ -14,75 +21,198 @@ logger = logging.getLogger(__name__)
 def process_inbound_message(message_id: str) -> None:
     """
     Processa uma nova mensagem INBOUND.
-    Aguarda 5 segundos para agrupar outras mensagens recentes
-    e dispara a task que vai criar a resposta OUTBOUND
-    se for a última mensagem do grupo.
+    Empurra o prazo de flush da conversa para agora + janela de debounce,
+    sem ocupar o worker esperando. Quando o prazo vence sem novas mensagens,
+    flush_due_conversations dispara a task que cria a resposta OUTBOUND
+    com todas as mensagens da rajada.
     """
-    try:
-        message = Message.objects.get(id=message_id)
-        conversation = message.conversation
-
-        five_seconds_ago = timezone.now() - timedelta(seconds=5)
-        time.sleep(5)
-
-        recent_inbounds = Message.objects.filter(
-            conversation=conversation,
-            type=MessageType.INBOUND.value,
-            timestamp__gte=five_seconds_ago,
-        ).order_by("timestamp")
-
-        if recent_inbounds.last().id == message.id:
-            message_ids = [str(msg.id) for msg in recent_inbounds]
-            logger.info(
-                f"[process_inbound_message] Agendando OUTBOUND com mensagens: {message_ids}"
-            )
+    process_inbound_messages([message_id])
 
-            generate_outbound_message_task.apply_async(
-                (str(conversation.id), message_ids), countdown=6
-            )
-        else:
-            logger.debug(
-                f"[process_inbound_message] Ignorando mensagem {message.id}; não é a última do grupo."
-            )
 
-    except Message.DoesNotExist:
+@shared_task
+def process_inbound_messages(message_ids: list) -> None:
+    """
+    Versão em lote de process_inbound_message, usada pela ingestão em lote
+    do webhook: coloca na rajada pendente (reply_status 'PENDING') as INBOUND
+    que ainda não estavam em nenhuma, empurra o prazo de flush uma única vez
+    por conversa e publica as mensagens para os clientes conectados ao
+    stream da conversa. Repetir a task não devolve à rajada mensagens já
+    respondidas.
+    """
+    messages = list(
+        Message.objects.filter(id__in=message_ids)
+        .order_by("timestamp")
+        .only("id", "conversation_id", "type", "content", "timestamp", "reply_status")
+    )
+    if len(messages) < len(message_ids):
         logger.warning(
-            f"[process_inbound_message] Mensagem {message_id} não encontrada."
+            f"[process_inbound_messages] {len(message_ids) - len(messages)} mensagem(ns) não encontrada(s)."
         )
 
+    fresh = [
+        message
+        for message in messages
+        if message.type == MessageType.INBOUND.value and message.reply_status is None
+    ]
+    if fresh:
+        Message.objects.filter(
+            id__in=[message.id for message in fresh], reply_status__isnull=True
+        ).update(reply_status=ReplyStatus.PENDING.value)
+    for conversation_id in dict.fromkeys(message.conversation_id for message in fresh):
+        push_flush_deadline(conversation_id)
 
-@shared_task
-def generate_outbound_message_task(
-    conversation_id: str, inbound_message_ids: list
-) -> None:
+    publish_messages(messages)
+
+
+def push_flush_deadline(conversation_id) -> None:
+    """Adia o flush da conversa para agora + CONVERSATION_DEBOUNCE_SECONDS."""
+    deadline = timezone.now() + timedelta(
+        seconds=settings.CONVERSATION_DEBOUNCE_SECONDS
+    )
+    Conversation.objects.filter(id=conversation_id).update(flush_at=deadline)
+
+
+def claim_burst(conversation_id) -> list:
     """
-    Gera a mensagem OUTBOUND de resposta,
-    agrupando os conteúdos das mensagens INBOUND recebidas.
+    Ids das INBOUND da rajada pendente da conversa, em ordem de timestamp,
+    marcadas como respondidas na mesma transação. A rajada é definida pelos
+    ids marcados por process_inbound_messages, não por timestamps: uma
+    mensagem já gravada cuja task ainda não rodou fica para a próxima
+    rajada, e uma mensagem atrasada não traz de volta as já respondidas.
     """
-    try:
-        conversation = Conversation.objects.get(id=conversation_id)
-        messages = Message.objects.filter(id__in=inbound_message_ids).order_by(
-            "timestamp"
+    with transaction.atomic():
+        message_ids = list(
+            Message.objects.select_for_update(skip_locked=True)
+            .filter(
+                conversation_id=conversation_id,
+                reply_status=ReplyStatus.PENDING.value,
+            )
+            .order_by("timestamp")
+            .values_list("id", flat=True)
         )
+        if message_ids:
+            Message.objects.filter(id__in=message_ids).update(
+                reply_status=ReplyStatus.ANSWERED.value
+            )
+    return [str(message_id) for message_id in message_ids]
 
-        content_lines = [f"- {msg.content}" for msg in messages]
-        response_text = "Mensagens recebidas:\n" + "\n".join(content_lines)
 
-        Message.objects.create(
-            conversation=conversation,
-            type=MessageType.OUTBOUND.value,
-            content=response_text,
-            timestamp=timezone.now(),
-        )
+@shared_task
+def flush_due_conversations() -> int:
+    """
+    Varre as conversas cujo prazo de debounce já venceu e agenda a geração
+    da resposta OUTBOUND uma vez para cada rajada de mensagens INBOUND, em
+    lotes de até OUTBOUND_BATCH_SIZE conversas por task
+    (generate_outbound_messages_task). Executada periodicamente pelo Celery beat.
+    Retorna o número de conversas enviadas para geração da resposta.
+    """
+    due = Conversation.objects.filter(flush_at__lte=timezone.now()).values_list(
+        "id", "flush_at"
+    )[: settings.CONVERSATION_FLUSH_BATCH_SIZE]
+
+    bursts = []
+    for conversation_id, flush_at in due:
+        # Só reivindica o flush se nenhuma mensagem nova empurrou o prazo
+        # desde a leitura; evita respostas duplicadas entre varreduras.
+        claimed = Conversation.objects.filter(
+            id=conversation_id, flush_at=flush_at
+        ).update(flush_at=None)
+        if not claimed:
+            continue
+
+        message_ids = claim_burst(conversation_id)
+        if not message_ids:
+            continue
 
         logger.info(
-            f"[generate_outbound_message_task] OUTBOUND criada para conversation {conversation_id}"
+            f"[flush_due_conversations] Agendando OUTBOUND com mensagens: {message_ids}"
         )
+        bursts.append([str(conversation_id), message_ids])
+
+    size = settings.OUTBOUND_BATCH_SIZE
+    for start in range(0, len(bursts), size):
+        generate_outbound_messages_task.delay(bursts[start : start + size])
+    return len(bursts)
 
-    except Conversation.DoesNotExist:
-        logger.error(
-            f"[generate_outbound_message_task] Conversation {conversation_id} não encontrada."
+
+@shared_task
+def generate_outbound_messages_task(bursts: list) -> None:
+    """
+    Gera as respostas OUTBOUND de várias rajadas, [[conversation_id,
+    [ids das INBOUND]], ...], com os textos produzidos em paralelo pelo
+    pipeline de responders (ver conversations/responders.py), grava todas
+    em um único insert e as publica depois do commit para os clientes do
+    stream de cada conversa.
+    """
+    existing = {
+        str(conversation_id)
+        for conversation_id in Conversation.objects.filter(
+            id__in=[conversation_id for conversation_id, _ in bursts]
+        ).values_list("id", flat=True)
+    }
+    for conversation_id, _ in bursts:
+        if conversation_id not in existing:
+            logger.error(
+                f"[generate_outbound_messages_task] Conversation {conversation_id} não encontrada."
+            )
+    bursts = [burst for burst in bursts if burst[0] in existing]
+    if not bursts:
+        return
+
+    inbound = {
+        message_id: (timestamp, content)
+        for message_id, timestamp, content in Message.objects.filter(
+            id__in=[
+                message_id for _, message_ids in bursts for message_id in message_ids
+            ]
+        ).values_list("id", "timestamp", "content")
+    }
+
+    def burst_contents(message_ids):
+        found = sorted(
+            inbound[message_id]
+            for message_id in map(uuid.UUID, message_ids)
+            if message_id in inbound
         )
+        return [content for _, content in found]
+
+    texts = responder_pipeline().generate_many(
+        [
+            (conversation_id, burst_contents(message_ids))
+            for conversation_id, message_ids in bursts
+        ]
+    )
+
+    now = timezone.now()
+    outbound = insert_messages(
+        [
+            Message(
+                conversation_id=conversation_id,
+                type=MessageType.OUTBOUND.value,
+                content=text,
+                timestamp=now,
+            )
+            for (conversation_id, _), text in zip(bursts, texts)
+        ]
+    )
+    transaction.on_commit(lambda: publish_messages(outbound))
+
+    conversation_ids = [conversation_id for conversation_id, _ in bursts]
+    logger.info(
+        f"[generate_outbound_messages_task] OUTBOUND criada para conversations {conversation_ids}"
+    )
+
+
+@shared_task
+def generate_outbound_message_task(
+    conversation_id: str, inbound_message_ids: list
+) -> None:
+    """
+    Gera a mensagem OUTBOUND de resposta de uma rajada. Mantida para as tasks
+    enfileiradas antes do envio em lote; equivale a
+    generate_outbound_messages_task com uma única rajada.
+    """
+    generate_outbound_messages_task([[str(conversation_id), inbound_message_ids]])
 
 
 @shared_task
@@ -93,6 +223,10 @@ def process_delayed_message(
     Processa mensagens atrasadas:
     Se a conversa for criada dentro do tempo permitido,
     a mensagem é salva e processada como INBOUND.
+
+    O webhook não agenda mais esta task (as mensagens fora de ordem vão
+    para PendingMessage); ela é mantida para as tasks com ETA enfileiradas
+    antes da mudança.
     """
     try:
         timestamp = datetime.fromisoformat(timestamp_str.replace("Z", "+00:00"))
@@ -100,28 +234,70 @@ def process_delayed_message(
         logger.error(f"[process_delayed_message] Timestamp inválido: {timestamp_str}")
         return
 
-    try:
-        conversation = Conversation.objects.get(id=conversation_id)
-    except Conversation.DoesNotExist:
+    conversation_status = status_cache.get(conversation_id)
+    if conversation_status is None:
         logger.warning(
             f"[process_delayed_message] Conversation {conversation_id} ainda não existe. Ignorando."
         )
         return
 
-    if conversation.status == ConversationStatus.CLOSED.value:
+    if conversation_status == ConversationStatus.CLOSED.value:
         logger.info(
             f"[process_delayed_message] Conversation {conversation_id} está fechada. Ignorando mensagem."
         )
         return
 
-    msg = Message.objects.create(
+    msg = Message(
         id=message_id,
         conversation_id=conversation_id,
         type=MessageType.INBOUND.value,
         content=content,
         timestamp=timestamp,
     )
+    insert_messages([msg])
     logger.info(
         f"[process_delayed_message] Mensagem {msg.id} criada. Agendando processamento INBOUND."
     )
     process_inbound_message.delay(str(msg.id))
+
+
+@shared_task
+def purge_expired_pending_messages() -> int:
+    """
+    Remove do buffer as mensagens pendentes cuja conversa não foi criada
+    dentro de MESSAGE_BUFFER_SECONDS. Executada periodicamente pelo beat.
+    """
+    deleted, _ = PendingMessage.objects.filter(expires_at__lte=timezone.now()).delete()
+    if deleted:
+        logger.info(
+            f"[purge_expired_pending_messages] {deleted} mensagem(ns) pendente(s) expirada(s) removida(s)."
+        )
+    return deleted
+
+
+@shared_task
+def purge_expired_changes() -> int:
+    """
+    Remove as entradas do feed de mudanças mais antigas que
+    CHANGES_RETENTION_DAYS. Executada periodicamente pelo beat.
+    """
+    cutoff = timezone.now() - timedelta(days=settings.CHANGES_RETENTION_DAYS)
+    deleted, _ = Change.objects.filter(created_at__lt=cutoff).delete()
+    if deleted:
+        logger.info(
+            f"[purge_expired_changes] {deleted} entrada(s) do feed de mudanças removida(s)."
+        )
+    return deleted
+
+
+@shared_task
+def maintain_message_partitions() -> dict:
+    """
+    Cria as partições de Message à frente do período atual e remove as que
+    passaram de MESSAGE_RETENTION_DAYS. Executada periodicamente pelo beat;
+    idempotente e sem efeito fora do Postgres.
+    """
+    return {
+        "created": ensure_message_partitions(),
+        "dropped": drop_expired_message_partitions(),
+    }
@@ -1,10 +1,108 @@
+import asyncio
+import csv
+import gzip
+import importlib
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import brotli
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APIClient, APITestCase
 from uuid import uuid4
 from django.utils import timezone
-from conversations.models import Conversation, Message
-from conversations.enums import WebhookEventType, MessageType, ConversationStatus
+from prometheus_client import REGISTRY
+from realmate_challenge.celery_app import app as celery_app, apply_worker_profile
+from conversations.cache import (
+    LocalTTLCache,
+    render_cache,
+    seen_messages,
+    status_cache,
+)
+from conversations.exports import (
+    CONVERSATION_COLUMNS,
+    MESSAGE_COLUMNS,
+    export_queryset,
+    stream_export,
+)
+from conversations.metrics import task_started
+from conversations.models import (
+    Change,
+    Conversation,
+    Message,
+    OutboxTask,
+    PendingMessage,
+    SnapshotXmin,
+)
+from conversations.outbox import (
+    PipelinedProducer,
+    _batch_producer,
+    redis_transport,
+    relay_batch,
+)
+from conversations.persistence import (
+    close_conversation,
+    create_conversation,
+    insert_messages,
+)
+from conversations.replay import replay_events
+from conversations.serializers import (
+    WebhookSerializer,
+    fast_validate_webhook,
+    validate_webhook,
+)
+from conversations.responders import (
+    EchoResponder,
+    Responder,
+    ResponderPipeline,
+    SlowStubResponder,
+)
+from conversations.partitions import (
+    drop_expired_message_partitions,
+    ensure_message_partitions,
+    expired_partitions,
+    partition_name,
+    periods,
+)
+from conversations.enums import (
+    ChangeKind,
+    ConversationStatus,
+    MessageType,
+    ReplyStatus,
+    WebhookEventType,
+)
+from conversations.tasks import (
+    flush_due_conversations,
+    generate_outbound_message_task,
+    generate_outbound_messages_task,
+    maintain_message_partitions,
+    process_inbound_message,
+    process_inbound_messages,
+    purge_expired_changes,
+    purge_expired_pending_messages,
+)
+from conversations.views import render_conversation
 
 
 class WebhookTests(APITestCase):
@@ -179,6 +277,642 @@ class WebhookTests(APITestCase):
         self.assertIn("conversation_id", response.data)
 
 
+class ConversationTransitionTests(APITestCase):
+    def setUp(self):
+        self.url = reverse("webhook")
+        self.conversation_id = str(uuid4())
+        status_cache.clear()
+
+    def _post(self, event_type):
+        return self.client.post(
+            self.url,
+            data={
+                "type": event_type,
+                "timestamp": timezone.now().isoformat(),
+                "data": {"id": self.conversation_id},
+            },
+            format="json",
+        )
+
+    def _conversation_queries(self, queries):
+        return [
+            q["sql"]
+            for q in queries.captured_queries
+            if '"conversations_conversation"' in q["sql"]
+            and not q["sql"].startswith(("SAVEPOINT", "RELEASE"))
+        ]
+
+    def _changes(self):
+        return Change.objects.filter(
+            kind=ChangeKind.CONVERSATION.value, object_id=self.conversation_id
+        ).count()
+
+    def test_new_conversation_is_a_single_conditional_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self._post(WebhookEventType.NEW_CONVERSATION.value)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        statements = self._conversation_queries(queries)
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith("INSERT"))
+        self.assertEqual(self._changes(), 1)
+
+    def test_concurrent_duplicate_new_conversation_inserts_nothing(self):
+        # Outro request criou a conversa primeiro; não há SELECT para perder a corrida.
+        Conversation.objects.create(id=self.conversation_id)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self._post(WebhookEventType.NEW_CONVERSATION.value)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"error": "Conversation already exists"})
+        self.assertEqual(len(self._conversation_queries(queries)), 1)
+        self.assertEqual(self._changes(), 0)
+
+    def test_close_is_a_single_conditional_update(self):
+        self._post(WebhookEventType.NEW_CONVERSATION.value)
+        version = Conversation.objects.get(id=self.conversation_id).version
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self._post(WebhookEventType.CLOSE_CONVERSATION.value)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statements = self._conversation_queries(queries)
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith("UPDATE"))
+        self.assertIn("\"status\" = 'OPEN'", statements[0].split("WHERE")[1])
+        conversation = Conversation.objects.get(id=self.conversation_id)
+        self.assertEqual(conversation.status, ConversationStatus.CLOSED.value)
+        self.assertEqual(conversation.version, version + 1)
+        self.assertEqual(self._changes(), 2)
+        self.assertEqual(
+            status_cache.get(self.conversation_id), ConversationStatus.CLOSED.value
+        )
+
+    def test_concurrent_closes_update_the_row_once(self):
+        self._post(WebhookEventType.NEW_CONVERSATION.value)
+        version = Conversation.objects.get(id=self.conversation_id).version
+
+        # Dois CLOSE_CONVERSATION que passaram juntos pela validação.
+        results = [
+            close_conversation(self.conversation_id, timezone.now()) for _ in range(2)
+        ]
+
+        self.assertEqual(results, [True, False])
+        self.assertEqual(
+            Conversation.objects.get(id=self.conversation_id).version, version + 1
+        )
+        self.assertEqual(self._changes(), 2)
+
+    def test_close_maps_affected_rows_to_response(self):
+        response = self._post(WebhookEventType.CLOSE_CONVERSATION.value)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self._post(WebhookEventType.NEW_CONVERSATION.value)
+        self._post(WebhookEventType.CLOSE_CONVERSATION.value)
+        with CaptureQueriesContext(connection) as queries:
+            response = self._post(WebhookEventType.CLOSE_CONVERSATION.value)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"error": "Conversation already closed"})
+        # UPDATE sem linhas afetadas e o SELECT que distingue 404 de 400.
+        self.assertEqual(len(self._conversation_queries(queries)), 2)
+        self.assertEqual(self._changes(), 2)
+
+
+# Requests simultâneos, cada um na sua conexão (ex.: Postgres do docker-compose).
+@skipUnlessDBFeature("test_db_allows_multiple_connections")
+class ConcurrentTransitionTests(TransactionTestCase):
+    def setUp(self):
+        self.conversation_id = str(uuid4())
+        status_cache.clear()
+
+    def _post_concurrently(self, event_type, count=8):
+        barrier = threading.Barrier(count)
+        payload = {
+            "type": event_type,
+            "timestamp": timezone.now().isoformat(),
+            "data": {"id": self.conversation_id},
+        }
+
+        def post(_):
+            client = APIClient()
+            barrier.wait()
+            try:
+                return client.post(
+                    reverse("webhook"), payload, format="json"
+                ).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(count) as executor:
+            return sorted(executor.map(post, range(count)))
+
+    def test_duplicate_new_conversation_creates_once(self):
+        codes = self._post_concurrently(WebhookEventType.NEW_CONVERSATION.value)
+
+        self.assertEqual(codes, [201] + [400] * 7)
+        self.assertEqual(
+            Change.objects.filter(object_id=self.conversation_id).count(), 1
+        )
+
+    def test_concurrent_close_succeeds_once(self):
+        Conversation.objects.create(id=self.conversation_id)
+
+        codes = self._post_concurrently(WebhookEventType.CLOSE_CONVERSATION.value)
+
+        self.assertEqual(codes, [200] + [400] * 7)
+        self.assertEqual(Conversation.objects.get(id=self.conversation_id).version, 1)
+
+
+@mock.patch.object(process_inbound_messages, "delay")
+class WebhookBatchTests(APITestCase):
+    def setUp(self):
+        self.url = reverse("webhook")
+        self.conversation_id = str(uuid4())
+
+    def _event(self, event_type, data):
+        return {
+            "type": event_type,
+            "timestamp": timezone.now().isoformat(),
+            "data": data,
+        }
+
+    def _message(self, message_id, conversation_id=None):
+        return self._event(
+            WebhookEventType.NEW_MESSAGE.value,
+            {
+                "id": message_id,
+                "conversation_id": conversation_id or self.conversation_id,
+                "content": "Mensagem em lote",
+            },
+        )
+
+    def test_batch_applies_events_in_order(self, delay):
+        first, second, late = str(uuid4()), str(uuid4()), str(uuid4())
+        events = [
+            self._event(
+                WebhookEventType.NEW_CONVERSATION.value, {"id": self.conversation_id}
+            ),
+            self._message(first),
+            self._message(second),
+            self._event(
+                WebhookEventType.CLOSE_CONVERSATION.value, {"id": self.conversation_id}
+            ),
+            self._message(late),
+            {
+                "type": "INVALID_EVENT",
+                "timestamp": timezone.now().isoformat(),
+                "data": {},
+            },
+            self._event(
+                WebhookEventType.NEW_CONVERSATION.value, {"id": self.conversation_id}
+            ),
+        ]
+
+        response = self.client.post(self.url, data=events, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            [201, 202, 202, 200, 400, 400, 400],
+        )
+        self.assertIn("type", response.data["results"][5]["body"])
+        conversation = Conversation.objects.get(id=self.conversation_id)
+        self.assertEqual(conversation.status, ConversationStatus.CLOSED.value)
+        self.assertEqual(
+            set(str(m) for m in conversation.messages.values_list("id", flat=True)),
+            {first, second},
+        )
+        delay.assert_called_once_with([first, second])
+
+    def test_batch_acknowledges_duplicate_message_ids(self, delay):
+        Conversation.objects.create(id=self.conversation_id)
+        message_id = str(uuid4())
+
+        response = self.client.post(
+            self.url,
+            data=[self._message(message_id), self._message(message_id)],
+            format="json",
+        )
+
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]], [202, 200]
+        )
+        self.assertEqual(
+            response.data["results"][1]["body"],
+            {"message": "Message already processed"},
+        )
+        self.assertEqual(Message.objects.filter(id=message_id).count(), 1)
+
+    def test_ndjson_batch(self, delay):
+        Conversation.objects.create(id=self.conversation_id)
+        events = [self._message(str(uuid4())) for _ in range(3)]
+        body = "\n".join(json.dumps(event) for event in events) + "\n"
+
+        response = self.client.post(
+            self.url, data=body, content_type="application/x-ndjson"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]], [202] * 3
+        )
+        self.assertEqual(Message.objects.count(), 3)
+        delay.assert_called_once()
+
+    def test_ndjson_parse_error(self, delay):
+        response = self.client.post(
+            self.url,
+            data='{"type": "NEW_MESSAGE"}\nnot-json\n',
+            content_type="application/x-ndjson",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_queries_do_not_grow_with_batch_size(self, delay):
+        conversation = Conversation.objects.create(id=self.conversation_id)
+        status_cache.set(conversation.id, conversation.status)
+
+        def post_batch(size):
+            events = [self._message(str(uuid4())) for _ in range(size)]
+            with self.assertNumQueries(10):
+                response = self.client.post(self.url, data=events, format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        post_batch(2)
+        post_batch(50)
+
+    def test_batch_rejects_messages_to_conversation_closed_after_cache(self, delay):
+        conversation = Conversation.objects.create(id=self.conversation_id)
+        status_cache.set(conversation.id, conversation.status)
+        Conversation.objects.filter(id=conversation.id).update(
+            status=ConversationStatus.CLOSED.value
+        )
+
+        response = self.client.post(
+            self.url, data=[self._message(str(uuid4()))], format="json"
+        )
+
+        self.assertEqual(
+            response.data["results"],
+            [{"status": 400, "body": {"error": "Conversation is closed"}}],
+        )
+        self.assertFalse(Message.objects.exists())
+        delay.assert_not_called()
+
+    def test_batch_close_of_conversation_closed_after_cache(self, delay):
+        conversation = Conversation.objects.create(id=self.conversation_id)
+        status_cache.set(conversation.id, conversation.status)
+        Conversation.objects.filter(id=conversation.id).update(
+            status=ConversationStatus.CLOSED.value
+        )
+
+        response = self.client.post(
+            self.url,
+            data=[
+                self._event(
+                    WebhookEventType.CLOSE_CONVERSATION.value,
+                    {"id": self.conversation_id},
+                )
+            ],
+            format="json",
+        )
+
+        self.assertEqual(
+            response.data["results"],
+            [{"status": 400, "body": {"error": "Conversation already closed"}}],
+        )
+        self.assertEqual(Conversation.objects.get(id=conversation.id).version, 0)
+        self.assertEqual(
+            status_cache.get(conversation.id), ConversationStatus.CLOSED.value
+        )
+
+    def test_batch_new_conversation_created_after_cache_read(self, delay):
+        Conversation.objects.create(id=self.conversation_id)
+        message_id = str(uuid4())
+
+        with mock.patch.object(status_cache, "get_many", return_value={}):
+            response = self.client.post(
+                self.url,
+                data=[
+                    self._event(
+                        WebhookEventType.NEW_CONVERSATION.value,
+                        {"id": self.conversation_id},
+                    ),
+                    self._message(message_id),
+                ],
+                format="json",
+            )
+
+        self.assertEqual(
+            response.data["results"],
+            [
+                {"status": 400, "body": {"error": "Conversation already exists"}},
+                {"status": 202, "body": {"message": "Message received"}},
+            ],
+        )
+        # Só a entrada da mensagem; a criação que não inseriu não entra no feed.
+        self.assertEqual(
+            Change.objects.filter(
+                kind=ChangeKind.CONVERSATION.value, object_id=self.conversation_id
+            ).count(),
+            1,
+        )
+        self.assertTrue(Message.objects.filter(id=message_id).exists())
+
+    def _post_interleaved(self, events, concurrent):
+        """
+        Envia o lote rodando `concurrent` (outra transação, já confirmada)
+        entre a leitura do estado das conversas e a transação do lote.
+        """
+        get_many = status_cache.get_many
+
+        def read_then_interleave(conversation_ids):
+            statuses = get_many(conversation_ids)
+            concurrent()
+            return statuses
+
+        with mock.patch.object(
+            status_cache, "get_many", side_effect=read_then_interleave
+        ):
+            return self.client.post(self.url, data=events, format="json")
+
+    def test_batch_interleaved_with_concurrent_close(self, delay):
+        Conversation.objects.create(id=self.conversation_id)
+        status_cache.clear()
+
+        response = self._post_interleaved(
+            [
+                self._message(str(uuid4())),
+                self._event(
+                    WebhookEventType.CLOSE_CONVERSATION.value,
+                    {"id": self.conversation_id},
+                ),
+            ],
+            lambda: close_conversation(self.conversation_id, timezone.now()),
+        )
+
+        self.assertEqual(
+            response.data["results"],
+            [
+                {"status": 400, "body": {"error": "Conversation is closed"}},
+                {"status": 400, "body": {"error": "Conversation already closed"}},
+            ],
+        )
+        conversation = Conversation.objects.get(id=self.conversation_id)
+        self.assertEqual((conversation.version, conversation.message_count), (1, 0))
+        self.assertFalse(Message.objects.exists())
+        delay.assert_not_called()
+
+    def test_batch_interleaved_with_concurrent_new_conversation(self, delay):
+        status_cache.clear()
+
+        response = self._post_interleaved(
+            [
+                self._event(
+                    WebhookEventType.NEW_CONVERSATION.value,
+                    {"id": self.conversation_id},
+                ),
+                self._event(
+                    WebhookEventType.CLOSE_CONVERSATION.value,
+                    {"id": self.conversation_id},
+                ),
+            ],
+            lambda: create_conversation(self.conversation_id),
+        )
+
+        self.assertEqual(
+            response.data["results"],
+            [
+                {"status": 400, "body": {"error": "Conversation already exists"}},
+                {"status": 200, "body": {"message": "Conversation closed"}},
+            ],
+        )
+        self.assertEqual(
+            Change.objects.filter(
+                kind=ChangeKind.CONVERSATION.value, object_id=self.conversation_id
+            ).count(),
+            2,
+        )
+        conversation = Conversation.objects.get(id=self.conversation_id)
+        self.assertEqual(conversation.status, ConversationStatus.CLOSED.value)
+        self.assertEqual(conversation.version, 1)
+
+    @override_settings(WEBHOOK_MAX_BATCH_SIZE=2)
+    def test_batch_too_large(self, delay):
+        events = [self._message(str(uuid4())) for _ in range(3)]
+        response = self.client.post(self.url, data=events, format="json")
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        delay.assert_not_called()
+
+
+@mock.patch.object(process_inbound_message, "delay")
+class ConversationStatusCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        status_cache.clear()
+        self.url = reverse("webhook")
+        self.conversation_id = str(uuid4())
+
+    def _post(self, event_type, data):
+        payload = {
+            "type": event_type,
+            "timestamp": timezone.now().isoformat(),
+            "data": data,
+        }
+        return self.client.post(self.url, data=payload, format="json")
+
+    def _new_message(self):
+        return self._post(
+            WebhookEventType.NEW_MESSAGE.value,
+            {
+                "id": str(uuid4()),
+                "conversation_id": self.conversation_id,
+                "content": "Mensagem",
+            },
+        )
+
+    def test_message_to_open_conversation_skips_select(self, delay):
+        self._post(
+            WebhookEventType.NEW_CONVERSATION.value, {"id": self.conversation_id}
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self._new_message()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        # Só o INSERT da mensagem e o incremento de versão da conversa.
+        self.assertFalse(
+            [q for q in queries if q["sql"].lstrip().upper().startswith("SELECT")]
+        )
+
+    def test_close_updates_cached_status(self, delay):
+        self._post(
+            WebhookEventType.NEW_CONVERSATION.value, {"id": self.conversation_id}
+        )
+        self._post(
+            WebhookEventType.CLOSE_CONVERSATION.value, {"id": self.conversation_id}
+        )
+
+        with self.assertNumQueries(0):
+            response = self._new_message()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_read_through_does_not_overwrite_closed_status(self, delay):
+        Conversation.objects.create(id=self.conversation_id)
+        # Um leitor leu OPEN do banco, o fechamento gravou CLOSED e só então
+        # o leitor preenche o cache.
+        status_cache.set(self.conversation_id, ConversationStatus.CLOSED.value)
+        status_cache._fill({self.conversation_id: ConversationStatus.OPEN.value})
+        status_cache._local.clear()
+
+        self.assertEqual(
+            status_cache.get(self.conversation_id), ConversationStatus.CLOSED.value
+        )
+
+    def test_message_with_stale_open_status_is_rejected(self, delay):
+        self._post(
+            WebhookEventType.NEW_CONVERSATION.value, {"id": self.conversation_id}
+        )
+        # Fechada por outro processo; o cache ainda diz OPEN.
+        Conversation.objects.filter(id=self.conversation_id).update(
+            status=ConversationStatus.CLOSED.value
+        )
+
+        response = self._new_message()
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"error": "Conversation is closed"})
+        self.assertFalse(Message.objects.exists())
+        self.assertEqual(
+            Conversation.objects.get(id=self.conversation_id).message_count, 0
+        )
+        delay.assert_not_called()
+        self.assertEqual(
+            status_cache.get(self.conversation_id), ConversationStatus.CLOSED.value
+        )
+
+    def test_shared_tier_is_used_after_local_miss(self, delay):
+        Conversation.objects.create(id=self.conversation_id)
+        self._new_message()
+        status_cache._local.clear()
+        self._new_message()
+        self._new_message()
+
+        response = self.client.get(reverse("cache_stats"))
+        self.assertEqual(
+            response.data["status_cache"],
+            {"local_hits": 1, "shared_hits": 1, "misses": 1},
+        )
+
+
+class LocalTTLCacheTests(SimpleTestCase):
+    def test_entries_expire_after_ttl(self):
+        local = LocalTTLCache(maxsize=10, ttl=10)
+        local.set("a", "OPEN")
+        with mock.patch("conversations.cache.time.monotonic", return_value=1e12):
+            self.assertIsNone(local.get("a"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        local = LocalTTLCache(maxsize=2, ttl=60)
+        local.set("a", 1)
+        local.set("b", 2)
+        local.get("a")
+        local.set("c", 3)
+        self.assertEqual(local.get("a"), 1)
+        self.assertIsNone(local.get("b"))
+        self.assertEqual(local.get("c"), 3)
+
+
+@mock.patch.object(process_inbound_messages, "delay")
+class PendingMessageBufferTests(APITestCase):
+    def setUp(self):
+        self.url = reverse("webhook")
+        self.conversation_id = str(uuid4())
+
+    def _event(self, event_type, data, timestamp=None):
+        return {
+            "type": event_type,
+            "timestamp": (timestamp or timezone.now()).isoformat(),
+            "data": data,
+        }
+
+    def _new_message(self, message_id, timestamp=None):
+        return self._event(
+            WebhookEventType.NEW_MESSAGE.value,
+            {
+                "id": message_id,
+                "conversation_id": self.conversation_id,
+                "content": "Mensagem adiantada",
+            },
+            timestamp,
+        )
+
+    def _new_conversation(self):
+        return self._event(
+            WebhookEventType.NEW_CONVERSATION.value, {"id": self.conversation_id}
+        )
+
+    def test_new_conversation_drains_buffered_message(self, delay):
+        message_id = str(uuid4())
+        response = self.client.post(
+            self.url, data=self._new_message(message_id), format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(PendingMessage.objects.filter(id=message_id).exists())
+        self.assertFalse(Message.objects.filter(id=message_id).exists())
+
+        response = self.client.post(
+            self.url, data=self._new_conversation(), format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        message = Message.objects.get(id=message_id)
+        self.assertEqual(str(message.conversation_id), self.conversation_id)
+        self.assertEqual(message.type, MessageType.INBOUND.value)
+        self.assertFalse(PendingMessage.objects.exists())
+        delay.assert_called_once_with([message_id])
+
+    def test_message_older_than_buffer_window_is_rejected(self, delay):
+        old = timezone.now() - timedelta(seconds=30)
+        response = self.client.post(
+            self.url, data=self._new_message(str(uuid4()), old), format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(PendingMessage.objects.exists())
+
+    def test_expired_pending_message_is_not_drained(self, delay):
+        message_id = uuid4()
+        PendingMessage.objects.create(
+            id=message_id,
+            conversation_id=self.conversation_id,
+            content="Expirada",
+            timestamp=timezone.now() - timedelta(seconds=10),
+            expires_at=timezone.now() - timedelta(seconds=4),
+        )
+
+        self.client.post(self.url, data=self._new_conversation(), format="json")
+
+        self.assertFalse(Message.objects.filter(id=message_id).exists())
+        delay.assert_not_called()
+        self.assertEqual(purge_expired_pending_messages(), 1)
+        self.assertFalse(PendingMessage.objects.exists())
+
+    def test_batch_message_before_conversation_is_drained(self, delay):
+        message_id = str(uuid4())
+        response = self.client.post(
+            self.url,
+            data=[self._new_message(message_id), self._new_conversation()],
+            format="json",
+        )
+
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]], [202, 201]
+        )
+        self.assertTrue(Message.objects.filter(id=message_id).exists())
+        self.assertFalse(PendingMessage.objects.exists())
+        delay.assert_called_once_with([message_id])
+
+
 class ConversationEndpointsTests(APITestCase):
     def test_list_conversations(self):
         Conversation.objects.create(id=uuid4(), status=ConversationStatus.OPEN.value)
@@ -187,7 +921,8 @@ class ConversationEndpointsTests(APITestCase):
         url = reverse("conversation_list")
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertGreaterEqual(len(response.data), 2)
+        self.assertGreaterEqual(len(response.data["results"]), 2)
+        self.assertIsNone(response.data["next"])
 
     def test_conversation_detail(self):
         conv = Conversation.objects.create(
@@ -197,4 +932,2007 @@ class ConversationEndpointsTests(APITestCase):
         url = reverse("conversation_detail", kwargs={"id": conv.id})
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(str(response.data["id"]), str(conv.id))
+        self.assertEqual(response.json()["id"], str(conv.id))
+
+
+class ConversationActivityTests(APITestCase):
+    def setUp(self):
+        self.conversation = Conversation.objects.create(id=uuid4())
+        self.base = timezone.now()
+
+    def _message(
+        self, offset_seconds, message_type=MessageType.INBOUND.value, conversation=None
+    ):
+        return Message(
+            id=uuid4(),
+            conversation_id=str((conversation or self.conversation).id),
+            type=message_type,
+            content="Oi",
+            timestamp=self.base + timedelta(seconds=offset_seconds),
+        )
+
+    def test_insert_updates_counters_in_single_update(self):
+        messages = [self._message(0), self._message(2), self._message(1)]
+        with CaptureQueriesContext(connection) as queries:
+            insert_messages(messages)
+        updates = [q for q in queries.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 3)
+        self.assertEqual(
+            self.conversation.last_message_at, self.base + timedelta(seconds=2)
+        )
+        self.assertEqual(
+            self.conversation.last_inbound_at, self.base + timedelta(seconds=2)
+        )
+        self.assertIsNone(self.conversation.last_outbound_at)
+
+    def test_late_message_does_not_move_timestamps_back(self):
+        insert_messages([self._message(5)])
+        insert_messages(
+            [self._message(1), self._message(3, MessageType.OUTBOUND.value)]
+        )
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 3)
+        self.assertEqual(
+            self.conversation.last_message_at, self.base + timedelta(seconds=5)
+        )
+        self.assertEqual(
+            self.conversation.last_inbound_at, self.base + timedelta(seconds=5)
+        )
+        self.assertEqual(
+            self.conversation.last_outbound_at, self.base + timedelta(seconds=3)
+        )
+
+    def test_message_id_is_unique_across_timestamps(self):
+        first = self._message(0)
+        insert_messages([first])
+        # Mesmo id com outro timestamp: no Postgres, outra partição de Message.
+        retry = self._message(60)
+        retry.id = first.id
+
+        self.assertEqual(insert_messages([retry], ignore_conflicts=True), [])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            insert_messages([retry])
+
+        self.assertEqual(Message.objects.filter(id=first.id).count(), 1)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 1)
+        self.assertEqual(self.conversation.version, 1)
+        self.assertEqual(
+            self.conversation.last_message_at, self.base + timedelta(seconds=0)
+        )
+
+    def test_batch_updates_each_conversation(self):
+        other = Conversation.objects.create(id=uuid4())
+        insert_messages(
+            [
+                self._message(0),
+                self._message(1, conversation=other),
+                self._message(2, conversation=other),
+            ]
+        )
+
+        self.conversation.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 1)
+        self.assertEqual(other.message_count, 2)
+        self.assertEqual(other.last_message_at, self.base + timedelta(seconds=2))
+
+    def test_backfill_recomputes_from_messages(self):
+        Message.objects.bulk_create(
+            [self._message(0), self._message(4, MessageType.OUTBOUND.value)]
+        )
+        empty = Conversation.objects.create(id=uuid4(), message_count=7)
+
+        call_command(
+            "backfill_conversation_activity", batch_size=1, stdout=mock.MagicMock()
+        )
+
+        self.conversation.refresh_from_db()
+        empty.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 2)
+        self.assertEqual(self.conversation.last_inbound_at, self.base)
+        self.assertEqual(
+            self.conversation.last_outbound_at, self.base + timedelta(seconds=4)
+        )
+        self.assertEqual(self.conversation.version, 1)
+        self.assertEqual(empty.message_count, 0)
+        self.assertIsNone(empty.last_message_at)
+
+    def test_list_orders_by_latest_activity(self):
+        quiet = Conversation.objects.create(id=uuid4())
+        busy = Conversation.objects.create(id=uuid4())
+        insert_messages([self._message(0, conversation=quiet)])
+        insert_messages([self._message(9, conversation=busy)])
+
+        for fast in (False, True):
+            with (
+                self.subTest(fast=fast),
+                override_settings(CONVERSATION_FAST_RENDER=fast),
+            ):
+                response = self.client.get(
+                    reverse("conversation_list"),
+                    {"ordering": "last_message_at", "page_size": 1},
+                )
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                body = response.json()
+                self.assertEqual(
+                    [item["id"] for item in body["results"]], [str(busy.id)]
+                )
+                self.assertEqual(body["results"][0]["message_count"], 1)
+
+                body = self.client.get(body["next"]).json()
+                # Conversas sem mensagens ficam fora desta ordenação.
+                self.assertEqual(
+                    [item["id"] for item in body["results"]], [str(quiet.id)]
+                )
+                self.assertIsNone(body["next"])
+
+
+@override_settings(CHANGES_SETTLE_SECONDS=0)
+@mock.patch.object(process_inbound_message, "delay")
+class ChangeFeedTests(APITestCase):
+    def setUp(self):
+        self.url = reverse("changes")
+        self.webhook = reverse("webhook")
+        self.conversation_id = str(uuid4())
+
+    def _post(self, event_type, data):
+        payload = {
+            "type": event_type,
+            "timestamp": timezone.now().isoformat(),
+            "data": data,
+        }
+        return self.client.post(self.webhook, data=payload, format="json")
+
+    def _message(self):
+        message_id = str(uuid4())
+        self._post(
+            WebhookEventType.NEW_MESSAGE.value,
+            {
+                "id": message_id,
+                "conversation_id": self.conversation_id,
+                "content": "Oi",
+            },
+        )
+        return message_id
+
+    def _drain(self, since=None, limit=None):
+        params = {
+            key: value for key, value in (("since", since), ("limit", limit)) if value
+        }
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_feed_returns_only_changes_after_cursor(self, delay):
+        self._post(
+            WebhookEventType.NEW_CONVERSATION.value, {"id": self.conversation_id}
+        )
+        first_message = self._message()
+
+        body = self._drain()
+        self.assertEqual(
+            [c["id"] for c in body["conversations"]], [self.conversation_id]
+        )
+        self.assertEqual(body["conversations"][0]["message_count"], 1)
+        self.assertNotIn("messages", body["conversations"][0])
+        self.assertEqual([m["id"] for m in body["messages"]], [first_message])
+        self.assertEqual(body["messages"][0]["conversation_id"], self.conversation_id)
+        self.assertFalse(body["has_more"])
+
+        caught_up = self._drain(body["next"])
+        self.assertEqual(caught_up["conversations"], [])
+        self.assertEqual(caught_up["messages"], [])
+        self.assertEqual(caught_up["next"], body["next"])
+
+        second_message = self._message()
+        self._post(
+            WebhookEventType.CLOSE_CONVERSATION.value, {"id": self.conversation_id}
+        )
+        body = self._drain(body["next"])
+        self.assertEqual([m["id"] for m in body["messages"]], [second_message])
+        self.assertEqual(
+            body["conversations"][0]["status"], ConversationStatus.CLOSED.value
+        )
+
+    def test_limit_bounds_each_batch(self, delay):
+        self._post(
+            WebhookEventType.NEW_CONVERSATION.value, {"id": self.conversation_id}
+        )
+        message_ids = [self._message() for _ in range(3)]
+
+        # 1 criação + (mensagem + conversa) por mensagem = 7 entradas.
+        seen, since, calls = [], None, 0
+        while True:
+            body = self._drain(since, limit=2)
+            seen += [m["id"] for m in body["messages"]]
+            since, calls = body["next"], calls + 1
+            if not body["has_more"]:
+                break
+        self.assertEqual(seen, message_ids)
+        self.assertEqual(calls, 4)
+
+    def test_entry_with_lower_id_committed_later_is_not_skipped(self, delay):
+        early, late = Conversation.objects.create(), Conversation.objects.create()
+
+        def entry(conversation, txid, sequence):
+            Change.objects.create(
+                id=sequence,
+                txid=txid,
+                kind=ChangeKind.CONVERSATION.value,
+                object_id=conversation.id,
+                conversation_id=conversation.id,
+            )
+
+        # A transação 8 reservou o id 1000 e ainda não comitou quando a 7
+        # grava o id 1001: só o que está abaixo do xmin (8) é entregue.
+        entry(early, txid=7, sequence=1001)
+        with mock.patch.object(SnapshotXmin, "template", "8"):
+            body = self._drain()
+        self.assertEqual([c["id"] for c in body["conversations"]], [str(early.id)])
+
+        entry(late, txid=8, sequence=1000)
+        body = self._drain(body["next"])
+        self.assertEqual([c["id"] for c in body["conversations"]], [str(late.id)])
+
+    @override_settings(CHANGES_SETTLE_SECONDS=60)
+    def test_recent_entries_wait_to_settle(self, delay):
+        self._post(
+            WebhookEventType.NEW_CONVERSATION.value, {"id": self.conversation_id}
+        )
+        body = self._drain()
+        self.assertEqual(body["conversations"], [])
+        self.assertEqual(self._drain(body["next"])["conversations"], [])
+
+    def test_invalid_cursor(self, delay):
+        response = self.client.get(self.url, {"since": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_purge_expired_changes(self, delay):
+        self._post(
+            WebhookEventType.NEW_CONVERSATION.value, {"id": self.conversation_id}
+        )
+        Change.objects.update(
+            created_at=timezone.now()
+            - timedelta(days=settings.CHANGES_RETENTION_DAYS, seconds=1)
+        )
+        self._message()
+
+        self.assertEqual(purge_expired_changes(), 1)
+        self.assertEqual(Change.objects.count(), 2)
+
+
+class ConversationListPaginationTests(APITestCase):
+    def setUp(self):
+        self.url = reverse("conversation_list")
+        base = timezone.now()
+        self.conversations = []
+        for index in range(5):
+            conv = Conversation.objects.create(
+                id=uuid4(),
+                status=(
+                    ConversationStatus.OPEN.value
+                    if index % 2 == 0
+                    else ConversationStatus.CLOSED.value
+                ),
+            )
+            # updated_at é auto_now; fixa valores distintos via update()
+            Conversation.objects.filter(id=conv.id).update(
+                updated_at=base + timedelta(seconds=index)
+            )
+            self.conversations.append(conv)
+
+    def test_pages_follow_cursor_without_overlap(self):
+        seen = []
+        url = f"{self.url}?page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 2)
+            seen.extend(str(item["id"]) for item in response.data["results"])
+            url = response.data["next"]
+
+        expected = [str(c.id) for c in reversed(self.conversations)]
+        self.assertEqual(seen, expected)
+
+    def test_ties_on_updated_at_are_broken_by_id(self):
+        Conversation.objects.update(updated_at=timezone.now())
+
+        seen = []
+        url = f"{self.url}?page_size=2"
+        while url:
+            response = self.client.get(url)
+            seen.extend(str(item["id"]) for item in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(sorted(seen), sorted(str(c.id) for c in self.conversations))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_filter_by_status(self):
+        response = self.client.get(
+            self.url, {"status": ConversationStatus.CLOSED.value}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 2)
+        for item in response.data["results"]:
+            self.assertEqual(item["status"], ConversationStatus.CLOSED.value)
+
+    def test_filter_by_updated_after(self):
+        threshold = Conversation.objects.get(id=self.conversations[2].id).updated_at
+        response = self.client.get(self.url, {"updated_after": threshold.isoformat()})
+        self.assertEqual(
+            [str(item["id"]) for item in response.data["results"]],
+            [str(self.conversations[4].id), str(self.conversations[3].id)],
+        )
+
+    def test_page_size_is_bounded(self):
+        response = self.client.get(self.url, {"page_size": 10_000})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("page_size", response.data)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("error", response.data)
+
+    def test_cursor_from_another_ordering_is_rejected(self):
+        first = self.client.get(self.url, {"page_size": 2})
+        cursor = parse_qs(urlparse(first.data["next"]).query)["cursor"][0]
+
+        response = self.client.get(
+            self.url, {"cursor": cursor, "ordering": "last_message_at"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"error": "Invalid cursor"})
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.url = reverse("export")
+        self.base = timezone.now().replace(microsecond=0)
+        self.open = Conversation.objects.create(
+            id=uuid4(), status=ConversationStatus.OPEN.value
+        )
+        self.closed = Conversation.objects.create(
+            id=uuid4(), status=ConversationStatus.CLOSED.value
+        )
+        self.messages = []
+        for index, conversation in enumerate(
+            [self.open, self.closed, self.open, self.closed, self.open]
+        ):
+            self.messages.append(
+                Message.objects.create(
+                    id=uuid4(),
+                    conversation=conversation,
+                    type=MessageType.INBOUND.value,
+                    content=f"Mensagem, {index}\nfim",
+                    timestamp=self.base + timedelta(seconds=index),
+                )
+            )
+
+    def _lines(self, response):
+        return b"".join(response.streaming_content).decode().splitlines()
+
+    def test_messages_ndjson_streams_every_row_in_order(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertIn('filename="messages.ndjson"', response["Content-Disposition"])
+        rows = [json.loads(line) for line in self._lines(response)]
+        self.assertEqual(
+            [row["id"] for row in rows], [str(m.id) for m in self.messages]
+        )
+        self.assertEqual(rows[0]["conversation_id"], str(self.open.id))
+        self.assertEqual(rows[0]["content"], "Mensagem, 0\nfim")
+        self.assertEqual(
+            datetime.fromisoformat(rows[1]["timestamp"]),
+            self.base + timedelta(seconds=1),
+        )
+
+    def test_conversations_csv_has_header_and_quoted_rows(self):
+        response = self.client.get(
+            self.url, {"resource": "conversations", "format": "csv"}
+        )
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(
+            csv.reader(io.StringIO(b"".join(response.streaming_content).decode()))
+        )
+        self.assertEqual(rows[0], CONVERSATION_COLUMNS)
+        self.assertEqual(
+            sorted(row[0] for row in rows[1:]),
+            sorted([str(self.open.id), str(self.closed.id)]),
+        )
+
+    def test_messages_csv_keeps_multiline_content(self):
+        response = self.client.get(self.url, {"format": "csv"})
+
+        rows = list(
+            csv.reader(io.StringIO(b"".join(response.streaming_content).decode()))
+        )
+        self.assertEqual(rows[0], MESSAGE_COLUMNS)
+        self.assertEqual(rows[1][3], "Mensagem, 0\nfim")
+        self.assertEqual(len(rows), 6)
+
+    def test_filters_by_conversation_status_and_time_range(self):
+        response = self.client.get(
+            self.url,
+            {
+                "status": ConversationStatus.OPEN.value,
+                "since": (self.base + timedelta(seconds=1)).isoformat(),
+                "until": (self.base + timedelta(seconds=4)).isoformat(),
+            },
+        )
+
+        rows = [json.loads(line) for line in self._lines(response)]
+        self.assertEqual([row["id"] for row in rows], [str(self.messages[2].id)])
+
+    def test_invalid_parameters(self):
+        response = self.client.get(self.url, {"format": "xml", "status": "DONE"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.json()), {"format", "status"})
+
+    def test_rows_are_read_and_encoded_in_chunks(self):
+        columns, queryset = export_queryset("messages")
+
+        chunks = list(stream_export(columns, queryset, "ndjson", chunk_size=2))
+
+        self.assertEqual([chunk.count(b"\n") for chunk in chunks], [2, 2, 1])
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_command_writes_export_file(self):
+        path = f"/tmp/export-{uuid4()}.csv"
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+
+        call_command(
+            "export_conversations",
+            "--format=csv",
+            f"--status={ConversationStatus.CLOSED.value}",
+            f"--output={path}",
+            stderr=io.StringIO(),
+        )
+
+        with open(path, newline="") as export_file:
+            rows = list(csv.reader(export_file))
+        self.assertEqual(
+            [row[0] for row in rows[1:]],
+            [str(self.messages[1].id), str(self.messages[3].id)],
+        )
+
+
+class ReplayEventsTests(APITestCase):
+    def setUp(self):
+        self.base = datetime(2025, 6, 4, 14, 0, tzinfo=dt_timezone.utc)
+        self.path = f"/tmp/replay-{uuid4()}.ndjson"
+        self.addCleanup(lambda: os.path.exists(self.path) and os.remove(self.path))
+        status_cache.clear()
+
+    def _event(self, event_type, seconds, **data):
+        return {
+            "type": event_type,
+            "timestamp": (self.base + timedelta(seconds=seconds)).isoformat(),
+            "data": {key: str(value) for key, value in data.items()},
+        }
+
+    def _replay(self, events, **kwargs):
+        return replay_events(
+            [(f"line {index}", event) for index, event in enumerate(events)],
+            **kwargs,
+        )
+
+    def test_loads_conversations_with_event_dates_and_activity(self):
+        conversation_id, first, second = uuid4(), uuid4(), uuid4()
+        events = [
+            self._event("NEW_CONVERSATION", 0, id=conversation_id),
+            self._event(
+                "NEW_MESSAGE",
+                1,
+                id=first,
+                conversation_id=conversation_id,
+                content="Oi",
+            ),
+            self._event(
+                "NEW_MESSAGE",
+                2,
+                id=second,
+                conversation_id=conversation_id,
+                content="Tudo bem?",
+            ),
+            self._event(
+                "NEW_MESSAGE",
+                3,
+                id=second,
+                conversation_id=conversation_id,
+                content="Tudo bem?",
+            ),
+            self._event("CLOSE_CONVERSATION", 4, id=conversation_id),
+            self._event(
+                "NEW_MESSAGE",
+                5,
+                id=uuid4(),
+                conversation_id=conversation_id,
+                content="Tarde",
+            ),
+            {"type": "NEW_MESSAGE", "data": {}},
+        ]
+
+        counts = self._replay(events, publish=False)
+
+        self.assertEqual(
+            {
+                key: counts[key]
+                for key in (
+                    "events",
+                    "conversations",
+                    "closed",
+                    "messages",
+                    "duplicates",
+                    "rejected",
+                    "invalid",
+                )
+            },
+            {
+                "events": 7,
+                "conversations": 1,
+                "closed": 1,
+                "messages": 2,
+                "duplicates": 1,
+                "rejected": 1,
+                "invalid": 1,
+            },
+        )
+        conversation = Conversation.objects.get(id=conversation_id)
+        self.assertEqual(conversation.status, ConversationStatus.CLOSED.value)
+        self.assertEqual(conversation.created_at, self.base)
+        self.assertEqual(conversation.updated_at, self.base + timedelta(seconds=4))
+        self.assertEqual(conversation.message_count, 2)
+        self.assertEqual(conversation.last_message_at, self.base + timedelta(seconds=2))
+        self.assertEqual(conversation.last_inbound_at, self.base + timedelta(seconds=2))
+        self.assertIsNone(conversation.last_outbound_at)
+        self.assertEqual(
+            set(Message.objects.values_list("id", flat=True)), {first, second}
+        )
+        self.assertEqual(
+            Change.objects.filter(kind=ChangeKind.MESSAGE.value).count(), 2
+        )
+        self.assertEqual(
+            status_cache.get(conversation_id), ConversationStatus.CLOSED.value
+        )
+
+    def test_existing_conversations_go_through_regular_updates(self):
+        conversation = Conversation.objects.create(
+            id=uuid4(), status=ConversationStatus.OPEN.value
+        )
+        message_id = uuid4()
+
+        counts = self._replay(
+            [
+                self._event(
+                    "NEW_MESSAGE",
+                    1,
+                    id=message_id,
+                    conversation_id=conversation.id,
+                    content="Oi",
+                ),
+                self._event("CLOSE_CONVERSATION", 2, id=conversation.id),
+                self._event("NEW_CONVERSATION", 3, id=conversation.id),
+            ],
+            publish=False,
+        )
+
+        self.assertEqual(
+            (counts["messages"], counts["closed"], counts["rejected"]), (1, 1, 1)
+        )
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.status, ConversationStatus.CLOSED.value)
+        self.assertEqual(conversation.updated_at, self.base + timedelta(seconds=2))
+        self.assertEqual(conversation.message_count, 1)
+        self.assertEqual(conversation.version, 2)
+
+    def test_activity_counts_only_messages_actually_inserted(self):
+        other = Conversation.objects.create(
+            id=uuid4(), status=ConversationStatus.OPEN.value
+        )
+        stored = Message.objects.create(
+            id=uuid4(),
+            conversation=other,
+            type=MessageType.INBOUND.value,
+            content="Oi",
+            timestamp=self.base + timedelta(seconds=5),
+        )
+        conversation_id, fresh = uuid4(), uuid4()
+
+        counts = self._replay(
+            [
+                self._event("NEW_CONVERSATION", 0, id=conversation_id),
+                self._event(
+                    "NEW_MESSAGE",
+                    1,
+                    id=fresh,
+                    conversation_id=conversation_id,
+                    content="Oi",
+                ),
+                self._event(
+                    "NEW_MESSAGE",
+                    5,
+                    id=stored.id,
+                    conversation_id=conversation_id,
+                    content="Oi",
+                ),
+            ],
+            publish=False,
+        )
+
+        self.assertEqual(counts["messages"], 1)
+        conversation = Conversation.objects.get(id=conversation_id)
+        self.assertEqual(conversation.message_count, 1)
+        self.assertEqual(conversation.last_message_at, self.base + timedelta(seconds=1))
+        self.assertEqual(conversation.last_inbound_at, self.base + timedelta(seconds=1))
+        self.assertEqual(Message.objects.get(id=stored.id).conversation_id, other.id)
+
+    @override_settings(MESSAGE_BUFFER_SECONDS=5)
+    def test_messages_wait_for_their_conversation_within_buffer(self):
+        on_time, late = uuid4(), uuid4()
+        on_time_message, late_message = uuid4(), uuid4()
+
+        counts = self._replay(
+            [
+                self._event(
+                    "NEW_MESSAGE",
+                    0,
+                    id=on_time_message,
+                    conversation_id=on_time,
+                    content="Oi",
+                ),
+                self._event(
+                    "NEW_MESSAGE",
+                    0,
+                    id=late_message,
+                    conversation_id=late,
+                    content="Oi",
+                ),
+                self._event("NEW_CONVERSATION", 3, id=on_time),
+                self._event(
+                    "NEW_MESSAGE", 8, id=uuid4(), conversation_id=uuid4(), content="Oi"
+                ),
+                self._event("NEW_CONVERSATION", 9, id=late),
+            ],
+            batch_size=2,
+            publish=False,
+        )
+
+        self.assertEqual((counts["messages"], counts["rejected"]), (1, 2))
+        self.assertEqual(
+            list(Message.objects.values_list("id", flat=True)), [on_time_message]
+        )
+        self.assertEqual(Conversation.objects.get(id=late).message_count, 0)
+
+    def test_queries_per_batch_do_not_grow_with_its_size(self):
+        def events(size):
+            result = []
+            for second in range(size):
+                conversation_id = uuid4()
+                result += [
+                    self._event("NEW_CONVERSATION", second, id=conversation_id),
+                    self._event(
+                        "NEW_MESSAGE",
+                        second,
+                        id=uuid4(),
+                        conversation_id=conversation_id,
+                        content="Oi",
+                    ),
+                ]
+            return result
+
+        with CaptureQueriesContext(connection) as small:
+            self._replay(events(2), publish=False)
+        with CaptureQueriesContext(connection) as large:
+            self._replay(events(50), publish=False)
+
+        self.assertEqual(len(large), len(small))
+
+    @mock.patch.object(process_inbound_messages, "delay")
+    def test_publishes_inbound_processing_unless_skipped(self, delay):
+        conversation_id, message_id = uuid4(), uuid4()
+        events = [
+            self._event("NEW_CONVERSATION", 0, id=conversation_id),
+            self._event(
+                "NEW_MESSAGE",
+                1,
+                id=message_id,
+                conversation_id=conversation_id,
+                content="Oi",
+            ),
+        ]
+
+        self._replay(events[:1], publish=False)
+        self._replay(events[1:])
+
+        delay.assert_called_once_with([str(message_id)])
+
+    @mock.patch.object(process_inbound_messages, "delay")
+    def test_command_reports_rows_per_second(self, delay):
+        conversation_id = uuid4()
+        with open(self.path, "w") as events_file:
+            events_file.write(
+                json.dumps(self._event("NEW_CONVERSATION", 0, id=conversation_id))
+                + "\n\n"
+            )
+            events_file.write("not json\n")
+            events_file.write(
+                json.dumps(
+                    self._event(
+                        "NEW_MESSAGE",
+                        1,
+                        id=uuid4(),
+                        conversation_id=conversation_id,
+                        content="Oi",
+                    )
+                )
+                + "\n"
+            )
+        output = io.StringIO()
+
+        call_command("replay_events", self.path, "--skip-outbound", stdout=output)
+
+        self.assertIn("3 eventos", output.getvalue())
+        self.assertIn("1 inválidas", output.getvalue())
+        self.assertIn("2 linhas gravadas", output.getvalue())
+        self.assertEqual(Message.objects.count(), 1)
+        delay.assert_not_called()
+
+
+class ConversationQueryCountTests(APITestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.conversations = []
+        for _ in range(4):
+            conv = Conversation.objects.create(
+                id=uuid4(), status=ConversationStatus.OPEN.value
+            )
+            for offset in (2, 0, 1):
+                Message.objects.create(
+                    id=uuid4(),
+                    conversation=conv,
+                    type=MessageType.INBOUND.value,
+                    content=f"mensagem {offset}",
+                    timestamp=now + timedelta(seconds=offset),
+                )
+            self.conversations.append(conv)
+
+    def test_list_loads_messages_in_constant_queries(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("conversation_list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for item in response.data["results"]:
+            timestamps = [m["timestamp"] for m in item["messages"]]
+            self.assertEqual(len(timestamps), 3)
+            self.assertEqual(timestamps, sorted(timestamps))
+
+    def test_detail_loads_messages_ordered_by_timestamp(self):
+        conv = self.conversations[0]
+        url = reverse("conversation_detail", kwargs={"id": conv.id})
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        contents = [m["content"] for m in response.json()["messages"]]
+        self.assertEqual(contents, ["mensagem 0", "mensagem 1", "mensagem 2"])
+
+    def test_sparse_fields_skip_message_rows(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("conversation_list"), {"fields": "id,status"}
+            )
+        self.assertEqual(set(response.data["results"][0]), {"id", "status"})
+
+        url = reverse("conversation_detail", kwargs={"id": self.conversations[0].id})
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"fields": "status"})
+        self.assertEqual(response.json(), {"status": ConversationStatus.OPEN.value})
+
+    def test_include_messages_with_sparse_fields(self):
+        url = reverse("conversation_detail", kwargs={"id": self.conversations[0].id})
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {"fields": "id", "include": "messages"})
+        self.assertEqual(set(response.json()), {"id", "messages"})
+        self.assertEqual(len(response.json()["messages"]), 3)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse("conversation_list"), {"fields": "foo"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("fields", response.data)
+
+        response = self.client.get(reverse("conversation_list"), {"include": "bar"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("include", response.data)
+
+
+@mock.patch.object(process_inbound_message, "delay")
+class WebhookIdempotencyTests(APITestCase):
+    def setUp(self):
+        self.conversation = Conversation.objects.create(
+            id=uuid4(), status=ConversationStatus.OPEN.value
+        )
+        status_cache.set(self.conversation.id, self.conversation.status)
+        self.message_id = str(uuid4())
+
+    def _post_message(self, url=None):
+        payload = {
+            "type": WebhookEventType.NEW_MESSAGE.value,
+            "timestamp": timezone.now().isoformat(),
+            "data": {
+                "id": self.message_id,
+                "conversation_id": str(self.conversation.id),
+                "content": "Mensagem",
+            },
+        }
+        return self.client.post(url or reverse("webhook"), data=payload, format="json")
+
+    def _duplicates(self):
+        return (
+            REGISTRY.get_sample_value(
+                "webhook_duplicate_events_total",
+                {"event_type": WebhookEventType.NEW_MESSAGE.value},
+            )
+            or 0.0
+        )
+
+    def test_retry_is_acknowledged_without_queries(self, delay):
+        self.assertEqual(self._post_message().status_code, status.HTTP_202_ACCEPTED)
+        duplicates = self._duplicates()
+
+        with self.assertNumQueries(0):
+            response = self._post_message()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"message": "Message already processed"})
+        self.assertEqual(self._duplicates(), duplicates + 1)
+        delay.assert_called_once()
+
+    def test_retry_missing_from_cache_falls_back_to_primary_key(self, delay):
+        self._post_message()
+        cache.clear()
+        seen_messages.clear()
+
+        response = self._post_message()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Message.objects.filter(id=self.message_id).count(), 1)
+        delay.assert_called_once()
+
+    def test_rejected_message_is_not_marked_as_processed(self, delay):
+        status_cache.set(self.conversation.id, ConversationStatus.CLOSED.value)
+        self.assertEqual(self._post_message().status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._post_message().status_code, status.HTTP_400_BAD_REQUEST)
+
+    @mock.patch.object(process_inbound_messages, "apply_async")
+    def test_buffered_message_is_not_marked_as_processed(self, apply_async, delay):
+        seen_messages.clear()
+        cache.clear()
+        self.conversation = Conversation(id=uuid4())
+        for url in (reverse("webhook"), reverse("webhook_async")):
+            for _ in range(2):
+                response = self._post_message(url)
+                self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+                self.assertEqual(
+                    json.loads(response.content), {"message": "Message buffered"}
+                )
+        self.assertFalse(seen_messages.seen(self.message_id))
+        self.assertEqual(PendingMessage.objects.count(), 1)
+
+        # O lote também só marca o que virou Message.
+        self.client.post(
+            reverse("webhook"),
+            data=[
+                {
+                    "type": WebhookEventType.NEW_MESSAGE.value,
+                    "timestamp": timezone.now().isoformat(),
+                    "data": {
+                        "id": str(uuid4()),
+                        "conversation_id": str(self.conversation.id),
+                        "content": "Mensagem",
+                    },
+                }
+            ],
+            format="json",
+        )
+        self.assertFalse(
+            seen_messages.seen_many(PendingMessage.objects.values_list("id", flat=True))
+        )
+
+    def test_async_retry_is_acknowledged(self, delay):
+        with mock.patch.object(process_inbound_message, "apply_async"):
+            first = self._post_message(reverse("webhook_async"))
+            retry = self._post_message(reverse("webhook_async"))
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            json.loads(retry.content), {"message": "Message already processed"}
+        )
+
+
+@mock.patch.object(process_inbound_message, "delay")
+class ConversationDetailETagTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        status_cache.clear()
+        self.conversation = Conversation.objects.create(
+            id=uuid4(), status=ConversationStatus.OPEN.value
+        )
+        self.url = reverse("conversation_detail", kwargs={"id": self.conversation.id})
+
+    def _post(self, event_type, data):
+        payload = {
+            "type": event_type,
+            "timestamp": timezone.now().isoformat(),
+            "data": data,
+        }
+        return self.client.post(reverse("webhook"), data=payload, format="json")
+
+    def _new_message(self):
+        return self._post(
+            WebhookEventType.NEW_MESSAGE.value,
+            {
+                "id": str(uuid4()),
+                "conversation_id": str(self.conversation.id),
+                "content": "Mensagem",
+            },
+        )
+
+    def test_unchanged_conversation_is_served_without_queries(self, delay):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertIn("ETag", first.headers)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(cached.headers["ETag"], first.headers["ETag"])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                self.url, HTTP_IF_NONE_MATCH=first.headers["ETag"]
+            )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+
+    def test_matching_etag_on_cold_cache_skips_rendering(self, delay):
+        etag = self.client.get(self.url).headers["ETag"]
+        render_cache.invalidate([self.conversation.id])
+
+        # Só a versão da conversa, sem carregar as mensagens.
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.headers["ETag"], etag)
+
+        render_cache.invalidate([self.conversation.id])
+        response = self.client.get(
+            reverse("conversation_detail_async", kwargs={"id": self.conversation.id}),
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_new_message_changes_etag(self, delay):
+        etag = self.client.get(self.url).headers["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self._new_message()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(len(response.json()["messages"]), 1)
+
+    def test_close_changes_etag(self, delay):
+        etag = self.client.get(self.url).headers["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self._post(
+                WebhookEventType.CLOSE_CONVERSATION.value,
+                {"id": str(self.conversation.id)},
+            )
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["status"], ConversationStatus.CLOSED.value)
+
+    def test_outbound_message_bumps_version(self, delay):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_outbound_message_task(str(self.conversation.id), [])
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.version, 1)
+        self.assertIsNone(render_cache.lookup(self.conversation.id, None)[1])
+
+    def test_invalidate_between_lookup_and_store_discards_stale_render(self, delay):
+        # Leitor com cache vazio: obtém a geração e lê o banco...
+        generation, rendered = render_cache.lookup(self.conversation.id, None)
+        self.assertIsNone(rendered)
+        stale = render_conversation(self.conversation.id, None)
+        # ... um CLOSE_CONVERSATION comita e invalida antes do leitor gravar.
+        with self.captureOnCommitCallbacks(execute=True):
+            self._post(
+                WebhookEventType.CLOSE_CONVERSATION.value,
+                {"id": str(self.conversation.id)},
+            )
+        render_cache.store(self.conversation.id, generation, None, stale)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()["status"], ConversationStatus.CLOSED.value)
+        self.assertNotEqual(response.headers["ETag"], render_cache.etag(stale[0], None))
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+        self.assertEqual(cached.content, response.content)
+
+    def test_sparse_fields_have_their_own_etag(self, delay):
+        full = self.client.get(self.url)
+        sparse = self.client.get(self.url, {"fields": "status"})
+        self.assertNotEqual(full.headers["ETag"], sparse.headers["ETag"])
+        self.assertEqual(sparse.json(), {"status": ConversationStatus.OPEN.value})
+
+
+class FastRenderTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        now = timezone.now().replace(microsecond=0)
+        self.conversations = []
+        for index in range(3):
+            conv = Conversation.objects.create(
+                id=uuid4(), status=ConversationStatus.OPEN.value
+            )
+            for offset, content in enumerate(["olá ção", "linha\u2028sep", 'a"b\n']):
+                Message.objects.create(
+                    id=uuid4(),
+                    conversation=conv,
+                    type=MessageType.INBOUND.value,
+                    content=content,
+                    timestamp=now + timedelta(seconds=offset, microseconds=index),
+                )
+            self.conversations.append(conv)
+
+    def _get_both(self, url, params=None):
+        responses = []
+        for fast in (False, True):
+            cache.clear()
+            with override_settings(CONVERSATION_FAST_RENDER=fast):
+                responses.append(self.client.get(url, params or {}))
+        return responses
+
+    def test_detail_matches_drf_byte_for_byte(self):
+        url = reverse("conversation_detail", kwargs={"id": self.conversations[0].id})
+        for params in ({}, {"fields": "status,updated_at"}, {"include": "messages"}):
+            drf, fast = self._get_both(url, params)
+            self.assertEqual(fast.status_code, status.HTTP_200_OK)
+            self.assertEqual(fast.content, drf.content)
+            self.assertEqual(fast.headers["ETag"], drf.headers["ETag"])
+
+    def test_detail_matches_drf_in_other_timezone(self):
+        url = reverse("conversation_detail", kwargs={"id": self.conversations[0].id})
+        with timezone.override("America/Sao_Paulo"):
+            drf, fast = self._get_both(url)
+        self.assertIn(b"-03:00", fast.content)
+        self.assertEqual(fast.content, drf.content)
+
+    def test_list_matches_drf_byte_for_byte(self):
+        url = reverse("conversation_list")
+        drf, fast = self._get_both(url, {"page_size": 2})
+        self.assertEqual(fast.content, drf.content)
+
+        cursor_url = fast.json()["next"]
+        drf, fast = self._get_both(cursor_url)
+        self.assertEqual(fast.content, drf.content)
+        self.assertEqual(len(fast.json()["results"]), 1)
+
+    @override_settings(CONVERSATION_FAST_RENDER=True)
+    def test_async_views_use_fast_path(self):
+        detail = reverse("conversation_detail", kwargs={"id": self.conversations[0].id})
+        detail_async = reverse(
+            "conversation_detail_async", kwargs={"id": self.conversations[0].id}
+        )
+        self.assertEqual(
+            self.client.get(detail_async).content, self.client.get(detail).content
+        )
+        self.assertEqual(
+            self.client.get(reverse("conversation_list_async")).content,
+            self.client.get(reverse("conversation_list")).content,
+        )
+
+    @override_settings(CONVERSATION_FAST_RENDER=True)
+    def test_fast_path_queries(self):
+        url = reverse("conversation_detail", kwargs={"id": self.conversations[0].id})
+        with self.assertNumQueries(2):
+            self.client.get(url)
+        with self.assertNumQueries(1):
+            self.client.get(reverse("conversation_list"), {"fields": "id"})
+        missing = reverse("conversation_detail", kwargs={"id": uuid4()})
+        self.assertEqual(
+            self.client.get(missing).status_code, status.HTTP_404_NOT_FOUND
+        )
+
+    @override_settings(RESPONSE_COMPRESSION=True, RESPONSE_COMPRESSION_MIN_BYTES=0)
+    def test_response_compression(self):
+        url = reverse("conversation_detail", kwargs={"id": self.conversations[0].id})
+        plain = self.client.get(url)
+        self.assertNotIn("Content-Encoding", plain.headers)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(response.headers["ETag"], f"W/{plain.headers['ETag']}")
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(response.headers["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response.headers["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class CeleryRoutingTests(SimpleTestCase):
+    def _queue(self, task):
+        return celery_app.amqp.router.route({}, task.name)["queue"].name
+
+    def test_tasks_are_routed_per_stage(self):
+        self.assertEqual(self._queue(process_inbound_message), "ingestion")
+        self.assertEqual(self._queue(process_inbound_messages), "ingestion")
+        self.assertEqual(self._queue(flush_due_conversations), "debounce")
+        self.assertEqual(self._queue(purge_expired_pending_messages), "debounce")
+        self.assertEqual(self._queue(maintain_message_partitions), "debounce")
+        self.assertEqual(self._queue(purge_expired_changes), "debounce")
+        self.assertEqual(self._queue(generate_outbound_message_task), "outbound")
+        self.assertEqual(self._queue(generate_outbound_messages_task), "outbound")
+
+    def test_results_are_ignored(self):
+        self.assertTrue(celery_app.conf.task_ignore_result)
+        self.assertTrue(generate_outbound_message_task.ignore_result)
+
+    def test_worker_profile_is_applied_for_single_queue(self):
+        conf = {"worker_profiles": settings.CELERY_WORKER_PROFILES}
+        conf = mock.MagicMock(get=conf.get)
+        apply_worker_profile(conf=conf, options={"queues": ["outbound"]})
+        profile = settings.CELERY_WORKER_PROFILES["outbound"]
+        self.assertEqual(conf.worker_concurrency, profile["concurrency"])
+        self.assertEqual(
+            conf.worker_prefetch_multiplier, profile["prefetch_multiplier"]
+        )
+
+        untouched = mock.MagicMock(get=conf.get)
+        apply_worker_profile(
+            conf=untouched, options={"queues": ["ingestion", "outbound"]}
+        )
+        self.assertIsInstance(untouched.worker_concurrency, mock.MagicMock)
+
+
+@override_settings(TASK_OUTBOX=True)
+@mock.patch.object(process_inbound_messages, "delay")
+@mock.patch.object(process_inbound_message, "delay")
+class TaskOutboxTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        status_cache.clear()
+        seen_messages.clear()
+        self.url = reverse("webhook")
+        self.conversation_id = str(uuid4())
+
+    def _event(self, event_type, **data):
+        return {
+            "type": event_type,
+            "timestamp": timezone.now().isoformat(),
+            "data": data,
+        }
+
+    def _message(self, message_id, conversation_id=None):
+        return self._event(
+            WebhookEventType.NEW_MESSAGE.value,
+            id=message_id,
+            conversation_id=conversation_id or self.conversation_id,
+            content="Oi",
+        )
+
+    def _outbox(self):
+        return list(OutboxTask.objects.order_by("id").values_list("task", "args"))
+
+    def test_message_and_task_are_written_together(self, delay, batch_delay):
+        self.client.post(
+            self.url,
+            self._event(
+                WebhookEventType.NEW_CONVERSATION.value, id=self.conversation_id
+            ),
+            format="json",
+        )
+        message_id = str(uuid4())
+
+        response = self.client.post(self.url, self._message(message_id), format="json")
+        retry = self.client.post(self.url, self._message(message_id), format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        delay.assert_not_called()
+        self.assertEqual(self._outbox(), [(process_inbound_message.name, [message_id])])
+
+    def test_drained_and_batched_messages_go_to_outbox(self, delay, batch_delay):
+        early = str(uuid4())
+        self.client.post(self.url, self._message(early), format="json")
+        self.client.post(
+            self.url,
+            self._event(
+                WebhookEventType.NEW_CONVERSATION.value, id=self.conversation_id
+            ),
+            format="json",
+        )
+        batched = [str(uuid4()), str(uuid4())]
+        self.client.post(
+            self.url,
+            [self._message(message_id) for message_id in batched],
+            format="json",
+        )
+
+        batch_delay.assert_not_called()
+        self.assertEqual(
+            self._outbox(),
+            [
+                (process_inbound_messages.name, [[early]]),
+                (process_inbound_messages.name, [batched]),
+            ],
+        )
+
+    def test_relay_publishes_in_order_and_deletes(self, delay, batch_delay):
+        first, second = str(uuid4()), str(uuid4())
+        OutboxTask.objects.create(task=process_inbound_message.name, args=[first])
+        OutboxTask.objects.create(task=process_inbound_messages.name, args=[[second]])
+
+        with mock.patch.object(celery_app, "send_task") as send_task:
+            self.assertEqual(relay_batch(), 2)
+
+        self.assertEqual(
+            [(c.args[0], c.kwargs["args"]) for c in send_task.call_args_list],
+            [
+                (process_inbound_message.name, [first]),
+                (process_inbound_messages.name, [[second]]),
+            ],
+        )
+        self.assertFalse(OutboxTask.objects.exists())
+        self.assertEqual(relay_batch(), 0)
+
+    def test_failed_publish_keeps_rows(self, delay, batch_delay):
+        OutboxTask.objects.create(
+            task=process_inbound_message.name, args=[str(uuid4())]
+        )
+
+        with mock.patch.object(celery_app, "send_task", side_effect=OSError("broker")):
+            with self.assertRaises(OSError):
+                relay_batch()
+
+        self.assertEqual(OutboxTask.objects.count(), 1)
+
+    def test_relay_publishes_batch_with_a_single_producer(self, delay, batch_delay):
+        for _ in range(3):
+            OutboxTask.objects.create(
+                task=process_inbound_message.name, args=[str(uuid4())]
+            )
+
+        with mock.patch.object(celery_app, "send_task") as send_task:
+            with mock.patch.object(
+                celery_app, "producer_or_acquire", wraps=celery_app.producer_or_acquire
+            ) as acquire:
+                self.assertEqual(relay_batch(), 3)
+
+        acquire.assert_called_once_with()
+        producers = {c.kwargs["producer"] for c in send_task.call_args_list}
+        self.assertEqual(len(producers), 1)
+
+    def test_pipelined_message_matches_kombu_publish(self, delay, batch_delay):
+        name = process_inbound_messages.name
+        args = [[str(uuid4())]]
+        queue = celery_app.amqp.router.route({}, name)["queue"].name
+        pipeline = mock.Mock()
+        with celery_app.producer_or_acquire() as producer:
+            batch = PipelinedProducer(producer, pipeline)
+            celery_app.send_task(name, args=args, producer=batch)
+            celery_app.send_task(name, args=args, producer=producer)
+            published = producer.channel.basic_get(queue, no_ack=True)
+            key, raw = pipeline.lpush.call_args.args
+            pipelined = producer.channel.message_to_python(json.loads(raw))
+
+        # Mesmo envelope que o kombu grava na lista da fila, a menos dos ids.
+        self.assertEqual(key, queue)
+        self.assertEqual(pipelined.decode(), published.decode())
+        self.assertEqual(pipelined.content_type, published.content_type)
+        self.assertEqual(pipelined.delivery_info, published.delivery_info)
+        volatile = {"id", "root_id", "published_at"}
+        self.assertEqual(
+            {k: v for k, v in pipelined.headers.items() if k not in volatile},
+            {k: v for k, v in published.headers.items() if k not in volatile},
+        )
+        volatile = {"correlation_id", "delivery_tag"}
+        self.assertEqual(
+            {k: v for k, v in pipelined.properties.items() if k not in volatile},
+            {k: v for k, v in published.properties.items() if k not in volatile},
+        )
+
+    def test_redis_publishes_go_in_one_pipeline(self, delay, batch_delay):
+        producer = mock.Mock()
+        producer.channel = mock.Mock(spec=redis_transport.Channel)
+        pipeline = producer.channel.client.pipeline.return_value
+
+        with _batch_producer(producer) as batch:
+            self.assertIsInstance(batch, PipelinedProducer)
+            pipeline.execute.assert_not_called()
+
+        pipeline.execute.assert_called_once_with()
+        producer.channel.client.pipeline.assert_called_once_with(transaction=False)
+
+
+class ServerProfileTests(SimpleTestCase):
+    def _gunicorn_conf(self, **env):
+        with mock.patch.dict(os.environ, env):
+            import realmate_challenge.gunicorn_conf as gunicorn_conf
+
+            return importlib.reload(gunicorn_conf)
+
+    def test_worker_class_selects_server_and_application(self):
+        conf = self._gunicorn_conf(GUNICORN_WORKER_CLASS="sync")
+        self.assertEqual(conf.worker_class, "sync")
+        self.assertEqual(conf.wsgi_app, "realmate_challenge.wsgi:application")
+        self.assertEqual(conf.threads, 1)
+        self.assertTrue(conf.preload_app)
+        self.assertGreater(conf.max_requests, 0)
+
+        conf = self._gunicorn_conf(GUNICORN_WORKER_CLASS="gthread")
+        self.assertEqual(conf.worker_class, "gthread")
+        self.assertGreater(conf.threads, 1)
+
+        conf = self._gunicorn_conf(GUNICORN_WORKER_CLASS="asgi")
+        self.assertEqual(conf.worker_class, "uvicorn_worker.UvicornWorker")
+        self.assertEqual(conf.wsgi_app, "realmate_challenge.asgi:application")
+
+        with self.assertRaises(ValueError):
+            self._gunicorn_conf(GUNICORN_WORKER_CLASS="eventlet")
+
+    def test_connections_are_reused(self):
+        database = settings.DATABASES["default"]
+        self.assertGreater(database["CONN_MAX_AGE"], 0)
+        self.assertTrue(database["CONN_HEALTH_CHECKS"])
+        self.assertEqual(
+            celery_app.conf.broker_pool_limit, settings.CELERY_BROKER_POOL_LIMIT
+        )
+        self.assertTrue(celery_app.conf.broker_transport_options["socket_keepalive"])
+
+    def test_post_fork_drops_inherited_connections(self):
+        conf = self._gunicorn_conf()
+        server = mock.Mock()
+        server.cfg.preload_app = True
+        with celery_app.pool.acquire(block=True) as inherited:
+            inherited.ensure_connection()
+
+        with mock.patch("django.db.connections.close_all") as close_all:
+            conf.post_fork(server, mock.Mock())
+
+        close_all.assert_called_once_with()
+        self.assertFalse(inherited.connected)
+        # O pool continua utilizável no worker.
+        with celery_app.pool.acquire(block=True) as broker:
+            broker.ensure_connection(max_retries=1)
+            self.assertTrue(broker.connected)
+
+
+class MessagePartitionTests(SimpleTestCase):
+    def test_monthly_periods_cover_range(self):
+        self.assertEqual(
+            periods(date(2026, 11, 15), date(2027, 1, 1), "month"),
+            [
+                (date(2026, 11, 1), date(2026, 12, 1)),
+                (date(2026, 12, 1), date(2027, 1, 1)),
+                (date(2027, 1, 1), date(2027, 2, 1)),
+            ],
+        )
+        self.assertEqual(
+            partition_name(date(2026, 11, 1)), "conversations_message_p20261101"
+        )
+
+    def test_weekly_and_daily_periods(self):
+        # 2026-10-17 é um sábado: a semana começa na segunda, dia 12.
+        self.assertEqual(
+            periods(date(2026, 10, 17), date(2026, 10, 17), "week"),
+            [(date(2026, 10, 12), date(2026, 10, 19))],
+        )
+        self.assertEqual(
+            periods(date(2026, 10, 17), date(2026, 10, 18), "day"),
+            [
+                (date(2026, 10, 17), date(2026, 10, 18)),
+                (date(2026, 10, 18), date(2026, 10, 19)),
+            ],
+        )
+        with self.assertRaises(ValueError):
+            periods(date(2026, 10, 17), date(2026, 10, 18), "year")
+
+    def test_only_partitions_entirely_older_than_cutoff_expire(self):
+        def utc(*args):
+            return datetime(*args, tzinfo=dt_timezone.utc)
+
+        partitions = {
+            "conversations_message_p20260801": utc(2026, 9, 1),
+            "conversations_message_p20260901": utc(2026, 10, 1),
+            "conversations_message_p20261001": utc(2026, 11, 1),
+            "conversations_message_default": None,
+        }
+        self.assertEqual(
+            expired_partitions(partitions, utc(2026, 10, 1)),
+            ["conversations_message_p20260801", "conversations_message_p20260901"],
+        )
+
+    def test_maintenance_is_noop_without_postgres(self):
+        self.assertEqual(ensure_message_partitions(), [])
+        self.assertEqual(drop_expired_message_partitions(retention_days=30), [])
+
+
+class MetricsTests(APITestCase):
+    def _sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0.0
+
+    def test_webhook_stages_and_events_are_exported(self):
+        labels = {"event_type": WebhookEventType.NEW_CONVERSATION.value}
+        events = self._sample("webhook_events_total", status="201", **labels)
+        validations = self._sample(
+            "webhook_stage_seconds_count", stage="validate", **labels
+        )
+
+        self.client.post(
+            reverse("webhook"),
+            data={
+                "type": WebhookEventType.NEW_CONVERSATION.value,
+                "timestamp": timezone.now().isoformat(),
+                "data": {"id": str(uuid4())},
+            },
+            format="json",
+        )
+        self.client.post(reverse("webhook"), data={"type": "FOO"}, format="json")
+
+        self.assertEqual(
+            self._sample("webhook_events_total", status="201", **labels), events + 1
+        )
+        self.assertEqual(
+            self._sample("webhook_stage_seconds_count", stage="validate", **labels),
+            validations + 1,
+        )
+        self.assertGreater(
+            self._sample("webhook_events_total", event_type="unknown", status="400"), 0
+        )
+
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(b"webhook_stage_seconds_bucket", response.content)
+
+    def test_task_runtime_and_queue_wait(self):
+        task = purge_expired_pending_messages.name
+        runs = self._sample("celery_task_runtime_seconds_count", task=task)
+        successes = self._sample("celery_tasks_total", task=task, state="SUCCESS")
+
+        purge_expired_pending_messages.apply()
+
+        self.assertEqual(
+            self._sample("celery_task_runtime_seconds_count", task=task), runs + 1
+        )
+        self.assertEqual(
+            self._sample("celery_tasks_total", task=task, state="SUCCESS"),
+            successes + 1,
+        )
+
+        waits = self._sample("celery_task_queue_wait_seconds_count", task=task)
+        published = mock.Mock(request=mock.Mock(published_at=time.time() - 2))
+        published.name = task
+        task_started(task_id="published", task=published)
+        self.assertEqual(
+            self._sample("celery_task_queue_wait_seconds_count", task=task), waits + 1
+        )
+
+
+@mock.patch.object(process_inbound_message, "apply_async")
+class AsyncViewTests(APITestCase):
+    def setUp(self):
+        self.conversation = Conversation.objects.create(
+            id=uuid4(), status=ConversationStatus.OPEN.value
+        )
+        Message.objects.create(
+            id=uuid4(),
+            conversation=self.conversation,
+            type=MessageType.INBOUND.value,
+            content="Olá",
+            timestamp=timezone.now(),
+        )
+
+    def _post(self, payload):
+        return self.client.post(
+            reverse("webhook_async"), data=payload, content_type="application/json"
+        )
+
+    def test_async_webhook_creates_message(self, apply_async):
+        message_id = str(uuid4())
+        response = self._post(
+            {
+                "type": WebhookEventType.NEW_MESSAGE.value,
+                "timestamp": timezone.now().isoformat(),
+                "data": {
+                    "id": message_id,
+                    "conversation_id": str(self.conversation.id),
+                    "content": "Mensagem assíncrona",
+                },
+            }
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(Message.objects.filter(id=message_id).exists())
+        apply_async.assert_called_once_with((message_id,))
+
+    @override_settings(TASK_OUTBOX=True)
+    def test_async_webhook_writes_outbox(self, apply_async):
+        message_id = str(uuid4())
+        response = self._post(
+            {
+                "type": WebhookEventType.NEW_MESSAGE.value,
+                "timestamp": timezone.now().isoformat(),
+                "data": {
+                    "id": message_id,
+                    "conversation_id": str(self.conversation.id),
+                    "content": "Mensagem assíncrona",
+                },
+            }
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        apply_async.assert_not_called()
+        self.assertEqual(
+            list(OutboxTask.objects.values_list("task", "args")),
+            [(process_inbound_message.name, [message_id])],
+        )
+
+    def test_async_webhook_rejects_duplicate_conversation(self, apply_async):
+        response = self._post(
+            {
+                "type": WebhookEventType.NEW_CONVERSATION.value,
+                "timestamp": timezone.now().isoformat(),
+                "data": {"id": str(self.conversation.id)},
+            }
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_async_webhook_close_and_invalid_payload(self, apply_async):
+        close = {
+            "type": WebhookEventType.CLOSE_CONVERSATION.value,
+            "timestamp": timezone.now().isoformat(),
+            "data": {"id": str(self.conversation.id)},
+        }
+        self.assertEqual(self._post(close).status_code, status.HTTP_200_OK)
+        self.assertEqual(self._post(close).status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self._post({"type": "NEW_MESSAGE", "timestamp": "not-a-date"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("timestamp", response.json())
+
+    def test_async_reads_match_sync_reads(self, apply_async):
+        detail_kwargs = {"id": self.conversation.id}
+        self.assertEqual(
+            self.client.get(
+                reverse("conversation_detail_async", kwargs=detail_kwargs)
+            ).content,
+            self.client.get(
+                reverse("conversation_detail", kwargs=detail_kwargs)
+            ).content,
+        )
+        self.assertEqual(
+            self.client.get(reverse("conversation_list_async")).content,
+            self.client.get(reverse("conversation_list")).content,
+        )
+
+    def test_async_detail_not_found(self, apply_async):
+        response = self.client.get(
+            reverse("conversation_detail_async", kwargs={"id": uuid4()})
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(
+    MESSAGE_STREAM_REDIS_URL="",
+    MESSAGE_STREAM_HEARTBEAT_SECONDS=0.05,
+    MESSAGE_STREAM_TIMEOUT_SECONDS=5,
+)
+class ConversationStreamTests(TestCase):
+    def setUp(self):
+        self.conversation = Conversation.objects.create(id=uuid4())
+        self.url = reverse("conversation_stream", kwargs={"id": self.conversation.id})
+        self._buffer = b""
+
+    def _inbound(self, content, timestamp=None):
+        return insert_messages(
+            [
+                Message(
+                    id=uuid4(),
+                    conversation=self.conversation,
+                    type=MessageType.INBOUND.value,
+                    content=content,
+                    timestamp=timestamp or timezone.now(),
+                )
+            ]
+        )[0]
+
+    async def _next_event(self, chunks, event):
+        """Lê o stream até o próximo evento do tipo pedido e retorna (id, data)."""
+        while True:
+            while b"\n\n" in self._buffer:
+                block, self._buffer = self._buffer.split(b"\n\n", 1)
+                fields = dict(
+                    line.split(b": ", 1) for line in block.split(b"\n") if b": " in line
+                )
+                if fields.get(b"event") == event.encode():
+                    return fields.get(b"id", b"").decode(), json.loads(fields[b"data"])
+            self._buffer += await asyncio.wait_for(anext(chunks), timeout=2)
+
+    def _event_id(self, message):
+        return str(
+            Change.objects.get(kind=ChangeKind.MESSAGE.value, object_id=message.id).id
+        )
+
+    async def test_stream_pushes_outbound_message_after_commit(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        # Fecha o gerador do stream (e a inscrição) ao fim do teste.
+        async with aclosing(response._iterator) as chunks:
+            await self._next_event(chunks, "ready")
+
+            inbound = await sync_to_async(self._inbound)("Oi")
+
+            def generate():
+                with self.captureOnCommitCallbacks(execute=True):
+                    generate_outbound_message_task(
+                        str(self.conversation.id), [str(inbound.id)]
+                    )
+
+            await sync_to_async(generate)()
+            first_id, first = await self._next_event(chunks, "message")
+            event_id, data = await self._next_event(chunks, "message")
+
+        self.assertEqual(first["id"], str(inbound.id))
+        self.assertEqual(first_id, await sync_to_async(self._event_id)(inbound))
+        self.assertEqual(data["type"], MessageType.OUTBOUND.value)
+        self.assertIn("- Oi", data["content"])
+        self.assertGreater(int(event_id), int(first_id))
+
+    async def test_stream_pushes_inbound_messages_from_task(self):
+        response = await self.async_client.get(self.url)
+        async with aclosing(response._iterator) as chunks:
+            await self._next_event(chunks, "ready")
+
+            inbound = await sync_to_async(self._inbound)("Tudo bem?")
+            await sync_to_async(process_inbound_messages)([str(inbound.id)])
+
+            _, data = await self._next_event(chunks, "message")
+        self.assertEqual(data["id"], str(inbound.id))
+        self.assertEqual(data["content"], "Tudo bem?")
+
+    async def test_reconnect_replays_messages_after_last_event_id(self):
+        base = timezone.now()
+        seen = await sync_to_async(self._inbound)("vista", base)
+        # Gravada depois, com timestamp do cliente mais antigo que o da vista.
+        missed = await sync_to_async(self._inbound)(
+            "perdida", base - timedelta(seconds=5)
+        )
+
+        response = await self.async_client.get(
+            self.url,
+            headers={"Last-Event-ID": await sync_to_async(self._event_id)(seen)},
+        )
+        async with aclosing(response._iterator) as chunks:
+            await self._next_event(chunks, "ready")
+            event_id, data = await self._next_event(chunks, "message")
+        self.assertEqual(data["id"], str(missed.id))
+        self.assertEqual(event_id, await sync_to_async(self._event_id)(missed))
+
+    async def test_invalid_last_event_id(self):
+        response = await self.async_client.get(
+            self.url, headers={"Last-Event-ID": "2026-10-17T12:00:00Z"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_stream_of_unknown_conversation(self):
+        url = reverse("conversation_stream", kwargs={"id": uuid4()})
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class WebhookFastValidationTests(SimpleTestCase):
+    conversation_id = "6a41b347-8d80-4ce9-84ba-7af66f369f6a"
+
+    def _event(self, event_type, timestamp="2025-06-04T14:20:00Z", **data):
+        return {"type": event_type, "timestamp": timestamp, "data": data}
+
+    def _drf(self, payload):
+        serializer = WebhookSerializer(data=payload)
+        if serializer.is_valid():
+            return serializer.validated_data, None
+        return None, serializer.errors
+
+    def test_valid_payloads_match_serializer(self):
+        payloads = [
+            self._event("NEW_CONVERSATION", id=self.conversation_id),
+            self._event("CLOSE_CONVERSATION", id=self.conversation_id.upper()),
+            self._event(
+                "NEW_MESSAGE",
+                timestamp="2025-06-04T11:20:05.123-03:00",
+                id="{49108c71-4dca-4af3-9f32-61bc745926e2}",
+                conversation_id=self.conversation_id.replace("-", ""),
+                content="  Olá, quero alugar.\n",
+                extra="ignorado",
+            ),
+            self._event(
+                "NEW_MESSAGE",
+                timestamp="2025-06-04 14:20:05",
+                id=str(uuid4()),
+                conversation_id=self.conversation_id,
+                content="Oi 👋",
+            ),
+        ]
+        for payload in payloads:
+            with self.subTest(payload=payload):
+                fast = fast_validate_webhook(payload)
+                validated, _ = self._drf(payload)
+                self.assertIsNotNone(fast)
+                self.assertEqual(fast, validated)
+                self.assertEqual(fast["data"], dict(validated["data"]))
+                self.assertEqual(
+                    fast["timestamp"].tzinfo, validated["timestamp"].tzinfo
+                )
+
+    def test_invalid_payloads_fall_back_to_serializer_errors(self):
+        message = {"id": str(uuid4()), "conversation_id": self.conversation_id}
+        payloads = [
+            [],
+            {},
+            self._event("UNKNOWN", id=self.conversation_id),
+            self._event("NEW_CONVERSATION", timestamp="ontem", id=self.conversation_id),
+            self._event("NEW_CONVERSATION", timestamp=None, id=self.conversation_id),
+            self._event("NEW_CONVERSATION", id="not-a-uuid"),
+            self._event("NEW_CONVERSATION", id=123),
+            self._event("NEW_CONVERSATION"),
+            {"type": "NEW_CONVERSATION", "timestamp": "2025-06-04T14:20:00Z"},
+            {
+                "type": "CLOSE_CONVERSATION",
+                "timestamp": "2025-06-04T14:20:00Z",
+                "data": [],
+            },
+            self._event("NEW_MESSAGE", **message),
+            self._event("NEW_MESSAGE", content="   ", **message),
+            self._event("NEW_MESSAGE", content="a\x00b", **message),
+            self._event("NEW_MESSAGE", content=["Oi"], **message),
+        ]
+        for payload in payloads:
+            with self.subTest(payload=payload):
+                expected = self._drf(payload)
+                self.assertIsNone(fast_validate_webhook(payload))
+                self.assertEqual(validate_webhook(payload), expected)
+                with override_settings(WEBHOOK_FAST_VALIDATION=False):
+                    self.assertEqual(validate_webhook(payload), expected)
+
+    def test_numeric_content_is_left_to_serializer(self):
+        # CharField aceita números e os converte; o caminho rápido não decide.
+        payload = self._event(
+            "NEW_MESSAGE",
+            id=str(uuid4()),
+            conversation_id=self.conversation_id,
+            content=42,
+        )
+        self.assertIsNone(fast_validate_webhook(payload))
+        validated, errors = validate_webhook(payload)
+        self.assertIsNone(errors)
+        self.assertEqual(validated["data"]["content"], "42")
+
+
+class ResponderPipelineTests(SimpleTestCase):
+    def test_slow_responders_run_concurrently(self):
+        requests = [(str(uuid4()), ["Oi"]) for _ in range(8)]
+        sequential = ResponderPipeline([SlowStubResponder(delay=0.2)], max_workers=1)
+        pooled = ResponderPipeline([SlowStubResponder(delay=0.2)], max_workers=8)
+
+        started = time.perf_counter()
+        sequential.generate_many(requests[:4])
+        sequential_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        texts = pooled.generate_many(requests)
+        pooled_elapsed = time.perf_counter() - started
+
+        self.assertEqual(texts, ["Resposta gerada para 1 mensagem(ns)."] * 8)
+        # O dobro de rajadas em menos tempo que a metade delas em sequência.
+        self.assertLess(pooled_elapsed, sequential_elapsed)
+        self.assertLess(pooled_elapsed, 0.2 * 8 / 2)
+
+    def test_timeout_falls_back_to_default_text(self):
+        pipeline = ResponderPipeline([SlowStubResponder(delay=0.5)], timeout=0.05)
+
+        started = time.perf_counter()
+        text = pipeline.generate(str(uuid4()), ["Oi", "Tudo bem?"])
+
+        self.assertLess(time.perf_counter() - started, 0.4)
+        self.assertEqual(text, "Mensagens recebidas:\n- Oi\n- Tudo bem?")
+
+    def test_hung_responder_does_not_starve_the_pool(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        class Hanging(Responder):
+            timeout = 0.05
+
+            def respond(self, conversation_id, contents):
+                release.wait()
+
+        class Upper(Responder):
+            def respond(self, conversation_id, contents):
+                return " ".join(contents).upper()
+
+        pipeline = ResponderPipeline([Hanging(), Upper()], max_workers=2, timeout=1)
+        with self.assertLogs("conversations.responders", "WARNING") as logs:
+            texts = [pipeline.generate(str(uuid4()), ["oi"]) for _ in range(4)]
+
+        # Cada chamada trava uma thread; sem recriar o pool, a partir da
+        # segunda o Upper não teria thread livre e cairia no texto padrão.
+        self.assertEqual(texts, ["OI"] * 4)
+        self.assertTrue(any("recriando o pool" in line for line in logs.output))
+
+    def test_failing_and_skipping_responders_pass_to_next(self):
+        class Failing(Responder):
+            def respond(self, conversation_id, contents):
+                raise RuntimeError("indisponível")
+
+        class Skipping(Responder):
+            def respond(self, conversation_id, contents):
+                return None
+
+        class Upper(Responder):
+            def respond(self, conversation_id, contents):
+                return " ".join(contents).upper()
+
+        pipeline = ResponderPipeline([Failing(), Skipping(), Upper()])
+        with self.assertLogs("conversations.responders", "ERROR"):
+            self.assertEqual(pipeline.generate(str(uuid4()), ["oi"]), "OI")
+
+        fallback_only = ResponderPipeline([Skipping()], fallback=EchoResponder())
+        self.assertEqual(
+            fallback_only.generate(str(uuid4()), ["oi"]), "Mensagens recebidas:\n- oi"
+        )
+
+
+class DebounceTests(APITestCase):
+    def setUp(self):
+        self.conversation = Conversation.objects.create(
+            id=uuid4(), status=ConversationStatus.OPEN.value
+        )
+
+    def _create_inbound(self, content, offset_seconds=0):
+        return Message.objects.create(
+            id=uuid4(),
+            conversation=self.conversation,
+            type=MessageType.INBOUND.value,
+            content=content,
+            timestamp=timezone.now() + timedelta(seconds=offset_seconds),
+        )
+
+    def _due(self):
+        Conversation.objects.filter(id=self.conversation.id).update(
+            flush_at=timezone.now() - timedelta(seconds=1)
+        )
+
+    def test_process_inbound_message_pushes_flush_deadline(self):
+        message = self._create_inbound("Oi")
+
+        process_inbound_message(str(message.id))
+
+        self.conversation.refresh_from_db()
+        self.assertGreater(self.conversation.flush_at, timezone.now())
+        message.refresh_from_db()
+        self.assertEqual(message.reply_status, ReplyStatus.PENDING.value)
+
+    @mock.patch.object(generate_outbound_messages_task, "delay")
+    def test_message_whose_task_has_not_run_waits_for_next_burst(self, delay):
+        first = self._create_inbound("Oi")
+        process_inbound_message(str(first.id))
+        # Já gravada, mas a task de processamento ainda não rodou.
+        late = self._create_inbound("Tudo bem?", offset_seconds=1)
+        self._due()
+
+        flush_due_conversations()
+        process_inbound_message(str(late.id))
+        self._due()
+        flush_due_conversations()
+
+        self.assertEqual(
+            [call.args[0] for call in delay.call_args_list],
+            [
+                [[str(self.conversation.id), [str(first.id)]]],
+                [[str(self.conversation.id), [str(late.id)]]],
+            ],
+        )
+
+    @mock.patch.object(generate_outbound_messages_task, "delay")
+    def test_late_message_with_older_timestamp_does_not_reanswer_burst(self, delay):
+        answered = self._create_inbound("Oi")
+        process_inbound_message(str(answered.id))
+        self._due()
+        flush_due_conversations()
+
+        older = self._create_inbound("Antes", offset_seconds=-30)
+        process_inbound_message(str(older.id))
+        # Retry da task de uma mensagem já respondida.
+        process_inbound_message(str(answered.id))
+        self._due()
+        flush_due_conversations()
+
+        self.assertEqual(
+            delay.call_args_list[-1].args[0],
+            [[str(self.conversation.id), [str(older.id)]]],
+        )
+        answered.refresh_from_db()
+        self.assertEqual(answered.reply_status, ReplyStatus.ANSWERED.value)
+
+    @mock.patch.object(generate_outbound_messages_task, "delay")
+    def test_flush_groups_burst_into_single_outbound(self, delay):
+        messages = [
+            self._create_inbound(content, offset_seconds=index)
+            for index, content in enumerate(["Oi", "Tudo bem?", "Quero alugar"])
+        ]
+        for message in messages:
+            process_inbound_message(str(message.id))
+        Conversation.objects.filter(id=self.conversation.id).update(
+            flush_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual(flush_due_conversations(), 1)
+
+        delay.assert_called_once_with(
+            [[str(self.conversation.id), [str(m.id) for m in messages]]]
+        )
+        self.conversation.refresh_from_db()
+        self.assertIsNone(self.conversation.flush_at)
+
+    @mock.patch.object(generate_outbound_messages_task, "delay")
+    def test_flush_ignores_conversations_not_yet_due(self, delay):
+        process_inbound_message(str(self._create_inbound("Oi").id))
+
+        self.assertEqual(flush_due_conversations(), 0)
+        delay.assert_not_called()
+
+    def test_outbound_batch_answers_each_burst_in_one_insert(self):
+        other = Conversation.objects.create(
+            id=uuid4(), status=ConversationStatus.OPEN.value
+        )
+        second = self._create_inbound("Tudo bem?", offset_seconds=1)
+        first = self._create_inbound("Oi")
+        other_message = Message.objects.create(
+            id=uuid4(),
+            conversation=other,
+            type=MessageType.INBOUND.value,
+            content="Olá",
+            timestamp=timezone.now(),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_outbound_messages_task(
+                [
+                    [str(self.conversation.id), [str(second.id), str(first.id)]],
+                    [str(other.id), [str(other_message.id)]],
+                    [str(uuid4()), []],
+                ]
+            )
+
+        outbound = Message.objects.filter(type=MessageType.OUTBOUND.value)
+        self.assertEqual(
+            outbound.get(conversation=self.conversation).content,
+            "Mensagens recebidas:\n- Oi\n- Tudo bem?",
+        )
+        self.assertEqual(
+            outbound.get(conversation=other).content, "Mensagens recebidas:\n- Olá"
+        )
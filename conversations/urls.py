@@ -1,8 +1,38 @@
 from django.urls import path
-from .views import webhook, conversation_detail, conversation_list
+from . import async_views
+from .views import (
+    webhook,
+    conversation_detail,
+    conversation_list,
+    cache_stats,
+    changes,
+    export,
+    metrics,
+)
 
 urlpatterns = [
     path("webhook/", webhook, name="webhook"),
     path("conversations/", conversation_list, name="conversation_list"),
     path("conversations/<uuid:id>/", conversation_detail, name="conversation_detail"),
+    path("changes/", changes, name="changes"),
+    path("export/", export, name="export"),
+    path("stats/cache/", cache_stats, name="cache_stats"),
+    path("metrics", metrics, name="metrics"),
+    # Versões assíncronas, para servir via ASGI (uvicorn)
+    path("async/webhook/", async_views.webhook, name="webhook_async"),
+    path(
+        "async/conversations/",
+        async_views.conversation_list,
+        name="conversation_list_async",
+    ),
+    path(
+        "async/conversations/<uuid:id>/",
+        async_views.conversation_detail,
+        name="conversation_detail_async",
+    ),
+    path(
+        "async/conversations/<uuid:id>/stream/",
+        async_views.conversation_stream,
+        name="conversation_stream",
+    ),
 ]
@@ -1,12 +1,71 @@
-from rest_framework.decorators import api_view
+from datetime import timedelta
+
+from rest_framework.decorators import api_view, parser_classes
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from django.conf import settings
+from django.db.models import Prefetch, Q
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404
-from .models import Conversation, Message
-from .serializers import ConversationSerializer, WebhookSerializer
-from .tasks import process_inbound_message, process_delayed_message
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
+from rest_framework.renderers import JSONRenderer
+from .cache import render_cache, seen_messages, status_cache
+from .metrics import (
+    count_duplicate,
+    count_event,
+    payload_event_type,
+    render_metrics,
+    stage,
+)
+from .models import Change, Conversation, Message, SnapshotXmin
+from .pagination import (
+    InvalidCursor,
+    decode_change_cursor,
+    encode_change_cursor,
+    paginate_keyset,
+)
+from . import outbox
+from .persistence import (
+    ConversationClosed,
+    close_conversation,
+    create_conversation,
+)
+from .exports import CONTENT_TYPES, export_queryset, stream_export
+from .parsers import NDJSONParser
+from .renderers import (
+    compress_response,
+    conversation_values,
+    render_json,
+    serialize_conversations,
+    serialize_messages,
+)
+from .serializers import (
+    ChangesQuerySerializer,
+    ConversationFieldsQuerySerializer,
+    ConversationListQuerySerializer,
+    ConversationSerializer,
+    ExportQuerySerializer,
+    WebhookSerializer,
+    validate_webhook,
+)
+from .services import (
+    buffer_pending_messages,
+    drain_pending_messages,
+    insert_inbound_message,
+    pending_message,
+    process_event_batch,
+)
+from .tasks import process_inbound_message, process_inbound_messages
 from django.utils import timezone
 from drf_spectacular.utils import extend_schema, OpenApiExample
-from .enums import WebhookEventType, MessageType, ConversationStatus
+from .enums import ChangeKind, WebhookEventType, MessageType, ConversationStatus
 
 
 @extend_schema(
@@ -44,9 +103,30 @@ from .enums import WebhookEventType, MessageType, ConversationStatus
             },
             request_only=True,
         ),
+        OpenApiExample(
+            name="BATCH",
+            value=[
+                {
+                    "type": "NEW_CONVERSATION",
+                    "timestamp": "2025-06-04T14:20:00Z",
+                    "data": {"id": "6a41b347-8d80-4ce9-84ba-7af66f369f6a"},
+                },
+                {
+                    "type": "NEW_MESSAGE",
+                    "timestamp": "2025-06-04T14:20:05Z",
+                    "data": {
+                        "id": "49108c71-4dca-4af3-9f32-61bc745926e2",
+                        "content": "Olá, quero informações sobre alugar um apartamento.",
+                        "conversation_id": "6a41b347-8d80-4ce9-84ba-7af66f369f6a",
+                    },
+                },
+            ],
+            request_only=True,
+        ),
     ],
 )
 @api_view(["POST"])
+@parser_classes([*api_settings.DEFAULT_PARSER_CLASSES, NDJSONParser])
 def webhook(request):
     """
     Webhook para receber eventos de conversas e mensagens.
@@ -54,22 +134,47 @@ def webhook(request):
     - NEW_CONVERSATION: cria nova conversa.
     - NEW_MESSAGE: processa nova mensagem.
     - CLOSE_CONVERSATION: fecha conversa.
+
+    Uma NEW_MESSAGE repetida (mesmo id, retry do gateway) recebe 200
+    "Message already processed" sem nova gravação.
+
+    Também aceita um lote de eventos, como array JSON ou NDJSON
+    (Content-Type: application/x-ndjson). Nesse caso a resposta é 200 com
+    o resultado de cada evento, na ordem recebida, em "results".
     """
-    serializer = WebhookSerializer(data=request.data)
-    if not serializer.is_valid():
-        return Response(serializer.errors, status=400)
+    if isinstance(request.data, list):
+        return webhook_batch(request.data)
+
+    response = handle_event(request.data)
+    count_event(payload_event_type(request.data), response.status_code)
+    return response
+
 
-    event_type = serializer.validated_data["type"]
-    timestamp_dt = serializer.validated_data["timestamp"]
-    data = serializer.validated_data["data"]
+def handle_event(payload):
+    """Processa um único evento do webhook e retorna a Response."""
+    event_type = payload_event_type(payload)
+    with stage("validate", event_type):
+        validated, errors = validate_webhook(payload)
+    if errors is not None:
+        return Response(errors, status=400)
+
+    event_type = validated["type"]
+    timestamp_dt = validated["timestamp"]
+    data = validated["data"]
 
     if event_type == WebhookEventType.NEW_CONVERSATION.value:
         conversation_id = data["id"]
 
-        created, _ = Conversation.objects.get_or_create(id=conversation_id)
-        if not created:
-            return Response({"error": "Conversation already exists"}, status=400)
+        with stage("db", event_type):
+            conversation, created = create_conversation(conversation_id)
+            if not created:
+                return Response({"error": "Conversation already exists"}, status=400)
 
+            status_cache.set(conversation_id, conversation.status)
+            drained = drain_pending_messages([conversation_id])
+        if drained:
+            with stage("publish", event_type):
+                outbox.publish(process_inbound_messages, drained)
         return Response({"message": "Conversation created"}, status=201)
 
     elif event_type == WebhookEventType.NEW_MESSAGE.value:
@@ -77,65 +182,362 @@ def webhook(request):
         message_id = data["id"]
         content = data["content"]
 
+        # Retry do gateway: responde sem ir ao banco.
+        with stage("dedup", event_type):
+            duplicate = seen_messages.seen(message_id)
+        if duplicate:
+            return message_already_processed(event_type)
+
         now = timezone.now()
-        conversation = Conversation.objects.filter(id=conversation_id).first()
-
-        if not conversation:
-            diff = now - timestamp_dt
-            if diff.total_seconds() <= 6:
-                process_delayed_message.apply_async(
-                    (
-                        str(message_id),
-                        str(conversation_id),
-                        content,
-                        timestamp_dt.isoformat(),
-                    ),
-                    countdown=6 - diff.total_seconds(),
+        with stage("db", event_type):
+            # Na conversa aberta e já cacheada, não há SELECT antes do INSERT.
+            conversation_status = status_cache.get(conversation_id)
+
+            if conversation_status is None:
+                diff = now - timestamp_dt
+                if diff.total_seconds() > settings.MESSAGE_BUFFER_SECONDS:
+                    return Response(
+                        {"error": "Conversation does not exist"}, status=400
+                    )
+                drained = buffer_pending_messages(
+                    [
+                        pending_message(
+                            message_id, conversation_id, content, timestamp_dt
+                        )
+                    ]
                 )
-                return Response({"message": "Message buffered"}, status=202)
-            return Response({"error": "Conversation does not exist"}, status=400)
-
-        if conversation.status == ConversationStatus.CLOSED.value:
-            return Response({"error": "Conversation is closed"}, status=400)
-
-        msg = Message.objects.create(
-            id=message_id,
-            conversation_id=conversation_id,
-            type=MessageType.INBOUND.value,
-            content=content,
-            timestamp=timestamp_dt,
-        )
-        process_inbound_message.delay(str(msg.id))
+            elif conversation_status == ConversationStatus.CLOSED.value:
+                return Response({"error": "Conversation is closed"}, status=400)
+            else:
+                msg = Message(
+                    id=message_id,
+                    conversation_id=conversation_id,
+                    type=MessageType.INBOUND.value,
+                    content=content,
+                    timestamp=timestamp_dt,
+                )
+                try:
+                    inserted = insert_inbound_message(msg)
+                except ConversationClosed:
+                    # Fechada depois que o status foi cacheado.
+                    status_cache.set(conversation_id, ConversationStatus.CLOSED.value)
+                    return Response({"error": "Conversation is closed"}, status=400)
+                # Só ids gravados em Message: uma pendente pode expirar sem
+                # virar mensagem, e o retry dela não é duplicata.
+                seen_messages.mark(message_id)
+                if not inserted:
+                    return message_already_processed(event_type)
+
+        if conversation_status is None:
+            if drained:
+                with stage("publish", event_type):
+                    outbox.publish(process_inbound_messages, drained)
+            return Response({"message": "Message buffered"}, status=202)
+
+        with stage("publish", event_type):
+            outbox.publish(process_inbound_message, str(msg.id))
         return Response({"message": "Message received"}, status=202)
 
     elif event_type == WebhookEventType.CLOSE_CONVERSATION.value:
         conversation_id = data["id"]
-        conversation = Conversation.objects.filter(id=conversation_id).first()
+        with stage("db", event_type):
+            if not close_conversation(conversation_id, timezone.now()):
+                # Só no caminho de erro: distingue inexistente de já fechada.
+                if not Conversation.objects.filter(id=conversation_id).exists():
+                    return Response({"error": "Conversation not found"}, status=404)
+                return Response({"error": "Conversation already closed"}, status=400)
+            status_cache.set(conversation_id, ConversationStatus.CLOSED.value)
 
-        if not conversation:
-            return Response({"error": "Conversation not found"}, status=404)
+        return Response({"message": "Conversation closed"}, status=200)
 
-        if conversation.status == ConversationStatus.CLOSED.value:
-            return Response({"error": "Conversation already closed"}, status=400)
+    return Response({"error": "Unknown event type"}, status=400)
 
-        conversation.status = ConversationStatus.CLOSED.value
-        conversation.updated_at = timezone.now()
-        conversation.save()
 
-        return Response({"message": "Conversation closed"}, status=200)
+def message_already_processed(event_type):
+    count_duplicate(event_type)
+    return Response({"message": "Message already processed"}, status=200)
 
-    return Response({"error": "Unknown event type"}, status=400)
 
+def webhook_batch(events):
+    if len(events) > settings.WEBHOOK_MAX_BATCH_SIZE:
+        return Response(
+            {
+                "error": f"Batch too large (max {settings.WEBHOOK_MAX_BATCH_SIZE} events)"
+            },
+            status=413,
+        )
+
+    results = process_event_batch(events)
+    for event, (_, status) in zip(events, results):
+        count_event(payload_event_type(event), status)
+    return Response(
+        {"results": [{"status": status, "body": body} for body, status in results]},
+        status=200,
+    )
 
+
+@extend_schema(parameters=[ChangesQuerySerializer])
+@api_view(["GET"])
+def changes(request):
+    """
+    Feed de mudanças para sincronização incremental: devolve o estado atual
+    das conversas (sem as mensagens) e das mensagens criadas ou alteradas
+    depois do cursor `since`, lendo no máximo `limit` entradas do feed.
+
+    O consumidor guarda o "next" e repete a chamada com since=<next>
+    enquanto "has_more" for true.
+
+    As entradas são lidas em ordem de (txid, id), só das transações abaixo
+    do xmin do snapshot (SnapshotXmin), que já terminaram. Ordenar só pelo
+    id não basta: os ids da sequência são reservados antes do commit, e uma
+    transação mais lenta pode tornar visível um id menor que o cursor já
+    entregue. Pelo mesmo motivo, esperar CHANGES_SETTLE_SECONDS não garante
+    nada sozinho (uma transação pode durar mais que a janela); é só um
+    atraso adicional.
+    """
+    query = ChangesQuerySerializer(data=request.query_params)
+    if not query.is_valid():
+        return Response(query.errors, status=400)
+    params = query.validated_data
+
+    try:
+        since = decode_change_cursor(params["since"]) if "since" in params else (0, 0)
+    except InvalidCursor:
+        return Response({"error": "Invalid cursor"}, status=400)
+
+    txid, sequence = since
+    settled = timezone.now() - timedelta(seconds=settings.CHANGES_SETTLE_SECONDS)
+    entries = list(
+        Change.objects.filter(Q(txid__gt=txid) | Q(txid=txid, id__gt=sequence))
+        .filter(txid__lt=SnapshotXmin(), created_at__lte=settled)
+        .order_by("txid", "id")
+        .values_list("txid", "id", "kind", "object_id")[: params["limit"] + 1]
+    )
+    has_more = len(entries) > params["limit"]
+    entries = entries[: params["limit"]]
+
+    conversation_ids = {
+        object_id
+        for _, _, kind, object_id in entries
+        if kind == ChangeKind.CONVERSATION.value
+    }
+    message_ids = {
+        object_id
+        for _, _, kind, object_id in entries
+        if kind == ChangeKind.MESSAGE.value
+    }
+    fields = [name for name in ConversationSerializer.Meta.fields if name != "messages"]
+    rows = []
+    if conversation_ids:
+        rows = list(
+            conversation_values(
+                Conversation.objects.filter(id__in=conversation_ids), fields
+            ).order_by("updated_at", "id")
+        )
+
+    data = {
+        "conversations": serialize_conversations(rows, fields),
+        "messages": (
+            serialize_messages(Message.objects.filter(id__in=message_ids))
+            if message_ids
+            else []
+        ),
+        "next": encode_change_cursor(*(entries[-1][:2] if entries else since)),
+        "has_more": has_more,
+    }
+    response = HttpResponse(render_json(data), content_type="application/json")
+    return compress_response(request, response)
+
+
+@require_GET
+def export(request):
+    """
+    Exportação completa das conversas ou das mensagens, em NDJSON ou CSV,
+    transmitida enquanto é lida do banco (ver conversations/exports.py), com
+    os filtros de ExportQuerySerializer. Para o histórico inteiro, no lugar
+    de paginar GET /conversations/.
+    """
+    query = ExportQuerySerializer(data=request.GET)
+    if not query.is_valid():
+        return HttpResponse(
+            JSONRenderer().render(query.errors),
+            status=400,
+            content_type="application/json",
+        )
+    params = query.validated_data
+
+    columns, queryset = export_queryset(
+        params["resource"],
+        status=params.get("status"),
+        since=params.get("since"),
+        until=params.get("until"),
+    )
+    response = StreamingHttpResponse(
+        stream_export(columns, queryset, params["format"]),
+        content_type=CONTENT_TYPES[params["format"]],
+    )
+    response.headers["Content-Disposition"] = (
+        f'attachment; filename="{params["resource"]}.{params["format"]}"'
+    )
+    return response
+
+
+@require_GET
+def metrics(request):
+    """Métricas no formato texto do Prometheus (ver conversations/metrics.py)."""
+    content, content_type = render_metrics()
+    return HttpResponse(content, content_type=content_type)
+
+
+@api_view(["GET"])
+def cache_stats(request):
+    """
+    Contadores de acerto/erro do cache de status das conversas deste processo.
+    """
+    return Response({"status_cache": status_cache.stats()})
+
+
+def conversation_queryset(fields=None):
+    """
+    Queryset das conversas para os endpoints de leitura. Quando as mensagens
+    fazem parte da resposta, elas são carregadas com um único prefetch
+    ordenado por timestamp, em vez de uma consulta por conversa.
+    """
+    queryset = Conversation.objects.all()
+    if fields is None or "messages" in fields:
+        queryset = queryset.prefetch_related(
+            Prefetch("messages", queryset=Message.objects.order_by("timestamp"))
+        )
+    return queryset
+
+
+def etag_matches(request, etag):
+    """Se o If-None-Match do cliente corresponde ao ETag (fraco ou forte)."""
+    if_none_match = {
+        tag.removeprefix("W/")
+        for tag in parse_etags(request.headers.get("If-None-Match", ""))
+    }
+    return etag in if_none_match or "*" in if_none_match
+
+
+def not_modified_response(etag):
+    response = HttpResponseNotModified()
+    response.headers["ETag"] = etag
+    return response
+
+
+def conditional_json_response(request, content, etag):
+    """
+    Responde o JSON já renderizado com o ETag, ou 304 sem corpo quando o
+    If-None-Match do cliente corresponde a ele.
+    """
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    response = HttpResponse(content, content_type="application/json")
+    response.headers["ETag"] = etag
+    return compress_response(request, response)
+
+
+def render_conversation(id, fields):
+    """
+    Renderiza o detalhe da conversa e retorna (versão, JSON), pelo caminho
+    rápido (values() + orjson) quando CONVERSATION_FAST_RENDER está ativo.
+    Levanta Http404 se a conversa não existir.
+    """
+    if settings.CONVERSATION_FAST_RENDER:
+        rows = list(conversation_values(Conversation.objects.filter(id=id), fields))
+        if not rows:
+            raise Http404("No Conversation matches the given query.")
+        data = serialize_conversations(rows, fields)[0]
+        return rows[0]["version"], render_json(data)
+
+    conversation = get_object_or_404(conversation_queryset(fields), id=id)
+    serializer = ConversationSerializer(conversation, fields=fields)
+    return conversation.version, JSONRenderer().render(serializer.data)
+
+
+@extend_schema(parameters=[ConversationFieldsQuerySerializer])
 @api_view(["GET"])
 def conversation_detail(request, id):
-    conversation = get_object_or_404(Conversation, id=id)
-    serializer = ConversationSerializer(conversation)
-    return Response(serializer.data)
+    """Detalhe da conversa com ETag, servido do render cache quando possível."""
+    query = ConversationFieldsQuerySerializer(data=request.query_params)
+    if not query.is_valid():
+        return Response(query.errors, status=400)
+    fields = query.validated_data["fields"]
+
+    generation, rendered = render_cache.lookup(id, fields)
+    if rendered is None:
+        # Com If-None-Match, a versão basta para decidir o 304.
+        if "If-None-Match" in request.headers:
+            version = (
+                Conversation.objects.filter(id=id)
+                .values_list("version", flat=True)
+                .first()
+            )
+            if version is None:
+                raise Http404("No Conversation matches the given query.")
+            etag = render_cache.etag(version, fields)
+            if etag_matches(request, etag):
+                return not_modified_response(etag)
+        rendered = render_conversation(id, fields)
+        render_cache.store(id, generation, fields, rendered)
+    version, content = rendered
+    return conditional_json_response(
+        request, content, render_cache.etag(version, fields)
+    )
 
 
+@extend_schema(parameters=[ConversationListQuerySerializer])
 @api_view(["GET"])
 def conversation_list(request):
-    conversations = Conversation.objects.all()
-    serializer = ConversationSerializer(conversations, many=True)
-    return Response(serializer.data)
+    """
+    Lista conversas paginadas por keyset em (updated_at, id), da atualização
+    mais recente para a mais antiga; com ordering=last_message_at, em
+    (last_message_at, id), só as conversas com mensagens.
+    Filtros opcionais: status, updated_after. Aceita fields/include para
+    sparse fieldsets (ver ConversationFieldsQuerySerializer).
+    O campo "next" traz a URL da próxima página (com o cursor) ou null na
+    última página.
+    """
+    query = ConversationListQuerySerializer(data=request.query_params)
+    if not query.is_valid():
+        return Response(query.errors, status=400)
+    params = query.validated_data
+
+    fast = settings.CONVERSATION_FAST_RENDER
+    if fast:
+        conversations = conversation_values(
+            Conversation.objects.all(), params["fields"]
+        )
+    else:
+        conversations = conversation_queryset(params["fields"])
+    if "status" in params:
+        conversations = conversations.filter(status=params["status"])
+    if "updated_after" in params:
+        conversations = conversations.filter(updated_at__gt=params["updated_after"])
+    if params["ordering"] == "last_message_at":
+        conversations = conversations.filter(last_message_at__isnull=False)
+
+    try:
+        page, next_cursor = paginate_keyset(
+            conversations, params.get("cursor"), params["page_size"], params["ordering"]
+        )
+    except InvalidCursor:
+        return Response({"error": "Invalid cursor"}, status=400)
+
+    next_url = None
+    if next_cursor:
+        next_url = replace_query_param(
+            request.build_absolute_uri(), "cursor", next_cursor
+        )
+
+    if fast:
+        data = {
+            "next": next_url,
+            "results": serialize_conversations(page, params["fields"]),
+        }
+        response = HttpResponse(render_json(data), content_type="application/json")
+        return compress_response(request, response)
+
+    serializer = ConversationSerializer(page, many=True, fields=params["fields"])
+    return Response({"next": next_url, "results": serializer.data})
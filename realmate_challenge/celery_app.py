@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.signals import celeryd_init
 import os
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "realmate_challenge.settings")
@@ -6,3 +7,21 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "realmate_challenge.settings")
 app = Celery("realmate_challenge")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+
+@celeryd_init.connect
+def apply_worker_profile(sender=None, conf=None, options=None, **kwargs):
+    """
+    Aplica o perfil (concurrency, prefetch) de CELERY_WORKER_PROFILES ao
+    worker iniciado com uma única fila em -Q. Os valores passados na linha
+    de comando continuam tendo precedência.
+    """
+    queues = (options or {}).get("queues") or []
+    if isinstance(queues, str):
+        queues = queues.split(",")
+    profiles = conf.get("worker_profiles") or {}
+    if len(queues) != 1 or queues[0] not in profiles:
+        return
+    profile = profiles[queues[0]]
+    conf.worker_concurrency = profile["concurrency"]
+    conf.worker_prefetch_multiplier = profile["prefetch_multiplier"]
@@ -0,0 +1,98 @@
+"""
+Configuração do gunicorn em produção:
+
+    gunicorn -c python:realmate_challenge.gunicorn_conf
+
+GUNICORN_WORKER_CLASS escolhe o servidor:
+- sync: um request por processo (WSGI);
+- gthread: GUNICORN_THREADS requests por processo (WSGI), cada thread com a
+  sua conexão persistente ao banco;
+- asgi: uvicorn_worker.UvicornWorker servindo realmate_challenge.asgi (views
+  em /async/...).
+
+Com GUNICORN_PRELOAD, o Django é carregado uma vez no master e os workers
+nascem por fork já prontos; as conexões abertas antes do fork são
+descartadas em post_fork. GUNICORN_MAX_REQUESTS (+ jitter) recicla cada
+worker depois de N requests, limitando o crescimento de memória sem
+reiniciar todos ao mesmo tempo. Cada worker abre a conexão ao banco e ao
+broker em post_worker_init, antes do primeiro request.
+"""
+
+import logging
+import multiprocessing
+import os
+
+# `config` é também o nome de uma opção do gunicorn.
+from decouple import config as env
+
+logger = logging.getLogger("gunicorn.error")
+
+WORKER_CLASSES = {
+    "sync": ("sync", "realmate_challenge.wsgi:application"),
+    "gthread": ("gthread", "realmate_challenge.wsgi:application"),
+    "asgi": ("uvicorn_worker.UvicornWorker", "realmate_challenge.asgi:application"),
+}
+
+server_type = env("GUNICORN_WORKER_CLASS", default="sync")
+if server_type not in WORKER_CLASSES:
+    raise ValueError(
+        f"GUNICORN_WORKER_CLASS inválido: {server_type!r} "
+        f"(use {', '.join(WORKER_CLASSES)})"
+    )
+worker_class, wsgi_app = WORKER_CLASSES[server_type]
+
+bind = env("GUNICORN_BIND", default="0.0.0.0:8000")
+workers = env("GUNICORN_WORKERS", default=multiprocessing.cpu_count() * 2 + 1, cast=int)
+threads = env(
+    "GUNICORN_THREADS", default=4 if server_type == "gthread" else 1, cast=int
+)
+preload_app = env("GUNICORN_PRELOAD", default=True, cast=bool)
+max_requests = env("GUNICORN_MAX_REQUESTS", default=10000, cast=int)
+max_requests_jitter = env("GUNICORN_MAX_REQUESTS_JITTER", default=1000, cast=int)
+timeout = env("GUNICORN_TIMEOUT", default=30, cast=int)
+graceful_timeout = env("GUNICORN_GRACEFUL_TIMEOUT", default=30, cast=int)
+keepalive = env("GUNICORN_KEEPALIVE", default=5, cast=int)
+accesslog = env("GUNICORN_ACCESSLOG", default=None)
+
+
+def post_fork(server, worker):
+    # Conexões herdadas do master (preload) não podem ser compartilhadas
+    # entre processos: o worker abre as suas.
+    if not server.cfg.preload_app:
+        return
+    from django.db import connections
+
+    from realmate_challenge.celery_app import app as celery_app
+
+    connections.close_all()
+    # Fecha as conexões ao broker herdadas (resize com reset) e repõe os
+    # pools, que abrem conexões novas no worker.
+    for pool in (celery_app.amqp.producer_pool, celery_app.pool):
+        pool.resize(pool.limit, reset=True)
+
+
+def post_worker_init(worker):
+    """Abre a conexão ao banco e ao broker antes do primeiro request."""
+    from django.db import DatabaseError, connection
+
+    from realmate_challenge.celery_app import app as celery_app
+
+    # No ASGI, o ORM roda nas threads do sync_to_async, não nesta.
+    if server_type != "asgi":
+        try:
+            connection.ensure_connection()
+        except DatabaseError as exc:
+            logger.warning(f"[post_worker_init] Banco indisponível: {exc}")
+    try:
+        with celery_app.pool.acquire(block=True) as broker:
+            broker.ensure_connection(max_retries=1)
+    except Exception as exc:
+        logger.warning(f"[post_worker_init] Broker indisponível: {exc}")
+
+
+def child_exit(server, worker):
+    # Métricas do worker encerrado (modo multiprocess do prometheus_client).
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
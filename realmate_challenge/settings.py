@@ -2,6 +2,7 @@ from pathlib import Path
 import os
 from decouple import config, Csv
 import dj_database_url
+from kombu import Queue
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 # SECRET_KEY = "django-insecure-&*u8&l5^-zuzqbwf%5$^181@e=(2j^am0-@20bndebz(2e(wsq"
@@ -72,7 +73,214 @@ WSGI_APPLICATION = "realmate_challenge.wsgi.application"
 # CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 CELERY_BROKER_URL = config("CELERY_BROKER_URL")
 
-CELERY_RESULT_BACKEND = CELERY_BROKER_URL
+# Publicação das tasks (.delay()) por um pool de conexões ao broker por
+# processo, compartilhado entre as threads: até CELERY_BROKER_POOL_LIMIT
+# conexões, com keepalive e health check, em vez de reconectar ao Redis.
+CELERY_BROKER_POOL_LIMIT = config("CELERY_BROKER_POOL_LIMIT", default=10, cast=int)
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "max_connections": config("CELERY_BROKER_MAX_CONNECTIONS", default=20, cast=int),
+    "health_check_interval": 30,
+    "socket_keepalive": True,
+    "socket_connect_timeout": 5,
+    "retry_on_timeout": True,
+}
+
+# Outbox transacional (ver conversations/outbox.py): o webhook grava as
+# tasks no banco, na transação da mensagem, e o relay (manage.py
+# relay_outbox) as publica em lotes. Exige o relay rodando.
+TASK_OUTBOX = config("TASK_OUTBOX", default=False, cast=bool)
+OUTBOX_RELAY_BATCH_SIZE = config("OUTBOX_RELAY_BATCH_SIZE", default=500, cast=int)
+OUTBOX_RELAY_INTERVAL_SECONDS = config(
+    "OUTBOX_RELAY_INTERVAL_SECONDS", default=0.2, cast=float
+)
+
+# Nenhuma task retorna valor: sem result backend e sem gravar resultados.
+CELERY_RESULT_BACKEND = config("CELERY_RESULT_BACKEND", default=None)
+CELERY_TASK_IGNORE_RESULT = True
+
+# Filas por estágio, para que uma fila acumulada não atrase as outras:
+# - ingestion: processamento das mensagens INBOUND recebidas pelo webhook;
+# - debounce: varredura de prazos de flush, limpeza do buffer e do feed de
+#   mudanças e manutenção das partições de mensagens;
+# - outbound: geração das respostas OUTBOUND.
+CELERY_TASK_QUEUES = [
+    Queue(name, routing_key=name) for name in ("ingestion", "debounce", "outbound")
+]
+CELERY_TASK_DEFAULT_QUEUE = "ingestion"
+CELERY_TASK_ROUTES = {
+    "conversations.tasks.process_inbound_message": {"queue": "ingestion"},
+    "conversations.tasks.process_inbound_messages": {"queue": "ingestion"},
+    "conversations.tasks.process_delayed_message": {"queue": "ingestion"},
+    "conversations.tasks.flush_due_conversations": {"queue": "debounce"},
+    "conversations.tasks.purge_expired_pending_messages": {"queue": "debounce"},
+    "conversations.tasks.maintain_message_partitions": {"queue": "debounce"},
+    "conversations.tasks.purge_expired_changes": {"queue": "debounce"},
+    "conversations.tasks.generate_outbound_message_task": {"queue": "outbound"},
+    "conversations.tasks.generate_outbound_messages_task": {"queue": "outbound"},
+}
+
+# Perfil de cada pool de workers, aplicado ao worker que consome uma única
+# fila (-Q); --concurrency/--prefetch-multiplier na linha de comando têm
+# precedência. Tasks curtas toleram prefetch maior; nas demais, 1 evita que
+# um processo ocupado segure mensagens que outro poderia executar.
+CELERY_WORKER_PROFILES = {
+    "ingestion": {
+        "concurrency": config("CELERY_INGESTION_CONCURRENCY", default=8, cast=int),
+        "prefetch_multiplier": config("CELERY_INGESTION_PREFETCH", default=4, cast=int),
+    },
+    "debounce": {
+        "concurrency": config("CELERY_DEBOUNCE_CONCURRENCY", default=2, cast=int),
+        "prefetch_multiplier": config("CELERY_DEBOUNCE_PREFETCH", default=1, cast=int),
+    },
+    "outbound": {
+        "concurrency": config("CELERY_OUTBOUND_CONCURRENCY", default=4, cast=int),
+        "prefetch_multiplier": config("CELERY_OUTBOUND_PREFETCH", default=1, cast=int),
+    },
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": config("CACHE_LOCATION", default=""),
+    }
+}
+
+# Cache de status das conversas: LRU local ao processo + cache do Django
+CONVERSATION_STATUS_LOCAL_TTL = config(
+    "CONVERSATION_STATUS_LOCAL_TTL", default=2, cast=float
+)
+CONVERSATION_STATUS_LOCAL_SIZE = config(
+    "CONVERSATION_STATUS_LOCAL_SIZE", default=10000, cast=int
+)
+CONVERSATION_STATUS_CACHE_TTL = config(
+    "CONVERSATION_STATUS_CACHE_TTL", default=3600, cast=int
+)
+
+# Payload renderizado de GET /conversations/{id}/, chaveado pela versão
+CONVERSATION_RENDER_CACHE_TTL = config(
+    "CONVERSATION_RENDER_CACHE_TTL", default=3600, cast=int
+)
+
+# Validação do webhook pelo caminho rápido (mesmo resultado do
+# WebhookSerializer, que continua validando o que o caminho rápido recusa)
+WEBHOOK_FAST_VALIDATION = config("WEBHOOK_FAST_VALIDATION", default=True, cast=bool)
+
+# Leitura via values() + orjson nos endpoints de conversa (mesmo JSON do DRF)
+CONVERSATION_FAST_RENDER = config("CONVERSATION_FAST_RENDER", default=False, cast=bool)
+
+# Compressão brotli/gzip das respostas JSON das conversas
+RESPONSE_COMPRESSION = config("RESPONSE_COMPRESSION", default=False, cast=bool)
+RESPONSE_COMPRESSION_MIN_BYTES = config(
+    "RESPONSE_COMPRESSION_MIN_BYTES", default=1024, cast=int
+)
+RESPONSE_BROTLI_QUALITY = config("RESPONSE_BROTLI_QUALITY", default=5, cast=int)
+
+# Métricas Prometheus: raiz com um subdiretório PROMETHEUS_MULTIPROC_DIR por
+# serviço; o /metrics agrega todos. Vazio: só o processo que atende o /metrics.
+PROMETHEUS_METRICS_ROOT = config("PROMETHEUS_METRICS_ROOT", default="")
+
+# Ids de mensagens já aceitas, para responder retries do gateway sem ir ao banco
+WEBHOOK_IDEMPOTENCY_TTL = config("WEBHOOK_IDEMPOTENCY_TTL", default=86400, cast=int)
+WEBHOOK_IDEMPOTENCY_LOCAL_TTL = config(
+    "WEBHOOK_IDEMPOTENCY_LOCAL_TTL", default=300, cast=float
+)
+WEBHOOK_IDEMPOTENCY_LOCAL_SIZE = config(
+    "WEBHOOK_IDEMPOTENCY_LOCAL_SIZE", default=10000, cast=int
+)
+
+# Particionamento de Message por timestamp no Postgres: intervalo de cada
+# partição ("month", "week" ou "day"), quantas criar à frente do período atual
+# e retenção em dias (0 mantém tudo). Ver conversations/partitions.py.
+MESSAGE_PARTITION_INTERVAL = config("MESSAGE_PARTITION_INTERVAL", default="month")
+MESSAGE_PARTITIONS_AHEAD = config("MESSAGE_PARTITIONS_AHEAD", default=3, cast=int)
+MESSAGE_RETENTION_DAYS = config("MESSAGE_RETENTION_DAYS", default=0, cast=int)
+
+# Stream das mensagens novas de cada conversa (SSE no ASGI): Redis do pub/sub
+# (vazio: entrega só dentro do processo), duração máxima de cada conexão
+# (o cliente reconecta com Last-Event-ID) e intervalo dos keep-alives.
+MESSAGE_STREAM_REDIS_URL = config("MESSAGE_STREAM_REDIS_URL", default="")
+MESSAGE_STREAM_TIMEOUT_SECONDS = config(
+    "MESSAGE_STREAM_TIMEOUT_SECONDS", default=55, cast=float
+)
+MESSAGE_STREAM_HEARTBEAT_SECONDS = config(
+    "MESSAGE_STREAM_HEARTBEAT_SECONDS", default=15, cast=float
+)
+
+# Tolerância para NEW_MESSAGE que chega antes do NEW_CONVERSATION
+MESSAGE_BUFFER_SECONDS = config("MESSAGE_BUFFER_SECONDS", default=6, cast=float)
+
+# Máximo de eventos aceitos em um único POST em lote no /webhook/
+WEBHOOK_MAX_BATCH_SIZE = config("WEBHOOK_MAX_BATCH_SIZE", default=1000, cast=int)
+
+# Debounce das mensagens INBOUND: cada nova mensagem empurra o prazo de flush
+# da conversa; o beat varre periodicamente as conversas com prazo vencido.
+CONVERSATION_DEBOUNCE_SECONDS = config(
+    "CONVERSATION_DEBOUNCE_SECONDS", default=5, cast=float
+)
+CONVERSATION_FLUSH_INTERVAL_SECONDS = config(
+    "CONVERSATION_FLUSH_INTERVAL_SECONDS", default=1, cast=float
+)
+CONVERSATION_FLUSH_BATCH_SIZE = config(
+    "CONVERSATION_FLUSH_BATCH_SIZE", default=500, cast=int
+)
+
+# Geração das respostas OUTBOUND (ver conversations/responders.py): responders
+# tentados em ordem (caminhos importáveis; vazio usa só o texto padrão),
+# timeout de cada chamada, threads por processo do worker e rajadas por task.
+OUTBOUND_RESPONDERS = config("OUTBOUND_RESPONDERS", default="", cast=Csv())
+OUTBOUND_RESPONDER_TIMEOUT = config("OUTBOUND_RESPONDER_TIMEOUT", default=5, cast=float)
+OUTBOUND_RESPONDER_MAX_WORKERS = config(
+    "OUTBOUND_RESPONDER_MAX_WORKERS", default=16, cast=int
+)
+OUTBOUND_BATCH_SIZE = config("OUTBOUND_BATCH_SIZE", default=16, cast=int)
+OUTBOUND_STUB_DELAY_SECONDS = config(
+    "OUTBOUND_STUB_DELAY_SECONDS", default=0.5, cast=float
+)
+
+# Linhas lidas do banco por vez na exportação em streaming (GET /export/)
+EXPORT_CHUNK_SIZE = config("EXPORT_CHUNK_SIZE", default=2000, cast=int)
+
+# Eventos gravados por transação no replay de eventos arquivados (replay_events)
+REPLAY_BATCH_SIZE = config("REPLAY_BATCH_SIZE", default=5000, cast=int)
+
+# Paginação por keyset de GET /conversations/
+CONVERSATIONS_PAGE_SIZE = config("CONVERSATIONS_PAGE_SIZE", default=50, cast=int)
+CONVERSATIONS_MAX_PAGE_SIZE = config(
+    "CONVERSATIONS_MAX_PAGE_SIZE", default=200, cast=int
+)
+
+# Feed de mudanças (GET /changes/): tamanho do lote, retenção das entradas e
+# um atraso opcional antes de expor uma entrada. A sequência é atribuída no
+# INSERT, não no commit; quem evita pular uma entrada de numeração menor cuja
+# transação ainda não terminou é o filtro pelo xmin do snapshot (ver
+# views.changes). Uma espera fixa, sozinha, não garante isso.
+CHANGES_PAGE_SIZE = config("CHANGES_PAGE_SIZE", default=500, cast=int)
+CHANGES_MAX_PAGE_SIZE = config("CHANGES_MAX_PAGE_SIZE", default=5000, cast=int)
+CHANGES_SETTLE_SECONDS = config("CHANGES_SETTLE_SECONDS", default=0, cast=float)
+CHANGES_RETENTION_DAYS = config("CHANGES_RETENTION_DAYS", default=7, cast=int)
+
+CELERY_BEAT_SCHEDULE = {
+    "flush-due-conversations": {
+        "task": "conversations.tasks.flush_due_conversations",
+        "schedule": CONVERSATION_FLUSH_INTERVAL_SECONDS,
+        # Varreduras acumuladas são redundantes: basta a mais recente.
+        "options": {"expires": CONVERSATION_FLUSH_INTERVAL_SECONDS * 5},
+    },
+    "purge-expired-pending-messages": {
+        "task": "conversations.tasks.purge_expired_pending_messages",
+        "schedule": 60,
+    },
+    "purge-expired-changes": {
+        "task": "conversations.tasks.purge_expired_changes",
+        "schedule": 3600,
+    },
+    "maintain-message-partitions": {
+        "task": "conversations.tasks.maintain_message_partitions",
+        "schedule": 3600,
+    },
+}
 
 # DATABASES = {
 #     "default": {
@@ -84,7 +292,17 @@ CELERY_RESULT_BACKEND = CELERY_BROKER_URL
 #         "PORT": "5432",
 #     }
 # }
-DATABASES = {"default": dj_database_url.config(default=config("DATABASE_URL"))}
+# Conexões persistentes: cada processo (ou thread, no gthread) reaproveita a
+# conexão por até DATABASE_CONN_MAX_AGE segundos, verificada antes de cada
+# request (health check) em vez de abrir uma nova a cada request. No ASGI,
+# use 0: as views assíncronas acessam o banco por threads do sync_to_async.
+DATABASES = {
+    "default": dj_database_url.config(
+        default=config("DATABASE_URL"),
+        conn_max_age=config("DATABASE_CONN_MAX_AGE", default=60, cast=int),
+        conn_health_checks=True,
+    )
+}
 
 
 AUTH_PASSWORD_VALIDATORS = [
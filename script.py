@@ -9,12 +9,25 @@ CONVERSATION_ID = str(uuid.uuid4())
 def iso_now():
     return datetime.now(timezone.utc).isoformat()
 
-def post_event(event_type, data, timestamp=None):
-    payload = {
+def build_event(event_type, data, timestamp=None):
+    return {
         "type": event_type,
         "timestamp": timestamp or iso_now(),
         "data": data
     }
+
+def new_conversation_data(conv_id):
+    return {"id": conv_id}
+
+def new_message_data(conv_id, content):
+    return {
+        "id": str(uuid.uuid4()),
+        "conversation_id": conv_id,
+        "content": content
+    }
+
+def post_event(event_type, data, timestamp=None):
+    payload = build_event(event_type, data, timestamp)
     response = requests.post(BASE_URL, json=payload)
     print(f"{event_type} -> {response.status_code}: {response.json()}")
     return response
@@ -35,16 +48,12 @@ def list_conversations():
 
 def main():
     print("\n📌 Criando nova conversa")
-    post_event("NEW_CONVERSATION", {"id": CONVERSATION_ID})
+    post_event("NEW_CONVERSATION", new_conversation_data(CONVERSATION_ID))
 
     print("\n📌 Enviando mensagens INBOUND")
     for content in ["Oi,gostaria", "de comprar um gato","gato amarelo" ]:
         time.sleep(1)
-        post_event("NEW_MESSAGE", {
-            "id": str(uuid.uuid4()),
-            "conversation_id": CONVERSATION_ID,
-            "content": content
-        })
+        post_event("NEW_MESSAGE", new_message_data(CONVERSATION_ID, content))
 
     print("\n📌 Aguardando Celery processar OUTBOUND")
     time.sleep(10)
@@ -56,11 +65,7 @@ def main():
     post_event("CLOSE_CONVERSATION", {"id": CONVERSATION_ID})
 
     print("\n📌 Tentando mandar mensagem em conversa fechada (esperado: erro)")
-    post_event("NEW_MESSAGE", {
-        "id": str(uuid.uuid4()),
-        "conversation_id": CONVERSATION_ID,
-        "content": "Ainda está aí?"
-    })
+    post_event("NEW_MESSAGE", new_message_data(CONVERSATION_ID, "Ainda está aí?"))
 
     print("\n📌 Testando evento desconhecido (esperado: erro)")
     post_event("UNKNOWN_EVENT", {"foo": "bar"})